@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""Stand-in for the openvpn3-linux configuration and session D-Bus services.
+
+Owns net.openvpn.v3.configuration and net.openvpn.v3.sessions on the bus given
+in DBUS_SYSTEM_BUS_ADDRESS and implements the part of their API the backend
+uses. Run it on a private dbus-daemon, never on the real system bus.
+Latencies, state transitions, auth URLs and failures are set on the command
+line. Call counts can be read and reset through net.openvpn.v3.fake on
+/net/openvpn/v3/fake. "ready" is printed once the names are owned.
+"""
+import argparse
+import collections
+import itertools
+import os
+import random
+import time
+
+import dbus
+import dbus.service
+import dbus.mainloop.glib
+from gi.repository import GLib
+
+CONFIG_INTERFACE = 'net.openvpn.v3.configuration'
+SESSIONS_INTERFACE = 'net.openvpn.v3.sessions'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+FAKE_INTERFACE = 'net.openvpn.v3.fake'
+CONFIGURATION_ROOT_PATH = '/net/openvpn/v3/configuration'
+SESSIONS_ROOT_PATH = '/net/openvpn/v3/sessions'
+
+# StatusMajor / StatusMinor values as used by openvpn3
+MAJOR_CONNECTION = 2
+MAJOR_SESSION = 3
+CONN_CONNECTING = 6
+CONN_CONNECTED = 7
+CONN_DISCONNECTED = 9
+CONN_AUTH_FAILED = 11
+SESS_NEW = 17
+SESS_AUTH_URL = 22
+
+# SessionManagerEvent / ConfigurationManagerEvent types
+CREATED = 1
+DESTROYED = 2
+
+
+class NotReady(dbus.DBusException):
+    _dbus_error_name = 'net.openvpn.v3.error.ready'
+
+
+class InjectedFailure(dbus.DBusException):
+    _dbus_error_name = 'net.openvpn.v3.error.fake'
+
+
+class FakeService:
+
+    def __init__(self, bus, options):
+        self.bus = bus
+        self.options = options
+        self.calls = collections.Counter()
+        self.configs = {}
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.owner = os.getuid()
+
+    def call(self, member, reply, result=None):
+        # Every method goes through here: counted, optionally failed, answered after the latency
+        self.calls[member] += 1
+        if member in self.options.fail_methods and random.random() < self.options.fail_rate:
+            raise InjectedFailure(f"Injected failure of {member}")
+        if self.options.latency > 0:
+            GLib.timeout_add(int(self.options.latency * 1000), lambda: reply(*(() if result is None else (result,))) and False)
+        elif result is None:
+            reply()
+        else:
+            reply(result)
+
+    def later(self, seconds, callback, *args):
+        GLib.timeout_add(int(seconds * 1000), lambda: callback(*args) and False)
+
+
+class PropertiesObject(dbus.service.Object):
+
+    def __init__(self, service, path):
+        super().__init__(service.bus, path)
+        self.service = service
+        self.path = path
+
+    def properties(self):
+        return {}
+
+    @dbus.service.method(PROPERTIES_INTERFACE, in_signature='ss', out_signature='v', async_callbacks=('reply', 'error'))
+    def Get(self, interface, name, reply, error):
+        properties = self.properties()
+        if name not in properties:
+            raise dbus.DBusException(f"No property {name}", name='org.freedesktop.DBus.Error.UnknownProperty')
+        self.service.call('Get', reply, properties[name])
+
+    @dbus.service.method(PROPERTIES_INTERFACE, in_signature='s', out_signature='a{sv}', async_callbacks=('reply', 'error'))
+    def GetAll(self, interface, reply, error):
+        self.service.call('GetAll', reply, dbus.Dictionary(self.properties(), signature='sv'))
+
+    @dbus.service.method(PROPERTIES_INTERFACE, in_signature='ssv', async_callbacks=('reply', 'error'))
+    def Set(self, interface, name, value, reply, error):
+        self.set_property(name, value)
+        self.service.call('Set', reply)
+
+    def set_property(self, name, value):
+        raise dbus.DBusException(f"Property {name} is read-only", name='org.freedesktop.DBus.Error.PropertyReadOnly')
+
+
+class Configuration(PropertiesObject):
+
+    def __init__(self, service, path, name):
+        super().__init__(service, path)
+        self.values = {'name': name, 'dco': False, 'persistent': True, 'locked_down': False,
+                       'import_timestamp': dbus.UInt64(int(time.time()))}
+
+    def properties(self):
+        return dict(self.values)
+
+    def set_property(self, name, value):
+        self.values[name] = value
+
+    @dbus.service.method(CONFIG_INTERFACE, async_callbacks=('reply', 'error'))
+    def Remove(self, reply, error):
+        self.service.call('Remove', reply)
+        self.remove_from_connection()
+        del self.service.configs[self.path]
+        self.service.config_manager.ConfigurationManagerEvent(self.path, DESTROYED, self.service.owner)
+
+
+class ConfigurationManager(dbus.service.Object):
+
+    def __init__(self, service):
+        super().__init__(service.bus, CONFIGURATION_ROOT_PATH)
+        self.service = service
+
+    def add(self, name):
+        path = f"{CONFIGURATION_ROOT_PATH}/fake{next(self.service.ids):06d}"
+        self.service.configs[path] = Configuration(self.service, path, name)
+        return path
+
+    @dbus.service.method(CONFIG_INTERFACE, out_signature='ao', async_callbacks=('reply', 'error'))
+    def FetchAvailableConfigs(self, reply, error):
+        self.service.call('FetchAvailableConfigs', reply, dbus.Array(self.service.configs, signature='o'))
+
+    @dbus.service.method(CONFIG_INTERFACE, in_signature='ssbb', out_signature='o', async_callbacks=('reply', 'error'))
+    def Import(self, name, config, single_use, persistent, reply, error):
+        path = self.add(name)
+        self.service.call('Import', reply, dbus.ObjectPath(path))
+        self.ConfigurationManagerEvent(path, CREATED, self.service.owner)
+
+    @dbus.service.signal(CONFIG_INTERFACE, signature='oqu')
+    def ConfigurationManagerEvent(self, path, event_type, owner):
+        pass
+
+
+class Session(PropertiesObject):
+
+    def __init__(self, service, path, config_path):
+        super().__init__(service, path)
+        self.config_path = config_path
+        self.config_name = service.configs[config_path].values['name']
+        self.created = time.monotonic()
+        self.connected_at = None
+        self.status = (MAJOR_SESSION, SESS_NEW, "")
+        self.closed = False
+
+    def properties(self):
+        major, minor, message = self.status
+        return {
+            'config_name': self.config_name,
+            'config_path': dbus.ObjectPath(self.config_path),
+            'status': dbus.Struct((dbus.UInt32(major), dbus.UInt32(minor), message), signature='uus'),
+            'last_log': dbus.Dictionary({'log_message': message}, signature='sv'),
+            'statistics': dbus.Dictionary(self.statistics(), signature='sx'),
+        }
+
+    def statistics(self):
+        connected = 0 if self.connected_at is None else time.monotonic() - self.connected_at
+        rate = self.service.options.traffic_rate
+        return {'BYTES_IN': int(connected * rate), 'BYTES_OUT': int(connected * rate / 4),
+                'PACKETS_IN': int(connected * rate / 1000), 'PACKETS_OUT': int(connected * rate / 4000)}
+
+    def set_status(self, major, minor, message):
+        if self.closed:
+            return
+        self.status = (major, minor, message)
+        self.StatusChange(dbus.UInt32(major), dbus.UInt32(minor), message)
+
+    @dbus.service.signal(SESSIONS_INTERFACE, signature='uus')
+    def StatusChange(self, major, minor, message):
+        pass
+
+    @dbus.service.method(SESSIONS_INTERFACE, async_callbacks=('reply', 'error'))
+    def Ready(self, reply, error):
+        if time.monotonic() - self.created < self.service.options.ready_delay:
+            self.service.calls['Ready'] += 1
+            raise NotReady("Backend VPN process is not ready")
+        self.service.call('Ready', reply)
+
+    @dbus.service.method(SESSIONS_INTERFACE, async_callbacks=('reply', 'error'))
+    def Connect(self, reply, error):
+        options = self.service.options
+        self.service.call('Connect', reply)
+        self.set_status(MAJOR_CONNECTION, CONN_CONNECTING, "Connecting")
+        if options.auth_url:
+            url = f"https://idp.invalid/saml?session={self.path.rsplit('/', 1)[-1]}"
+            self.service.later(options.connect_delay, self.set_status, MAJOR_SESSION, SESS_AUTH_URL, url)
+            self.service.later(options.connect_delay + options.auth_delay, self.authenticated)
+        else:
+            self.service.later(options.connect_delay, self.authenticated)
+
+    def authenticated(self):
+        if self.closed:
+            return
+        if random.random() < self.service.options.auth_fail_rate:
+            self.set_status(MAJOR_CONNECTION, CONN_AUTH_FAILED, "Authentication failed")
+            return
+        self.connected_at = time.monotonic()
+        self.set_status(MAJOR_CONNECTION, CONN_CONNECTED, "Connected")
+        if self.service.options.drop_after > 0:
+            self.service.later(self.service.options.drop_after, self.close)
+
+    @dbus.service.method(SESSIONS_INTERFACE, async_callbacks=('reply', 'error'))
+    def Disconnect(self, reply, error):
+        self.service.call('Disconnect', reply)
+        self.close()
+
+    @dbus.service.method(SESSIONS_INTERFACE, in_signature='b', async_callbacks=('reply', 'error'))
+    def LogForward(self, enable, reply, error):
+        self.service.call('LogForward', reply)
+
+    def close(self):
+        if self.closed:
+            return
+        self.set_status(MAJOR_CONNECTION, CONN_DISCONNECTED, "Disconnected")
+        self.closed = True
+        self.remove_from_connection()
+        del self.service.sessions[self.path]
+        self.service.session_manager.SessionManagerEvent(self.path, DESTROYED, self.service.owner)
+
+
+class SessionManager(dbus.service.Object):
+
+    def __init__(self, service):
+        super().__init__(service.bus, SESSIONS_ROOT_PATH)
+        self.service = service
+
+    @dbus.service.method(SESSIONS_INTERFACE, out_signature='ao', async_callbacks=('reply', 'error'))
+    def FetchAvailableSessions(self, reply, error):
+        self.service.call('FetchAvailableSessions', reply, dbus.Array(self.service.sessions, signature='o'))
+
+    @dbus.service.method(SESSIONS_INTERFACE, in_signature='o', out_signature='o', async_callbacks=('reply', 'error'))
+    def NewTunnel(self, config_path, reply, error):
+        if str(config_path) not in self.service.configs:
+            raise dbus.DBusException(f"No config {config_path}", name='net.openvpn.v3.error.config')
+        path = f"{SESSIONS_ROOT_PATH}/fake{next(self.service.ids):06d}"
+        self.service.call('NewTunnel', reply, dbus.ObjectPath(path))
+        self.service.sessions[path] = Session(self.service, path, str(config_path))
+        self.SessionManagerEvent(path, CREATED, self.service.owner)
+
+    @dbus.service.signal(SESSIONS_INTERFACE, signature='oqu')
+    def SessionManagerEvent(self, path, event_type, owner):
+        pass
+
+
+class Control(dbus.service.Object):
+    """Benchmark side channel: call counters of the fake services."""
+
+    def __init__(self, service):
+        super().__init__(service.bus, '/net/openvpn/v3/fake')
+        self.service = service
+
+    @dbus.service.method(FAKE_INTERFACE, out_signature='a{su}')
+    def Stats(self):
+        return dbus.Dictionary(dict(self.service.calls), signature='su')
+
+    @dbus.service.method(FAKE_INTERFACE)
+    def Reset(self):
+        self.service.calls.clear()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--configs', type=int, default=10, help="number of configs to create")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every method reply")
+    parser.add_argument('--ready-delay', type=float, default=0.2, help="seconds before a new session is Ready")
+    parser.add_argument('--connect-delay', type=float, default=0.5, help="seconds from Connect to auth URL or Connected")
+    parser.add_argument('--auth-url', action='store_true', help="emit an auth URL before connecting")
+    parser.add_argument('--auth-delay', type=float, default=1.0, help="seconds from auth URL to Connected")
+    parser.add_argument('--auth-fail-rate', type=float, default=0.0, help="fraction of sessions that end in auth failed")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="fraction of --fail-methods calls that fail")
+    parser.add_argument('--fail-methods', default='Connect', type=lambda value: set(value.split(',')),
+                        help="comma separated methods --fail-rate applies to")
+    parser.add_argument('--drop-after', type=float, default=0.0, help="seconds after which connected sessions drop, 0 never")
+    parser.add_argument('--traffic-rate', type=float, default=100000.0, help="bytes/s reported in the statistics of connected sessions")
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+    # dbus-python's SystemBus honours DBUS_SYSTEM_BUS_ADDRESS, like the backend does
+    if 'DBUS_SYSTEM_BUS_ADDRESS' not in os.environ:
+        raise SystemExit("Set DBUS_SYSTEM_BUS_ADDRESS to a private bus, see bench/run_benchmarks.py")
+    bus = dbus.SystemBus()
+    service = FakeService(bus, options)
+    service.config_manager = ConfigurationManager(service)
+    service.session_manager = SessionManager(service)
+    service.control = Control(service)
+    for index in range(options.configs):
+        service.config_manager.add(f"bench-{index:04d}")
+    # Names are released when these go away, keep them for the life of the loop
+    bus_names = [dbus.service.BusName(CONFIG_INTERFACE, bus), dbus.service.BusName(SESSIONS_INTERFACE, bus)]
+    print(f"ready, owning {', '.join(name.get_name() for name in bus_names)}", flush=True)
+    GLib.MainLoop().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""End-to-end benchmarks of the backend against bench/fake_openvpn3.py.
+
+For every config count a private dbus-daemon, the fake openvpn3 services and
+a backend are started. The backend gets its own socket, settings, auto_restart
+settings, log and snapshot in a temp directory; it doesn't need anything under
+/opt/openvpn-saml, a missing window icon is skipped. Reported per count:
+
+  cold start      launch to the first get_vpn_status answer listing every config
+  IPC latency     ping and get_vpn_status round-trips over the framed socket
+  idle D-Bus      method calls per second the backend makes while nothing happens
+  idle CPU        backend CPU time per second per config while idle
+  time to online  connect request to the pushed "VPN Online" status
+
+Needs dbus-daemon, dbus-python and, for the default --core headless, dbus-next.
+--core threads needs a display (e.g. xvfb-run) as it starts Tk.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import dbus
+import dbus.bus
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from openvpn_saml_ipc import BackendConnection
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def summarize(values):
+    return {'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95), 'max': max(values) if values else None}
+
+
+def process_cpu_time(pid):
+    with open(f'/proc/{pid}/stat', 'r') as stat_file:
+        fields = stat_file.read().rsplit(')', 1)[1].split()
+    # utime and stime, fields 14 and 15 of proc(5)
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+class BenchEnvironment:
+    """Private bus, fake openvpn3 and a backend for one config count."""
+
+    def __init__(self, configs, options):
+        self.configs = configs
+        self.options = options
+        self.directory = tempfile.mkdtemp(prefix='openvpn-saml-bench-')
+        self.socket_path = os.path.join(self.directory, 'backend.socket')
+        self.processes = []
+        self.bus_address = None
+        self.backend = None
+        self.started = None
+
+    def start(self):
+        bus_daemon = subprocess.Popen(['dbus-daemon', '--session', '--nofork', '--print-address=1'],
+                                      stdout=subprocess.PIPE, text=True)
+        self.processes.append(bus_daemon)
+        self.bus_address = bus_daemon.stdout.readline().strip()
+        env = dict(os.environ, DBUS_SYSTEM_BUS_ADDRESS=self.bus_address)
+
+        fake = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'fake_openvpn3.py'), '--configs', str(self.configs)]
+                                + self.options.fake_args, env=env, stdout=subprocess.PIPE, text=True)
+        self.processes.append(fake)
+        if not fake.stdout.readline().startswith('ready'):
+            raise RuntimeError("fake openvpn3 service did not start")
+
+        settings_path = os.path.join(self.directory, 'backend_settings.json')
+        with open(settings_path, 'w', encoding='utf-8') as settings_file:
+            json.dump({
+                'core': 'asyncio' if self.options.core != 'threads' else 'threads',
+                'headless': self.options.core == 'headless',
+                'log_file': os.path.join(self.directory, 'backend.log'),
+                'state_snapshot_path': os.path.join(self.directory, 'backend_state.json'),
+                'connect_history_path': os.path.join(self.directory, 'connect_history.jsonl'),
+                'browser_prewarm': False,
+                'watch_network': False,
+                'max_parallel_connects': self.options.parallel_connects,
+            }, settings_file)
+        env.update(OPENVPN_SAML_SOCKET=self.socket_path, OPENVPN_SAML_BACKEND_SETTINGS=settings_path,
+                   OPENVPN_SAML_AUTO_RESTART_SETTINGS=os.path.join(self.directory, 'auto_restart_settings.json'))
+        self.started = time.monotonic()
+        self.backend = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'openvpn-saml-backend.py')], env=env,
+                                        stdout=subprocess.DEVNULL)
+        self.processes.append(self.backend)
+
+    def fake_control(self):
+        bus = dbus.bus.BusConnection(self.bus_address)
+        return dbus.Interface(bus.get_object('net.openvpn.v3.sessions', '/net/openvpn/v3/fake'), 'net.openvpn.v3.fake')
+
+    def stop(self):
+        try:
+            BackendConnection(self.socket_path, timeout=10).request('quit')
+        except OSError:
+            pass
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def wait_for_backend(environment, timeout):
+    connection = BackendConnection(environment.socket_path, timeout=timeout)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            statuses = connection.request('get_vpn_status')
+        except OSError:
+            time.sleep(0.005)
+            continue
+        if isinstance(statuses, list) and len(statuses) >= environment.configs:
+            return time.monotonic() - environment.started, connection
+        time.sleep(0.005)
+    raise TimeoutError(f"Backend did not list {environment.configs} configs within {timeout} sec")
+
+
+def measure_ipc(connection, requests):
+    results = {}
+    for function_name in ('ping', 'get_vpn_status'):
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            connection.request(function_name)
+            latencies.append(time.perf_counter() - started)
+        results[function_name] = summarize(latencies)
+    return results
+
+
+def measure_idle(environment, seconds):
+    control = environment.fake_control()
+    control.Reset()
+    cpu_before = process_cpu_time(environment.backend.pid)
+    time.sleep(seconds)
+    cpu_used = process_cpu_time(environment.backend.pid) - cpu_before
+    calls = sum(int(count) for count in control.Stats().values())
+    return {'dbus_calls_per_sec': calls / seconds, 'cpu_per_config': cpu_used / seconds / environment.configs}
+
+
+def measure_time_to_online(environment, count, timeout):
+    online = {}
+    requested = {}
+    all_online = threading.Event()
+
+    def on_event(event):
+        if event.get('event') == 'status' and event.get('new') == "VPN Online" and event['config'] in requested:
+            online.setdefault(event['config'], time.monotonic() - requested[event['config']])
+            if len(online) == len(requested):
+                all_online.set()
+
+    subscriber = BackendConnection(environment.socket_path, timeout=timeout, on_event=on_event)
+    subscriber.request('subscribe')
+    connection = BackendConnection(environment.socket_path, timeout=timeout)
+    for index in range(count):
+        config_name = f"bench-{index:04d}"
+        requested[config_name] = time.monotonic()
+        connection.request('connect', {'config': config_name})
+    all_online.wait(timeout)
+    subscriber.close()
+    return dict(summarize(list(online.values())), online=len(online), requested=count)
+
+
+def run(configs, options):
+    environment = BenchEnvironment(configs, options)
+    try:
+        environment.start()
+        cold_start, connection = wait_for_backend(environment, options.timeout)
+        result = {'configs': configs, 'cold_start': cold_start}
+        result['ipc'] = measure_ipc(connection, options.ipc_requests)
+        result['idle'] = measure_idle(environment, options.idle_seconds)
+        result['time_to_online'] = measure_time_to_online(environment, min(configs, options.connects), options.timeout)
+        # Per D-Bus method and socket command counts and latencies as seen by the backend, only kept in --json
+        result['backend_stats'] = connection.request('stats').get('result')
+        return result
+    finally:
+        environment.stop()
+
+
+def format_seconds(value):
+    return '-' if value is None else f"{value * 1000:.1f}ms"
+
+
+def print_result(result):
+    ipc, idle, online = result['ipc'], result['idle'], result['time_to_online']
+    print(f"{result['configs']:>5} configs  cold start {format_seconds(result['cold_start'])}"
+          f"  ping p50/p95 {format_seconds(ipc['ping']['p50'])}/{format_seconds(ipc['ping']['p95'])}"
+          f"  status p50/p95 {format_seconds(ipc['get_vpn_status']['p50'])}/{format_seconds(ipc['get_vpn_status']['p95'])}"
+          f"  idle {idle['dbus_calls_per_sec']:.2f} calls/s {idle['cpu_per_config'] * 1000:.3f}ms cpu/s/config"
+          f"  online {online['online']}/{online['requested']} p50/p95 {format_seconds(online['p50'])}/{format_seconds(online['p95'])}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1,10,100,500', type=lambda value: [int(size) for size in value.split(',')],
+                        help="comma separated config counts")
+    parser.add_argument('--core', choices=('headless', 'asyncio', 'threads'), default='headless')
+    parser.add_argument('--ipc-requests', type=int, default=200)
+    parser.add_argument('--idle-seconds', type=float, default=10)
+    parser.add_argument('--connects', type=int, default=20, help="configs connected for time to online")
+    parser.add_argument('--parallel-connects', type=int, default=4, help="max_parallel_connects of the backend")
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('fake_args', nargs=argparse.REMAINDER, help="after --, passed on to fake_openvpn3.py")
+    options = parser.parse_args()
+    options.fake_args = [arg for arg in options.fake_args if arg != '--']
+    return options
+
+
+def main():
+    options = parse_args()
+    results = []
+    for configs in options.sizes:
+        result = run(configs, options)
+        print_result(result)
+        results.append(result)
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
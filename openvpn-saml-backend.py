@@ -1,134 +1,1240 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, simpledialog, PhotoImage
-import dbus
 import time
-import webbrowser
+# Taken before the remaining imports so the cold start measurement includes them
+STARTED_AT = time.monotonic()
 import subprocess
 import threading
 import datetime
 import json
 import os
 import shutil
-import signal
 import sys
-import psutil
 import socket
 import pickle
+import itertools
+import tempfile
+import random
+import select
+import struct
+import asyncio
+import queue
+import array
+import bisect
+import collections
+import logging
+import logging.handlers
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process, Pipe, freeze_support
+
+from openvpn_saml_ipc import SOCKET_PATH, send_frame, recv_frame, encode_frame, recv_frame_async
+from openvpn_saml_profile import SamplingProfiler, format_thread_stacks
+
+# tkinter, dbus-python and dbus-next are imported on first use by the functions
+# below, Qt only in the browser process (openvpn_saml_browser.py), so --headless
+# can bind its socket without loading any of them.
+tk = ttk = filedialog = simpledialog = PhotoImage = None
+dbus = GLib = None
+dbus_next = None
+
+def import_tk():
+    global tk, ttk, filedialog, simpledialog, PhotoImage
+    import tkinter as tk
+    from tkinter import ttk, filedialog, simpledialog, PhotoImage
+
+def import_dbus():
+    global dbus, GLib
+    import dbus
+    import dbus.bus
+    import dbus.mainloop.glib
+    from gi.repository import GLib
+
+def import_dbus_next():
+    global dbus_next
+    import dbus_next
+    import dbus_next.aio
+    import dbus_next.errors
+
+BACKEND_SETTINGS_PATH = os.environ.get('OPENVPN_SAML_BACKEND_SETTINGS', '/opt/openvpn-saml/backend_settings.json')
+AUTO_RESTART_SETTINGS_PATH = os.environ.get('OPENVPN_SAML_AUTO_RESTART_SETTINGS', '/opt/openvpn-saml/auto_restart_settings.json')
+DEFAULT_BACKEND_SETTINGS = {
+    # 'threads' runs MyApp, 'asyncio' runs AsyncBackendCore (same as --async-core)
+    'core': 'threads',
+    # Run the asyncio core without a window (same as --headless), Tk is only
+    # loaded when the settings window is opened
+    'headless': False,
+    # Seconds from process start to the first get_vpn_status answer we aim for,
+    # a slower cold start is logged as a warning
+    'cold_start_target': 0.5,
+    # Full D-Bus rescan of all sessions, only a safety net for missed signals
+    'status_poll_interval': 30,
+    # Worker threads for socket commands that can take seconds (see LONG_RUNNING_COMMANDS)
+    'command_workers': 4,
+    # Tunnels that may be in their NewTunnel..auth URL phase at the same time
+    'max_parallel_connects': 4,
+    # Seconds a config may spend starting before we stop waiting on it,
+    # can be overridden per config with 'connect_timeout' in auto_restart_settings.json
+    'connect_timeout': 30,
+    # Seconds to wait for a new tunnel to become ready and for its auth URL,
+    # an auth URL that arrives later is still picked up from the session signals
+    'ready_timeout': 10,
+    'auth_url_timeout': 5,
+    # Fallback D-Bus polling while waiting on a session, doubled after every poll
+    'poll_initial_interval': 0.05,
+    'poll_max_interval': 2,
+    # The SAML browser process is started in the background after launch and
+    # exits after this many seconds without open tabs
+    'browser_prewarm': True,
+    'browser_idle_timeout': 600,
+    # Auth URLs first load in the hidden window, most re-auths finish by redirect
+    # with the saved cookies. The window is only shown if a tab is still open
+    # after this many seconds, 0 always shows it right away.
+    'silent_sso_timeout': 8,
+    # Seconds to hold back collected auth URLs while other connects may still
+    # produce theirs, so they open together in one browser window
+    'auth_batch_grace': 2,
+    # The full log goes to a rotating file, the settings window keeps only the last lines
+    'log_file': '/opt/openvpn-saml/openvpn-saml-backend.log',
+    'log_max_bytes': 1024 * 1024,
+    'log_backup_count': 3,
+    'log_max_lines': 1000,
+    'log_flush_interval_ms': 100,
+    # Config index, sessions and statuses are kept here so a restarted backend can
+    # answer the tray at once and check them against D-Bus in the background.
+    # Written at most once per state_snapshot_delay seconds.
+    'state_snapshot_path': '/opt/openvpn-saml/backend_state.json',
+    'state_snapshot_delay': 2,
+    # A connect/disconnect request that repeats the operation a config finished
+    # less than this many seconds ago gets that result instead of running again
+    'operation_debounce': 3,
+    # Reconnect scheduler: seconds before the first retry of a dropped auto_restart
+    # config, doubled per failed attempt up to the maximum, each delay randomised
+    # by +-50% so many machines that lost the network don't retry in lockstep.
+    # All but the last one can be overridden per config in auto_restart_settings.json.
+    'reconnect_initial_delay': 5,
+    'reconnect_max_delay': 300,
+    # A session stuck connecting this long is restarted, one waiting for web
+    # authentication is left alone this long
+    'reconnect_stuck_after': 60,
+    'reconnect_auth_grace': 300,
+    'max_parallel_reconnects': 2,
+    # Watch rtnetlink for default route/link/address changes and logind for
+    # suspend/resume, and reconnect soon instead of waiting for the scheduler's
+    # backoff. Bursts of network events are merged for network_settle_delay seconds,
+    # then tunnels that are not online retry after a random delay of up to
+    # network_reconnect_jitter seconds so the machines of a whole site don't retry at once.
+    'watch_network': True,
+    'network_settle_delay': 2,
+    'network_reconnect_jitter': 10,
+    # All Disconnect calls of a bulk disconnect are sent at once; this is how long
+    # we wait for all of their replies together
+    'disconnect_timeout': 5,
+    # Count and time every D-Bus call and socket command, read them with the
+    # 'stats' socket command. If stats_dump_path is set they are also appended
+    # to it as one JSON line every stats_dump_interval seconds.
+    'collect_stats': True,
+    'stats_dump_path': None,
+    'stats_dump_interval': 60,
+    # Every connect attempt's timeline is appended to connect_history_path as one
+    # JSON line, the file is moved to .1 once it is larger than connect_history_max_bytes.
+    # The last connect_history_keep attempts per config give the percentiles of 'timeline'.
+    'connect_history_path': '/opt/openvpn-saml/connect_history.jsonl',
+    'connect_history_max_bytes': 1024 * 1024,
+    'connect_history_keep': 50,
+    # Byte and packet counters of connected sessions are read every statistics_interval
+    # seconds (0 turns this off), the last statistics_samples per session are kept.
+    # A connected session that received nothing for stall_after seconds is reported as stalled.
+    'statistics_interval': 5,
+    'statistics_samples': 120,
+    'stall_after': 60,
+}
+
+# Socket commands that run on the worker pool; the client gets a job id back at once
+LONG_RUNNING_COMMANDS = {"connect", "restart_all_connections", "stop_all_connections", "refresh"}
+MAX_KEPT_JOBS = 100
+# Answered before the state is ready, so a backend stuck starting up can still be inspected
+READY_EXEMPT_COMMANDS = {"ping", "stats", "profile", "thread_stacks"}
+
+STATE_SNAPSHOT_VERSION = 1
+
+# Characters of the traffic sparklines, lowest to highest
+SPARKLINE_CHARS = "\u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588"
+
+# Steps of a connect attempt, recorded as seconds since the connect was requested.
+# "auth completed" is the first session status after the auth URL that is not an
+# auth status, "tray status" when the VPN Online status was written to a tray.
+CONNECT_TIMING_STEPS = ("NewTunnel", "Ready", "Connect", "auth URL", "browser shown", "auth completed", "Connected", "tray status")
+
+SESSIONS_ROOT_PATH = '/net/openvpn/v3/sessions'
+CONFIGURATION_ROOT_PATH = '/net/openvpn/v3/configuration'
+
+# SessionManagerEvent types
+SESSION_CREATED = 1
+SESSION_DESTROYED = 2
+
+# ConfigurationManagerEvent types
+CONFIG_CREATED = 1
+CONFIG_DESTROYED = 2
+CONFIG_NAME_CHANGED = 3
+
+CONN_CONNECTED = 7
+CONN_PAUSED = 14
+SESS_AUTH_URL = 22
+
+# rtnetlink, see rtnetlink(7)
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+NLM_F_REQUEST, NLM_F_DUMP = 0x1, 0x300
+RTM_NEWLINK, RTM_DELLINK, RTM_GETLINK = 16, 17, 18
+RTM_NEWADDR, RTM_DELADDR = 20, 21
+RTM_NEWROUTE, RTM_DELROUTE = 24, 25
+RT_TABLE_MAIN = 254
+RT_SCOPE_LINK = 253
+IFF_LOWER_UP = 0x10000
+ARPHRD_NONE = 65534  # tun devices, i.e. our own tunnels
+NLMSG_HEADER = struct.Struct('=IHHII')
+IFINFOMSG = struct.Struct('=BxHiII')
+IFADDRMSG = struct.Struct('=BBBBi')
+RTMSG = struct.Struct('=BBBBBBBBI')
+
+# StatusMinor codes the reconnect scheduler treats as "still coming up" and
+# "waiting for the user"
+STARTING_MINOR_CODES = {5, 6, 12, 15, 17, 18}
+AUTH_MINOR_CODES = {20, 21, SESS_AUTH_URL}
+
+# openvpn3 StatusMinor codes, mapped to the wording used in the status labels
+STATUS_MINOR_TEXT = {
+    5: "Connecting",                        # CONN_INIT
+    6: "Connecting",                        # CONN_CONNECTING
+    7: "Connected",                         # CONN_CONNECTED
+    8: "Disconnecting",                     # CONN_DISCONNECTING
+    9: "Disconnected",                      # CONN_DISCONNECTED
+    10: "Connection failed",                # CONN_FAILED
+    11: "Authentication failed",            # CONN_AUTH_FAILED
+    12: "Reconnecting",                     # CONN_RECONNECTING
+    13: "Pausing",                          # CONN_PAUSING
+    14: "Paused",                           # CONN_PAUSED
+    15: "Resuming",                         # CONN_RESUMING
+    17: "Starting",                         # SESS_NEW
+    18: "Starting",                         # SESS_BACKEND_COMPLETED
+    20: "Waiting for credentials",          # SESS_AUTH_USERPASS
+    21: "Waiting for challenge",            # SESS_AUTH_CHALLENGE
+    22: "Waiting for web authentication",   # SESS_AUTH_URL
+}
+
+def read_auto_restart_settings():
+
+    config_file_path = AUTO_RESTART_SETTINGS_PATH
+    try:
+        with open(config_file_path, "r", encoding="utf-8") as config_file:
+            return json.load(config_file)
+    except FileNotFoundError:
+        return {}
+
+def write_auto_restart_settings(auto_restart_settings):
+
+    config_file_path = AUTO_RESTART_SETTINGS_PATH
+    with open(config_file_path, "w", encoding="utf-8") as config_file:
+        json.dump(auto_restart_settings, config_file, ensure_ascii=False)
+
+def read_backend_settings():
+
+    settings = dict(DEFAULT_BACKEND_SETTINGS)
+    try:
+        with open(BACKEND_SETTINGS_PATH, "r", encoding="utf-8") as settings_file:
+            settings.update(json.load(settings_file))
+    except FileNotFoundError:
+        pass
+    return settings
+
+def create_file_logger(settings):
+
+    logger = logging.getLogger('openvpn-saml-backend')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    try:
+        handler = logging.handlers.RotatingFileHandler(settings['log_file'], maxBytes=settings['log_max_bytes'],
+                                                       backupCount=settings['log_backup_count'], encoding='utf-8')
+    except OSError as e:
+        print(f"Can't open log file {settings['log_file']}: {e}")
+        handler = logging.NullHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    return logger
+
+def process_age():
+
+    # Seconds since this process was started, including interpreter start-up and imports
+    try:
+        with open('/proc/self/stat', 'r') as stat_file:
+            start_ticks = int(stat_file.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime', 'r') as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - STARTED_AT
+
+def boot_time():
+
+    with open('/proc/uptime', 'r') as uptime_file:
+        return time.time() - float(uptime_file.read().split()[0])
+
+def snapshot_properties(properties):
+
+    # Only the scalar config properties go into the snapshot, as plain JSON types.
+    # dbus-python's Boolean is an int subclass, so it's checked by name.
+    plain = {}
+    for key, value in properties.items():
+        if isinstance(value, bool) or type(value).__name__ == 'Boolean':
+            plain[str(key)] = bool(value)
+        elif isinstance(value, str):
+            plain[str(key)] = str(value)
+        elif isinstance(value, int):
+            plain[str(key)] = int(value)
+        elif isinstance(value, float):
+            plain[str(key)] = float(value)
+    return plain
+
+def read_state_snapshot(path):
+
+    try:
+        with open(path, 'r', encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable state snapshot {path}: {e}")
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != STATE_SNAPSHOT_VERSION:
+        return None
+    try:
+        if snapshot.get('saved', 0) < boot_time():
+            # Saved before this boot, so none of its sessions exist any more
+            snapshot['sessions'] = {}
+            snapshot['statuses'] = {name: "VPN Offline" for name in snapshot.get('statuses', {})}
+    except (OSError, ValueError):
+        pass
+    return snapshot
+
+def write_state_snapshot(path, snapshot):
+
+    # Written to a temporary file in the same directory and renamed over the old
+    # one, so a reader never sees half a snapshot
+    snapshot = dict(snapshot, version=STATE_SNAPSHOT_VERSION, saved=time.time())
+    fd, tmp_path = tempfile.mkstemp(prefix='.backend_state.', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(snapshot, snapshot_file, separators=(',', ':'))
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
 
-from PyQt6.QtWidgets import QApplication, QMainWindow, QTabWidget
-from PyQt6.QtWebEngineCore import QWebEngineSettings, QWebEngineProfile, QWebEnginePage
-from PyQt6.QtWebEngineWidgets import QWebEngineView
-from PyQt6.QtCore import QUrl, Qt, QTimer
-from PyQt6.QtGui import QIcon
-from multiprocessing import Process, set_start_method, freeze_support
+def build_state_snapshot(config_index, session_table, statuses):
 
+    return {'configs': {path: snapshot_properties(properties) for path, properties in config_index.items()},
+            'sessions': {path: dict(entry) for path, entry in session_table.items()},
+            'statuses': dict(statuses)}
 
+def parse_state_snapshot(snapshot):
 
+    # (config_index, session_table, statuses) of a snapshot from read_state_snapshot, None if it's malformed
+    try:
+        config_index = {path: dict(properties) for path, properties in snapshot['configs'].items()}
+        session_table = {path: dict(entry) for path, entry in snapshot['sessions'].items()}
+        statuses = dict(snapshot['statuses'])
+    except (KeyError, TypeError, AttributeError, ValueError):
+        return None
+    return config_index, session_table, statuses
+
+def run_browser_process(conn, idle_timeout, prewarm, silent_timeout):
+    from openvpn_saml_browser import start_browser_service
+    start_browser_service(conn, idle_timeout, prewarm, silent_timeout)
+
+def format_connect_timing(timing):
+
+    return ', '.join(f"{step} {timing[step] - timing['requested']:.2f}s" for step in CONNECT_TIMING_STEPS if step in timing)
+
+def describe_session_status(status):
+    # Status text of a config's session -> text and color shown for the config
+    if "Connected" in status:
+        return "VPN Online", "green"
+    elif "Starting" in status:
+        return "Starting...", "orange"
+    elif "Connecting" in status:
+        return "Connecting...", "orange"
+    return status, "orange"
+
+def describe_config_status(session_entries):
+    # Text and color shown for a config whose sessions have these entries
+    if not session_entries:
+        return "VPN Offline", "red"
+    return describe_session_status(session_entries[0]['status'])
+
+def session_phase(entry):
+    # 'online', 'auth' (waiting for the user), 'starting' or 'down' for a session entry or None
+    if entry is None:
+        return 'down'
+    if entry['minor'] in (CONN_CONNECTED, CONN_PAUSED):
+        return 'online'
+    if entry['minor'] in AUTH_MINOR_CODES:
+        return 'auth'
+    if entry['minor'] in STARTING_MINOR_CODES:
+        return 'starting'
+    return 'down'
+
+def make_session_entry(config_name, status, last_log):
+    # Session table entry of both backend cores, status is the session's (major, minor, message)
+    major, minor, message = status
+    return {
+        'config_name': str(config_name),
+        'major': int(major),
+        'minor': int(minor),
+        'status': STATUS_MINOR_TEXT.get(int(minor), last_log),
+        'message': str(message),
+        'last_log': last_log,
+        'updated': time.time(),
+    }
+
+def apply_session_status(entry, major, minor, message):
+
+    entry.update({'major': int(major), 'minor': int(minor), 'status': STATUS_MINOR_TEXT.get(int(minor), str(message)),
+                  'message': str(message), 'updated': time.time()})
+
+def apply_session_log(entry, log_message):
+
+    # The log line is shown as the status while the minor code has no text of its own.
+    # Returns whether the status changed.
+    entry['last_log'] = str(log_message)
+    if entry['minor'] in STATUS_MINOR_TEXT:
+        return False
+    entry['status'] = entry['last_log']
+    entry['updated'] = time.time()
+    return True
+
+def mark_session_status(connect_timelines, session_path, minor, log):
+
+    if minor not in AUTH_MINOR_CODES:
+        connect_timelines.mark_session(session_path, 'auth completed', after='auth URL')
+    if minor == CONN_CONNECTED:
+        attempt = connect_timelines.mark_session(session_path, 'Connected')
+        if attempt is not None:
+            log(f"{attempt['config_name']} online in {attempt['Connected'] - attempt['requested']:.2f} sec ({format_connect_timing(attempt)})")
+
+def waiting_auth_urls(session_table):
+
+    # Sessions that show an auth URL, queued again after a rescan in case their signal was missed
+    return [(session_path, entry['message']) for session_path, entry in session_table.items() if entry['minor'] == SESS_AUTH_URL]
+
+def dbus_call_name(interface, member, args):
+
+    # Properties calls are told apart by the property they read or write
+    name = f"{(interface or '').rsplit('.', 1)[-1]}.{member}"
+    if interface == 'org.freedesktop.DBus.Properties' and member in ('Get', 'Set') and len(args) > 1:
+        name += f" {args[1]}"
+    return name
+
+def append_stats_dump(path, call_stats):
+
+    with open(path, 'a', encoding='utf-8') as dump_file:
+        dump_file.write(json.dumps(dict(call_stats.snapshot(), time=time.time())) + '\n')
+
+class CallStats:
+    """Call counts, error counts and latency histograms per kind ('dbus', 'ipc', 'job') and name.
+
+    record() may be called from any thread and only updates a few counters
+    under a lock. The hooks that call it check enabled first, so a disabled
+    instance costs one attribute read per call.
+    """
+
+    # Upper bounds of the latency buckets in seconds, the last bucket counts everything slower
+    BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10)
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        # (kind, name) -> [count, errors, total seconds, max seconds, histogram]
+        self.entries = {}
+        self.since = time.time()
+
+    def record(self, kind, name, elapsed, error=False):
+        with self.lock:
+            entry = self.entries.get((kind, name))
+            if entry is None:
+                entry = self.entries[(kind, name)] = [0, 0, 0.0, 0.0, [0] * (len(self.BUCKETS) + 1)]
+            entry[0] += 1
+            if error:
+                entry[1] += 1
+            entry[2] += elapsed
+            entry[3] = max(entry[3], elapsed)
+            entry[4][bisect.bisect_left(self.BUCKETS, elapsed)] += 1
+
+    def reset(self):
+        with self.lock:
+            self.entries = {}
+            self.since = time.time()
+
+    def percentile(self, histogram, count, fraction, longest):
+        # Upper bound of the bucket the percentile falls in, capped by the slowest call
+        seen = 0
+        for bound, bucket_count in zip(self.BUCKETS + (longest,), histogram):
+            seen += bucket_count
+            if seen >= fraction * count:
+                return min(bound, longest)
+        return longest
+
+    def snapshot(self):
+        with self.lock:
+            entries = {key: entry[:4] + [list(entry[4])] for key, entry in self.entries.items()}
+            since = self.since
+        result = {'enabled': self.enabled, 'since': since, 'buckets': list(self.BUCKETS)}
+        for (kind, name), (count, errors, total, longest, histogram) in sorted(entries.items()):
+            result.setdefault(kind, {})[name] = {
+                'count': count, 'errors': errors, 'total': total, 'mean': total / count, 'max': longest,
+                'p50': self.percentile(histogram, count, 0.5, longest),
+                'p95': self.percentile(histogram, count, 0.95, longest),
+                'p99': self.percentile(histogram, count, 0.99, longest),
+                'histogram': histogram}
+        return result
+
+def create_instrumented_bus(call_stats):
+
+    # Every proxy method call and property access of dbus-python goes through
+    # call_blocking or call_async of the connection, so timing those two covers all of them
+    class InstrumentedBus(dbus.bus.BusConnection):
+
+        def call_blocking(self, bus_name, object_path, dbus_interface, method, signature, args, *rest, **kwargs):
+            if not call_stats.enabled:
+                return super().call_blocking(bus_name, object_path, dbus_interface, method, signature, args, *rest, **kwargs)
+            name = dbus_call_name(dbus_interface, method, args)
+            started = time.perf_counter()
+            try:
+                result = super().call_blocking(bus_name, object_path, dbus_interface, method, signature, args, *rest, **kwargs)
+            except Exception:
+                call_stats.record('dbus', name, time.perf_counter() - started, error=True)
+                raise
+            call_stats.record('dbus', name, time.perf_counter() - started)
+            return result
+
+        def call_async(self, bus_name, object_path, dbus_interface, method, signature, args, reply_handler, error_handler,
+                       *rest, **kwargs):
+            # Calls without a reply handler don't wait for a reply, there is nothing to time
+            if not call_stats.enabled or reply_handler is None:
+                return super().call_async(bus_name, object_path, dbus_interface, method, signature, args, reply_handler,
+                                          error_handler, *rest, **kwargs)
+            name = dbus_call_name(dbus_interface, method, args)
+            started = time.perf_counter()
+
+            def on_reply(*reply):
+                call_stats.record('dbus', name, time.perf_counter() - started)
+                reply_handler(*reply)
+
+            def on_error(error):
+                call_stats.record('dbus', name, time.perf_counter() - started, error=True)
+                if error_handler is not None:
+                    error_handler(error)
+
+            return super().call_async(bus_name, object_path, dbus_interface, method, signature, args, on_reply, on_error,
+                                      *rest, **kwargs)
+
+    return InstrumentedBus(dbus.bus.BusConnection.TYPE_SYSTEM)
+
+def run_profile_command(profiler, args):
+
+    # {'action': 'start', 'duration': 30, 'interval': 0.005} or {'action': 'stop'},
+    # the result is the collapsed stack file the profile is written to
+    if args.get('action', 'start') == 'stop':
+        path = profiler.stop()
+        if path is None:
+            return {'status': 'error', 'message': "No profile is running"}
+        return {'status': 'success', 'result': path}
+    path = profiler.start(args.get('duration', 30), args.get('interval', 0.005))
+    if path is None:
+        return {'status': 'error', 'message': "A profile is already running"}
+    return {'status': 'success', 'result': path}
+
+def percentile(values, fraction):
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+class ConnectTimelines:
+    """Step timestamps of every connect attempt, with rolling percentiles per config.
+
+    start() opens an attempt when a connect is requested and attach() ties it to
+    its session once NewTunnel returns; later steps are marked by session path as
+    D-Bus signals, the browser and the status publisher report them. An attempt
+    ends when its VPN Online status was published, when its session goes away, or
+    when the next attempt of the config starts first. Finished attempts are
+    appended to the history file and the last `keep` per config are kept for the
+    percentiles, seeded from the history file on first use.
+    """
+
+    def __init__(self, history_path, max_bytes, keep, log=print):
+        self.history_path = history_path
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.log = log
+        self.lock = threading.Lock()
+        # Attempts in progress by session path and by config name
+        self.sessions = {}
+        self.current = {}
+        # config name -> deque of compact() finished attempts, see load_history
+        self.recent = None
+
+    def start(self, config_name, kind='connect'):
+        attempt = {'config_name': config_name, 'kind': kind, 'session': None, 'result': None, 'requested': time.time()}
+        with self.lock:
+            previous = self.current.get(config_name)
+            self.current[config_name] = attempt
+        if previous is not None:
+            self.finish(previous, 'abandoned')
+        return attempt
+
+    def attach(self, attempt, session_path):
+        with self.lock:
+            attempt['session'] = session_path
+            self.sessions[session_path] = attempt
+
+    def mark(self, attempt, step):
+        attempt.setdefault(step, time.time())
+
+    def mark_session(self, session_path, step, after=None):
+        # Returns the attempt if this marked the step, None if it was already marked,
+        # the session has no attempt in progress or that hasn't reached `after` yet
+        with self.lock:
+            attempt = self.sessions.get(session_path)
+            if attempt is None or step in attempt or (after is not None and after not in attempt):
+                return None
+            attempt[step] = time.time()
+            return attempt
+
+    def status_published(self, config_name, delivered):
+        with self.lock:
+            attempt = self.current.get(config_name)
+            if attempt is None or 'Connected' not in attempt:
+                return
+            if delivered:
+                attempt.setdefault('tray status', time.time())
+        self.finish(attempt, 'online')
+
+    def session_gone(self, session_path):
+        with self.lock:
+            attempt = self.sessions.get(session_path)
+        if attempt is not None:
+            self.finish(attempt, 'online' if 'Connected' in attempt else 'failed')
+
+    def finish(self, attempt, result):
+        with self.lock:
+            if attempt['result'] is not None:
+                return
+            attempt['result'] = result
+            if self.current.get(attempt['config_name']) is attempt:
+                del self.current[attempt['config_name']]
+            if self.sessions.get(attempt['session']) is attempt:
+                del self.sessions[attempt['session']]
+            self.load_history()
+            record = self.compact(attempt)
+            self.recent.setdefault(record['config'], collections.deque(maxlen=self.keep)).append(record)
+            try:
+                if os.path.exists(self.history_path) and os.path.getsize(self.history_path) > self.max_bytes:
+                    os.replace(self.history_path, self.history_path + '.1')
+                with open(self.history_path, 'a', encoding='utf-8') as history_file:
+                    history_file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            except OSError as e:
+                self.log(f"Can't write connect history: {e}")
+
+    def compact(self, attempt):
+        return {'config': attempt['config_name'], 'kind': attempt['kind'], 'result': attempt['result'],
+                'requested': round(attempt['requested'], 3), 'session': attempt['session'],
+                'steps': {step: round(attempt[step] - attempt['requested'], 3) for step in CONNECT_TIMING_STEPS if step in attempt}}
+
+    def load_history(self):
+        # Called with the lock held; read lazily so the history never slows down startup
+        if self.recent is not None:
+            return
+        self.recent = {}
+        for record in self.read_history():
+            self.recent.setdefault(record.get('config'), collections.deque(maxlen=self.keep)).append(record)
+
+    def read_history(self, config_name=None, limit=None):
+        records = []
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as history_file:
+                for line in history_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if config_name is None or record.get('config') == config_name:
+                        records.append(record)
+        except OSError:
+            pass
+        return records[-limit:] if limit else records
+
+    def report(self, config_name=None, history=0):
+        with self.lock:
+            self.load_history()
+            recent = {name: list(records) for name, records in self.recent.items() if config_name in (None, name)}
+            current = {name: self.compact(attempt) for name, attempt in self.current.items() if config_name in (None, name)}
+        configs = {}
+        for name in set(recent) | set(current):
+            records = recent.get(name, [])
+            steps = {}
+            for step in CONNECT_TIMING_STEPS:
+                offsets = [record['steps'][step] for record in records if step in record['steps']]
+                if offsets:
+                    steps[step] = {'count': len(offsets), 'p50': percentile(offsets, 0.5), 'p95': percentile(offsets, 0.95)}
+            configs[name] = {'attempts': len(records), 'results': dict(collections.Counter(record['result'] for record in records)),
+                             'steps': steps, 'last': records[-1] if records else None, 'in_progress': current.get(name)}
+        result = {'configs': configs}
+        if history:
+            result['history'] = self.read_history(config_name, history)
+        return result
+
+def format_rate(rate):
+
+    for unit in ('B/s', 'kB/s', 'MB/s'):
+        if rate < 1000:
+            return f"{rate:.0f} {unit}" if unit == 'B/s' else f"{rate:.1f} {unit}"
+        rate /= 1000
+    return f"{rate:.1f} GB/s"
+
+class TrafficHistory:
+    """The last `size` statistics samples of one session, in fixed-size arrays used as a ring buffer.
+
+    Everything is allocated up front, so a session that stays connected for
+    weeks uses as much memory as one that was just connected.
+    """
+
+    FIELDS = ('BYTES_IN', 'BYTES_OUT', 'PACKETS_IN', 'PACKETS_OUT')
+
+    def __init__(self, size):
+        self.size = size
+        self.times = array.array('d', [0.0]) * size
+        self.counters = {field: array.array('q', [0]) * size for field in self.FIELDS}
+        self.count = 0
+        self.next = 0
+        # When BYTES_IN last grew, and whether that is stall_after or longer ago
+        self.last_received = None
+        self.stalled = False
+
+    def index(self, offset):
+        # -1 is the newest sample, -count the oldest
+        return (self.next + offset) % self.size
+
+    def add(self, when, statistics):
+        bytes_in = int(statistics.get('BYTES_IN', 0))
+        if self.count == 0 or bytes_in != self.counters['BYTES_IN'][self.index(-1)]:
+            self.last_received = when
+        self.times[self.next] = when
+        for field, counter in self.counters.items():
+            counter[self.next] = int(statistics.get(field, 0))
+        self.next = (self.next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def latest(self, field):
+        return self.counters[field][self.index(-1)] if self.count else 0
+
+    def rate(self, field, intervals=1):
+        # Per second over the last `intervals` sampling intervals, counters that went
+        # back (a restarted tunnel) count as no traffic
+        intervals = min(intervals, self.count - 1)
+        if intervals < 1:
+            return 0.0
+        newest, oldest = self.index(-1), self.index(-1 - intervals)
+        elapsed = self.times[newest] - self.times[oldest]
+        if elapsed <= 0:
+            return 0.0
+        return max(0, self.counters[field][newest] - self.counters[field][oldest]) / elapsed
+
+    def sparkline(self, width):
+        bytes_in, bytes_out = self.counters['BYTES_IN'], self.counters['BYTES_OUT']
+        deltas = []
+        for offset in range(-min(width, self.count - 1), 0):
+            newer, older = self.index(offset), self.index(offset - 1)
+            deltas.append(max(0, bytes_in[newer] - bytes_in[older]) + max(0, bytes_out[newer] - bytes_out[older]))
+        peak = max(deltas, default=0)
+        if peak == 0:
+            return SPARKLINE_CHARS[0] * len(deltas)
+        return ''.join(SPARKLINE_CHARS[min(len(SPARKLINE_CHARS) - 1, delta * len(SPARKLINE_CHARS) // peak)] for delta in deltas)
+
+class TrafficStats:
+    """TrafficHistory per connected session, with stall detection and the 'traffic' summaries.
+
+    A history is dropped as soon as its session is no longer connected, so
+    memory is bounded by the number of connected sessions.
+    """
+
+    def __init__(self, size, stall_after, log=print):
+        self.size = size
+        self.stall_after = stall_after
+        self.log = log
+        self.lock = threading.Lock()
+        # Session path -> (config name, TrafficHistory)
+        self.histories = {}
+
+    def record(self, session_path, config_name, statistics, when=None):
+        when = when or time.time()
+        with self.lock:
+            if session_path not in self.histories:
+                self.histories[session_path] = (config_name, TrafficHistory(self.size))
+            history = self.histories[session_path][1]
+            history.add(when, statistics)
+            stalled = when - history.last_received >= self.stall_after
+            was_stalled, history.stalled = history.stalled, stalled
+        if stalled and not was_stalled:
+            self.log(f"No traffic received on {config_name} for {when - history.last_received:.0f} sec")
+        elif was_stalled and not stalled:
+            self.log(f"Traffic on {config_name} resumed")
+
+    def keep_only(self, session_paths):
+        with self.lock:
+            for session_path in [path for path in self.histories if path not in session_paths]:
+                del self.histories[session_path]
+
+    def report(self, sparkline_width=12):
+        now = time.time()
+        result = {}
+        with self.lock:
+            for session_path, (config_name, history) in self.histories.items():
+                rate_in, rate_out = history.rate('BYTES_IN'), history.rate('BYTES_OUT')
+                sparkline = history.sparkline(sparkline_width)
+                result[config_name] = {
+                    'session': session_path, 'samples': history.count,
+                    'bytes_in': history.latest('BYTES_IN'), 'bytes_out': history.latest('BYTES_OUT'),
+                    'packets_in': history.latest('PACKETS_IN'), 'packets_out': history.latest('PACKETS_OUT'),
+                    'rate_in': rate_in, 'rate_out': rate_out,
+                    'average_in': history.rate('BYTES_IN', history.count), 'average_out': history.rate('BYTES_OUT', history.count),
+                    'stalled': history.stalled, 'idle_for': now - history.last_received, 'sparkline': sparkline,
+                    'text': f"{sparkline} \u2193{format_rate(rate_in)} \u2191{format_rate(rate_out)}" + (" (stalled)" if history.stalled else "")}
+        return result
+
+
+def same_operation(kind, other_kind):
+
+    # A scheduler reconnect and a user connect end in the same state, so they merge
+    return kind.replace('reconnect', 'connect') == other_kind.replace('reconnect', 'connect')
+
+class ConfigOperation:
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+        self.finished = None
+        # Queued operations that were dropped in favour of this one and get its result
+        self.merged = []
+        # Called with the operation once it is done, see AsyncConfigOperations.wait
+        self.callbacks = []
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            return {'status': 'error', 'message': f'{self.kind} is still running'}
+        return self.result
+
+
+class ConfigOperations:
+    """Per-config operation state machine that merges duplicate requests.
+
+    Each config runs at most one operation ('connect', 'disconnect', ...) at a
+    time, on a thread of its own that calls run(config_name, kind). A request
+    for the operation in flight joins it, and so does one arriving less than
+    debounce seconds after the same operation succeeded. Any other request is
+    queued behind the running operation. At most one operation is queued and
+    the newest request decides what it is; if that matches the running one,
+    the queued operation is dropped and its callers get the running result.
+    """
+
+    def __init__(self, run, debounce, log=print):
+        self.run = run
+        self.debounce = debounce
+        self.log = log
+        self.lock = threading.Lock()
+        # config name -> {'current', 'next', 'last'} ConfigOperation or None
+        self.states = {}
+
+    def request(self, config_name, kind):
+        start = False
+        with self.lock:
+            state = self.states.setdefault(config_name, {'current': None, 'next': None, 'last': None})
+            current, queued, last = state['current'], state['next'], state['last']
+            if current is not None and same_operation(current.kind, kind):
+                if queued is not None:
+                    current.merged.append(queued)
+                    state['next'] = None
+                operation = current
+                self.log(f"{kind} of {config_name} already in progress, waiting for it")
+            elif current is not None:
+                if queued is None:
+                    queued = state['next'] = ConfigOperation(kind)
+                queued.kind = kind
+                operation = queued
+            elif last is not None and same_operation(last.kind, kind) and time.time() - last.finished < self.debounce:
+                operation = last
+                self.log(f"{kind} of {config_name} just finished, not repeating it")
+            else:
+                operation = state['current'] = ConfigOperation(kind)
+                start = True
+        if start:
+            self.start(config_name, operation)
+        return operation
 
-os.environ["QTWEBENGINE_CHROMIUM_FLAGS"] = "--disable-gpu"
+    def busy(self, config_name):
+        with self.lock:
+            return self.states.get(config_name, {}).get('current') is not None
 
-class Browser(QMainWindow):
-    def __init__(self, urls, title):
-        super().__init__()
-        self.urls = urls
-        self.initUI(title)
+    def start(self, config_name, operation):
+        threading.Thread(target=self._run, args=(config_name, operation), daemon=True).start()
 
-    def initUI(self, title):
-        profile_path = os.path.expanduser("~/.config/pyqt_browser_profile")
-        self.profile = QWebEngineProfile(profile_path, self)
-        self.profile.setPersistentCookiesPolicy(QWebEngineProfile.PersistentCookiesPolicy.ForcePersistentCookies)
-        
-        self.tab_widget = QTabWidget()
-        self.setCentralWidget(self.tab_widget)
-
-        for url in self.urls:
-            self.add_tab(url)
-
-        self.resize(390, 800)
-        self.setWindowTitle(title)
-        self.show()
-
-    def add_tab(self, url):
-        browser = QWebEngineView()
-        page = QWebEnginePage(self.profile, browser)
-        browser.setPage(page)
-
-        settings = browser.settings()
-        settings.setAttribute(QWebEngineSettings.WebAttribute.LocalStorageEnabled, True)
-        settings.setAttribute(QWebEngineSettings.WebAttribute.AutoLoadImages, True)
-        settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptEnabled, True)
-        settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanOpenWindows, True)
-        settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanAccessClipboard, True)
-
-        browser.setUrl(QUrl(url))
-        page.windowCloseRequested.connect(self.handleWindowCloseRequested)
-
-        # Check for 'window.close()' in the page source after it has loaded
-        page.loadFinished.connect(lambda: self.check_page_for_window_close(page, browser))
-
-        tab_index = self.tab_widget.addTab(browser, QUrl(url).host())
-        self.tab_widget.setCurrentIndex(tab_index)
-
-    def check_page_for_window_close(self, page, browser):
-        # Get the page source and check for 'window.close()'
-        page.runJavaScript("document.documentElement.outerHTML", lambda source: self.handle_page_source(source, browser))
-
-    def handle_page_source(self, source, browser):
-        if source is None:
-            print("Failed to retrieve page source")
-        elif 'window.close()' in source:
-            print("Found window.close() in page source")
-            # Close the tab after 3 seconds
-            QTimer.singleShot(3000, lambda: self.close_tab(browser))
-
-    def close_tab(self, browser):
-        if browser:
-            index = self.tab_widget.indexOf(browser)
-            if index != -1:
-                self.tab_widget.removeTab(index)
-                browser.page().deleteLater()
-                browser.deleteLater()
-
-        if self.tab_widget.count() == 0:
-            self.close()
-
-    def handleWindowCloseRequested(self):
-        current_widget = self.tab_widget.currentWidget()
-        if current_widget:
-            page = current_widget.page()
-            page.deleteLater()
-            current_widget.deleteLater()
-            self.tab_widget.removeTab(self.tab_widget.currentIndex())
-        if self.tab_widget.count() == 0:
-            self.close()
-
-    def closeEvent(self, event):
-        while self.tab_widget.count() > 0:
-            current_widget = self.tab_widget.widget(0)
-            if current_widget:
-                page = current_widget.page()
-                page.deleteLater()
-                current_widget.deleteLater()
-                self.tab_widget.removeTab(0)
-        event.accept()
-
-def start_browser(urls):
-    app = QApplication.instance()
-    if app is None:
-        app = QApplication(sys.argv)
-    icon = QIcon("/opt/openvpn-saml/openvpn.png")
-    app.setWindowIcon(icon)
-    app.setApplicationName("OpenVPN SAML AUTH")
-    window = Browser(urls, "OpenVPN SAML AUTH")
-    window.show()
-    app.exec()
-
-def run_browser_in_process(urls):
-    process = Process(target=start_browser, args=(urls,))
-    process.name = "OPENVPN SAML AUTH browser"
-    process.start()
-    #process.join()
-    return process.pid
+    def _run(self, config_name, operation):
+        while operation is not None:
+            try:
+                result = self.run(config_name, operation.kind)
+            except Exception as e:
+                result = {'status': 'error', 'message': f'Exception on backend: {e}'}
+            failed = isinstance(result, dict) and result.get('status') == 'error'
+            operation = self.finish(config_name, operation, result, failed)
+
+    def finish(self, config_name, operation, result, failed):
+        # Hands the result to everyone waiting and returns the queued operation to run next
+        with self.lock:
+            operation.finished = time.time()
+            state = self.states[config_name]
+            # Only a success is debounced, a repeated request after a failure runs again
+            state['last'] = None if failed else operation
+            state['current'], state['next'] = state['next'], None
+            next_operation = state['current']
+        for finished in [operation] + operation.merged:
+            finished.result = result
+            finished.failed = failed
+            finished.done.set()
+            for callback in finished.callbacks:
+                callback(finished)
+        return next_operation
+
+
+class AsyncConfigOperations(ConfigOperations):
+    """ConfigOperations for the asyncio core.
+
+    run(config_name, kind) is a coroutine function and operations run as tasks
+    started with spawn; everything is called on the event loop. A failed
+    operation raises its exception in every waiter.
+    """
+
+    def __init__(self, run, debounce, spawn, log=print):
+        super().__init__(run, debounce, log)
+        self.spawn = spawn
+
+    def start(self, config_name, operation):
+        self.spawn(self._run_async(config_name, operation))
+
+    async def _run_async(self, config_name, operation):
+        while operation is not None:
+            try:
+                result, failed = await self.run(config_name, operation.kind), False
+            except Exception as e:
+                self.log(f"{operation.kind} of {config_name} failed: {e}")
+                result, failed = e, True
+            operation = self.finish(config_name, operation, result, failed)
+
+    async def wait(self, operation):
+        if not operation.done.is_set():
+            future = asyncio.get_running_loop().create_future()
+            operation.callbacks.append(lambda finished: future.done() or future.set_result(None))
+            await future
+        if operation.failed:
+            raise operation.result
+        return operation.result
+
+
+class ReconnectScheduler:
+    """Decides when a config needs a reconnect, with exponential backoff and jitter.
+
+    The backend calls pick() with the configs and session entries, which runs
+    due() for every config with its first session entry (or None) and
+    attempt_started() for those it picks, at most as many as the caller has
+    free reconnect slots. Configs the user connected are
+    restarted when stuck, auto_restart configs also when their session is gone
+    or failed. A user disconnect stops both until the next connect.
+    """
+
+    def __init__(self, settings, auto_restart_settings):
+        self.settings = settings
+        self.auto_restart_settings = auto_restart_settings
+        # config name -> {'wanted', 'phase', 'since', 'attempts', 'next_attempt', 'forced'}
+        self.states = {}
+
+    def get_state(self, config_name):
+        state = self.states.get(config_name)
+        if state is None:
+            wanted = self.auto_restart_settings.get(config_name, {}).get('auto_restart', False)
+            state = self.states[config_name] = {'wanted': wanted, 'phase': None, 'since': time.time(), 'attempts': 0, 'next_attempt': 0,
+                                                'forced': False}
+        return state
+
+    def get_setting(self, config_name, key):
+        return self.auto_restart_settings.get(config_name, {}).get(key, self.settings[key])
+
+    def set_wanted(self, config_name, wanted):
+        state = self.get_state(config_name)
+        state['wanted'] = wanted
+        state['attempts'] = 0
+        state['next_attempt'] = 0
+
+    def forget(self, config_name):
+        self.states.pop(config_name, None)
+
+    def reconnect_now(self, config_name, now, force=False):
+        # Replace the backoff by a short random delay, e.g. after the network came back.
+        # force (after a resume) also reconnects a config without auto_restart that is
+        # down. Only down or failed tunnels are sped up: one that is online is never
+        # touched and one openvpn3 is still (re)connecting keeps its stuck timeout.
+        state = self.get_state(config_name)
+        state['next_attempt'] = now + random.uniform(0, self.settings['network_reconnect_jitter'])
+        state['forced'] = force
+
+    def wanted_configs(self):
+        return [config_name for config_name, state in self.states.items() if state['wanted']]
+
+    def next_delay(self, config_name, attempts):
+        delay = min(self.get_setting(config_name, 'reconnect_max_delay'),
+                    self.get_setting(config_name, 'reconnect_initial_delay') * 2 ** attempts)
+        return delay * random.uniform(0.5, 1.5)
+
+    def due(self, config_name, entry, now):
+        state = self.get_state(config_name)
+        phase = session_phase(entry)
+        if phase != state['phase']:
+            state['phase'] = phase
+            state['since'] = now
+        if phase == 'online':
+            state['attempts'] = 0
+            state['next_attempt'] = 0
+            state['forced'] = False
+            return False
+        if not state['wanted'] or now < state['next_attempt']:
+            return False
+        if phase == 'auth':
+            return now - state['since'] > self.get_setting(config_name, 'reconnect_auth_grace')
+        if phase == 'starting':
+            return now - state['since'] > self.get_setting(config_name, 'reconnect_stuck_after')
+        return state['forced'] or self.auto_restart_settings.get(config_name, {}).get('auto_restart', False)
+
+    def attempt_started(self, config_name, now):
+        state = self.get_state(config_name)
+        delay = self.next_delay(config_name, state['attempts'])
+        state['attempts'] += 1
+        state['next_attempt'] = now + delay
+        state['since'] = now
+        state['forced'] = False
+        return state['attempts'], delay
+
+    def pick(self, config_names, session_entries, now, busy, slots, log=print):
+        # Configs to reconnect now; busy(config_name) tells which ones already run an operation
+        entries = {}
+        for entry in session_entries:
+            # A config with several sessions counts as online if any of them is
+            if entries.get(entry['config_name'], {}).get('minor') != CONN_CONNECTED:
+                entries[entry['config_name']] = entry
+        picked = []
+        # Auto-restart configs first, so they get the free slots after a resume
+        for config_name in sorted(config_names, key=lambda config_name: not self.auto_restart_settings.get(config_name, {}).get('auto_restart', False)):
+            if busy(config_name) or not self.due(config_name, entries.get(config_name), now):
+                continue
+            if len(picked) >= slots:
+                break
+            attempt, delay = self.attempt_started(config_name, now)
+            log(f"Reconnecting {config_name} (attempt {attempt}), next attempt in {delay:.0f} sec if this one fails")
+            picked.append(config_name)
+        return picked
+
+
+class NetworkMonitor:
+    """Reads rtnetlink events and reduces them to the changes worth a reconnect.
+
+    parse() returns a set of reasons such as 'default route added' for a
+    buffer read from sock. It ignores the tun devices of our own tunnels, the
+    ones that already exist are loaded with a link dump at startup, and
+    link-local addresses. run() is the blocking loop used by the threaded
+    core. It waits settle_delay seconds after the first relevant event so a
+    whole burst becomes one on_change(reasons) call.
+    """
+
+    def __init__(self, on_change, settle_delay):
+        self.on_change = on_change
+        self.settle_delay = settle_delay
+        self.tunnel_links = set()
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self.sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_IFADDR | RTMGRP_IPV6_ROUTE))
+        self.load_links()
+
+    def load_links(self):
+        # Tun devices created before we started (e.g. before a backend respawn) never
+        # send RTM_NEWLINK to us, so they are read from a dump on a socket of its own
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE) as dump_sock:
+            dump_sock.settimeout(self.settle_delay + 1)
+            dump_sock.bind((0, 0))
+            request = IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+            dump_sock.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(request), RTM_GETLINK, NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + request)
+            done = False
+            while not done:
+                data = dump_sock.recv(65536)
+                self.parse(data)
+                done = not data or any(message_type in (NLMSG_DONE, NLMSG_ERROR) for message_type, _ in self.messages(data))
+
+    def messages(self, data):
+        # (message type, offset of its body) of every netlink message in data
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+            length, message_type = NLMSG_HEADER.unpack_from(data, offset)[:2]
+            if length < NLMSG_HEADER.size:
+                break
+            yield message_type, offset + NLMSG_HEADER.size
+            offset += (length + 3) & ~3
+
+    def parse(self, data):
+        reasons = set()
+        for message_type, body in self.messages(data):
+            if message_type in (RTM_NEWLINK, RTM_DELLINK) and len(data) >= body + IFINFOMSG.size:
+                _, link_type, index, flags, change = IFINFOMSG.unpack_from(data, body)
+                if link_type == ARPHRD_NONE:
+                    if message_type == RTM_NEWLINK:
+                        self.tunnel_links.add(index)
+                    else:
+                        self.tunnel_links.discard(index)
+                elif message_type == RTM_DELLINK:
+                    reasons.add(f"link {index} removed")
+                elif change & IFF_LOWER_UP:
+                    reasons.add(f"link {index} {'up' if flags & IFF_LOWER_UP else 'down'}")
+            elif message_type in (RTM_NEWADDR, RTM_DELADDR) and len(data) >= body + IFADDRMSG.size:
+                _, _, _, scope, index = IFADDRMSG.unpack_from(data, body)
+                if scope < RT_SCOPE_LINK and index not in self.tunnel_links:
+                    reasons.add(f"address {'added' if message_type == RTM_NEWADDR else 'removed'} on link {index}")
+            elif message_type in (RTM_NEWROUTE, RTM_DELROUTE) and len(data) >= body + RTMSG.size:
+                route = RTMSG.unpack_from(data, body)
+                dst_len, table = route[1], route[4]
+                if dst_len == 0 and table == RT_TABLE_MAIN:
+                    reasons.add(f"default route {'added' if message_type == RTM_NEWROUTE else 'removed'}")
+        return reasons
+
+    def run(self):
+        while True:
+            reasons = self.parse(self.sock.recv(65536))
+            if not reasons:
+                continue
+            deadline = time.monotonic() + self.settle_delay
+            while deadline > time.monotonic():
+                ready, _, _ = select.select([self.sock], [], [], deadline - time.monotonic())
+                if ready:
+                    reasons |= self.parse(self.sock.recv(65536))
+            self.on_change(sorted(reasons))
+
+
+class BrowserService:
+    """Owns the long-lived SAML browser process and hands auth URLs to it."""
+
+    def __init__(self, idle_timeout, prewarm=True, silent_timeout=0, start_timeout=30, ack_timeout=5, on_event=None):
+        self.idle_timeout = idle_timeout
+        self.prewarm = prewarm
+        self.silent_timeout = silent_timeout
+        self.start_timeout = start_timeout
+        self.ack_timeout = ack_timeout
+        self.process = None
+        self.conn = None
+        self.started = 0
+        self.seq = itertools.count(1)
+        self.lock = threading.Lock()
+        # Called on the reader thread with every message from the browser that is not an ack
+        self.on_event = on_event
+        self.acked = 0
+        self.lost_conn = None
+        self.acked_cond = threading.Condition()
+
+    def ensure_started(self):
+        with self.lock:
+            return self._ensure_started()
+
+    def _ensure_started(self):
+        if self.process is not None and self.process.is_alive():
+            return self.process.pid
+        if self.conn is not None:
+            self.conn.close()
+        self.conn, child_conn = Pipe()
+        self.process = Process(target=run_browser_process, args=(child_conn, self.idle_timeout, self.prewarm, self.silent_timeout))
+        self.process.name = "OPENVPN SAML AUTH browser"
+        # Don't keep the backend from exiting, the browser quits on its own once the pipe closes
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.started = time.time()
+        threading.Thread(target=self._read_messages, args=(self.conn,), daemon=True).start()
+        return self.process.pid
+
+    def _read_messages(self, conn):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            if 'ack' in message:
+                with self.acked_cond:
+                    self.acked = max(self.acked, message['ack'] or 0)
+                    self.acked_cond.notify_all()
+            elif self.on_event is not None:
+                self.on_event(message)
+        with self.acked_cond:
+            self.lost_conn = conn
+            self.acked_cond.notify_all()
+
+    def _send(self, message):
+        message['seq'] = next(self.seq)
+        conn = self.conn
+        conn.send(message)
+        # A fresh process needs to start Qt before it can answer
+        timeout = self.start_timeout if time.time() - self.started < self.start_timeout else self.ack_timeout
+        with self.acked_cond:
+            if not self.acked_cond.wait_for(lambda: self.acked >= message['seq'] or self.lost_conn is conn, timeout):
+                raise TimeoutError("Browser process did not answer")
+            if self.acked < message['seq']:
+                raise EOFError("Browser process closed the pipe")
+
+    def open_urls(self, urls):
+        with self.lock:
+            for attempt in range(2):
+                self._ensure_started()
+                try:
+                    self._send({'command': 'open', 'urls': urls})
+                    return self.process.pid
+                except (EOFError, OSError, TimeoutError) as e:
+                    # The process quit on idle (or crashed) while we were sending, start a new one
+                    print(f"Browser process not answering ({e}), restarting it")
+                    self.process.kill()
+                    self.process.join()
+                    self.process = None
+        return None
+
+    def stop(self):
+        with self.lock:
+            if self.process is not None and self.process.is_alive():
+                try:
+                    self.conn.send({'command': 'quit', 'seq': next(self.seq)})
+                except OSError:
+                    pass
+                self.process.join(timeout=5)
+                if self.process.is_alive():
+                    self.process.kill()
+            self.process = None
 
 
 
@@ -142,23 +1248,33 @@ class MyApp:
         self.root.title("OpenVPN SAML")
         self.root.configure(bg="#222222")
         self.root.protocol('WM_DELETE_WINDOW', self.minimize_to_tray)
-        self.root.geometry("600x280")
+        self.root.geometry("600x400")
         self.root.resizable(False, False)
-        style = ttk.Style(root)
-        img = PhotoImage(file='/opt/openvpn-saml/openvpn.png')
-        self.root.iconphoto(False, img)
+        try:
+            self.root.iconphoto(False, PhotoImage(file='/opt/openvpn-saml/openvpn.png'))
+        except tk.TclError:
+            pass
         self.menu_bar = tk.Menu(root, bg="#222222", fg="white", activebackground="#454545", activeforeground="white")
         root.config(menu=self.menu_bar)
         self.auto_restart_settings = self.load_auto_restart_settings()
+        self.backend_settings = self.load_backend_settings()
+        # update_output may be called from any thread, the Tk loop drains this queue in flush_output
+        self.log_queue = queue.SimpleQueue()
+        self.logger = self.create_file_logger()
         self.config_menu = tk.Menu(self.menu_bar, tearoff=0, bg="#222222", fg="white", activebackground="#454545", activeforeground="white")
         self.menu_bar.add_cascade(label="Config", menu=self.config_menu)
         self.config_menu.add_command(label="Add config", command=self.add_config)
         self.config_menu.add_command(label="Remove config", command=self.remove_config)
-        self.bus = dbus.SystemBus()
+        dbus.mainloop.glib.threads_init()
+        dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+        self.call_stats = CallStats(self.backend_settings['collect_stats'])
+        self.bus = create_instrumented_bus(self.call_stats)
+        self.profiler = SamplingProfiler('openvpn-saml-backend', log=self.update_output)
+        self.profiler.install_signal_handlers()
 
         self.sessions_menu = tk.Menu(self.menu_bar, tearoff=0, bg="#222222", fg="white", activebackground="#454545", activeforeground="white")
         self.menu_bar.add_cascade(label="Sessions", menu=self.sessions_menu)
-        self.sessions_menu.add_command(label="Kill all sessions", command=self.kill_sessions)
+        self.sessions_menu.add_command(label="Kill all sessions", command=self.stop_all_sessions)
 
         self.settings_menu = tk.Menu(self.menu_bar, tearoff=0, bg="#222222", fg="white", activebackground="#454545", activeforeground="white")
         self.menu_bar.add_cascade(label="Settings", menu=self.settings_menu)
@@ -168,54 +1284,432 @@ class MyApp:
         self.output_text.pack(side='top', fill='both', expand=True, padx=10, pady=10)
         self.output_text.columnconfigure(0, weight=1)
         self.output_text.configure(state='disabled')
+        self.root.after(self.backend_settings['log_flush_interval_ms'], self.flush_output)
 
-        self.notebook = ttk.Notebook(root, style='Dark.TNotebook')
-        self.notebook.pack(side='bottom', fill='both', expand=True)
-        self.notebook.pack_propagate(False)
-        style = ttk.Style()
-        style.configure('Dark.TNotebook', background='#222222')
+        self.configure_style()
+        self.create_config_list(root)
+        version = tk.Label(root, text="v.0.3", bg="#222222", fg="white", font=("Arial", 8, "bold"))
+        version.place(relx=1.0, rely=1.0, x=-5, y=-2, anchor='se')
 
         self.config_names = set()
         self.button_state_vars = {}
+        # Config name -> {'status': (text, color), 'locked'} of its list row. Rows are
+        # Treeview items, not widgets; only the detail panel of the selected config
+        # has real widgets, so update_config_row only touches the rows that changed.
+        self.config_rows = {}
+        self.selected_config = None
+
+        # Config path -> cached configuration properties, and name -> config path.
+        # Only rebuilt on import/remove, configuration manager signals or 'refresh'.
+        self.config_index = {}
+        self.config_paths_by_name = {}
+        self.config_index_version = 0
+        self.config_index_lock = threading.Lock()
 
         self.background_task_lock = threading.Lock()
         self.button_lock = threading.Lock()
+        # Every connect/disconnect of a config, from the tray, the window, autostart
+        # or restart_all, goes through here so duplicates are merged. The None key
+        # stands for restart/stop of all configs.
+        self.config_operations = ConfigOperations(self.run_config_operation, self.backend_settings['operation_debounce'], self.update_output)
+        self.reconnect_scheduler = ReconnectScheduler(self.backend_settings, self.auto_restart_settings)
+        # Reconnect operations started by the scheduler that have not finished yet
+        self.reconnects = []
+        # Set between logind's PrepareForSleep(true) and PrepareForSleep(false)
+        self.sleeping = threading.Event()
+        self.connect_slots = threading.BoundedSemaphore(self.backend_settings['max_parallel_connects'])
+        self.connect_timelines = ConnectTimelines(self.backend_settings['connect_history_path'], self.backend_settings['connect_history_max_bytes'],
+                                                  self.backend_settings['connect_history_keep'], self.update_output)
+        self.traffic_stats = TrafficStats(self.backend_settings['statistics_samples'], self.backend_settings['stall_after'], self.update_output)
+        # Reports of run_traffic_sampler for the Tk loop, applied in flush_output
+        self.traffic_reports = queue.SimpleQueue()
+        # (function, args) that other threads run on the Tk loop, see call_on_tk
+        self.tk_calls = queue.SimpleQueue()
+        # config_index_version the config list was last built for
+        self.tabs_version = None
+        self.traffic_shown = False
+        # Configs whose row shows traffic, cleared once their session is gone
+        self.traffic_rows = set()
         self.update_tabs_flag = True
-        self.command_executing = False
         self.autoconnect_finished = False
         self.auth_urls = []
+        # Guards auth_urls and pending_connects, notified when either changes
+        self.auth_urls_cond = threading.Condition()
+        # connect_session calls that have not produced an auth URL or given up yet
+        self.pending_connects = 0
+        self.browser_service = BrowserService(self.backend_settings['browser_idle_timeout'], self.backend_settings['browser_prewarm'],
+                                              self.backend_settings['silent_sso_timeout'], on_event=self.on_browser_event)
         self.browser_is_running = False
-        self.vpn_status_list = []
-        self.start_background_task()
+        # Config name -> status text shown for it and sent to the tray
+        self.vpn_statuses = {}
+        # (connection, write lock) of tray clients that receive status deltas
+        self.status_subscribers = []
+        self.status_subscribers_lock = threading.Lock()
+
+        self.command_pool = ThreadPoolExecutor(max_workers=self.backend_settings['command_workers'], thread_name_prefix='command')
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+
+        # Session path -> {'config_name', 'major', 'minor', 'status', 'updated'},
+        # kept up to date by openvpn3 D-Bus signals
+        self.session_table = {}
+        self.session_table_lock = threading.Lock()
+        self.session_table_changed = threading.Event()
+        # Configs whose status update_status_label has to recompute, guarded by session_table_lock
+        self.changed_configs = set()
+        self.session_table_cond = threading.Condition(self.session_table_lock)
+        # Session path -> auth URL already handed to the browser queue
+        self.queued_auth_urls = {}
+
+        # Socket requests other than ping wait for this; set right away when a
+        # state snapshot was loaded, otherwise after the first D-Bus scan
+        self.state_ready = threading.Event()
+        self.snapshot_timer = None
+        self.snapshot_lock = threading.Lock()
+        if self.load_state_snapshot():
+            self.state_ready.set()
+        self.start_unix_socket_listener(SOCKET_PATH)
+        self.start_dbus_signal_listener()
         self.root.withdraw()
-
-        self.start_unix_socket_listener('/opt/openvpn-saml/openvpn-saml-backend.socket')
-
+        threading.Thread(target=self.reconcile_state, daemon=True).start()
 
         self.check_thread = threading.Thread(target=self._check_auth_urls)
         self.check_thread.daemon = True  
         self.check_thread.start()
 
+        if self.backend_settings['browser_prewarm']:
+            threading.Thread(target=self.browser_service.ensure_started, daemon=True).start()
+        if self.backend_settings['stats_dump_path']:
+            threading.Thread(target=self.run_stats_dump, daemon=True).start()
+
+    def reconcile_state(self):
+
+        try:
+            self.rebuild_config_index()
+            self.refresh_session_table()
+        except Exception as e:
+            self.update_output(f"Exception on reconcile_state: {e}")
+        finally:
+            self.state_ready.set()
+        self.start_background_task()
+        self.schedule_state_snapshot()
+        threading.Thread(target=self.run_reconnect_scheduler, daemon=True).start()
+        if self.backend_settings['statistics_interval'] > 0:
+            threading.Thread(target=self.run_traffic_sampler, daemon=True).start()
+        if self.backend_settings['watch_network']:
+            try:
+                network_monitor = NetworkMonitor(self.on_network_change, self.backend_settings['network_settle_delay'])
+                threading.Thread(target=network_monitor.run, daemon=True).start()
+            except OSError as e:
+                self.update_output(f"Can't watch network changes: {e}")
+
+    def on_prepare_for_sleep(self, start):
+
+        if start:
+            self.sleeping.set()
+            self.update_output("System is going to sleep, pausing status polling and reconnects.")
+        else:
+            self.sleeping.clear()
+            self.update_output("System resumed, reconnecting.")
+            threading.Thread(target=self.reconnect_wanted_configs, args=(True,), daemon=True).start()
+
+    def on_network_change(self, reasons):
+
+        if self.sleeping.is_set():
+            return
+        self.update_output(f"Network changed ({', '.join(reasons)}), checking tunnels.")
+        self.reconnect_wanted_configs(False)
+
+    def reconnect_wanted_configs(self, force):
+
+        # Online tunnels are left alone, the others are reconnected by check_reconnects
+        # (so max_parallel_reconnects holds)
+        self.refresh_session_table()
+        now = time.time()
+        for config_name in self.reconnect_scheduler.wanted_configs():
+            self.reconnect_scheduler.reconnect_now(config_name, now, force)
+        with self.session_table_cond:
+            self.session_table_cond.notify_all()
+
+    def run_reconnect_scheduler(self):
+
+        while True:
+            with self.session_table_cond:
+                self.session_table_cond.wait(timeout=1)
+            try:
+                self.check_reconnects()
+            except Exception as e:
+                self.update_output(f"Exception on check_reconnects: {e}")
+
+    def check_reconnects(self):
+
+        if not self.autoconnect_finished or self.sleeping.is_set():
+            return
+        now = time.time()
+        self.reconnects = [operation for operation in self.reconnects if not operation.done.is_set()]
+        with self.session_table_lock:
+            session_entries = list(self.session_table.values())
+        with self.config_index_lock:
+            config_names = list(self.config_paths_by_name)
+        slots = self.backend_settings['max_parallel_reconnects'] - len(self.reconnects)
+        for config_name in self.reconnect_scheduler.pick(config_names, session_entries, now, self.config_operations.busy, slots, self.update_output):
+            self.reconnects.append(self.config_operations.request(config_name, 'reconnect'))
+
+    def load_state_snapshot(self):
+
+        snapshot = read_state_snapshot(self.backend_settings['state_snapshot_path'])
+        if snapshot is None:
+            return False
+        snapshot = parse_state_snapshot(snapshot)
+        if snapshot is None:
+            return False
+        config_index, session_table, statuses = snapshot
+        with self.config_index_lock:
+            self.config_index = config_index
+            self.config_paths_by_name = {properties['name']: path for path, properties in config_index.items()}
+            self.config_index_version += 1
+        self.config_names = set(self.config_paths_by_name)
+        with self.session_table_lock:
+            self.session_table = session_table
+        self.vpn_statuses = statuses
+        print(f"Loaded state snapshot with {len(config_index)} configs and {len(session_table)} sessions")
+        return True
+
+    def schedule_state_snapshot(self):
+
+        with self.snapshot_lock:
+            if self.snapshot_timer is not None:
+                return
+            self.snapshot_timer = threading.Timer(self.backend_settings['state_snapshot_delay'], self.save_state_snapshot)
+            self.snapshot_timer.daemon = True
+            self.snapshot_timer.start()
+
+    def save_state_snapshot(self):
+
+        with self.snapshot_lock:
+            self.snapshot_timer = None
+        statuses = dict(self.vpn_statuses)
+        with self.config_index_lock:
+            config_index = dict(self.config_index)
+        with self.session_table_lock:
+            session_table = {path: dict(entry) for path, entry in self.session_table.items()}
+        snapshot = build_state_snapshot(config_index, session_table, statuses)
+        try:
+            write_state_snapshot(self.backend_settings['state_snapshot_path'], snapshot)
+        except OSError as e:
+            print(f"Can't write state snapshot: {e}")
+
     def _check_auth_urls(self):
-        wait_time = 0
         while True:
-            time.sleep(1)
-            if len(self.auth_urls) >= 3:
-                urls_to_process = self.auth_urls[:]
+            with self.auth_urls_cond:
+                while not self.auth_urls:
+                    self.auth_urls_cond.wait()
+                # Dispatch as soon as every connect in flight has its URL or failed,
+                # but hold the first URL back no longer than the grace period
+                deadline = time.time() + self.backend_settings['auth_batch_grace']
+                while self.pending_connects > 0 and time.time() < deadline:
+                    self.auth_urls_cond.wait(deadline - time.time())
+                urls_to_process = self.auth_urls
                 self.auth_urls = []
-                self.update_output("3 web links ready, connecting")
-                run_browser_in_process([url for auth_dict in urls_to_process for url in auth_dict.values()])
-                wait_time = 0  # Reset the wait time after processing
-            elif self.auth_urls:
-                wait_time += 1
-                if wait_time >= 10:
-                    self.update_output("10 seconds to collect urls passed, connecting ")
-                    urls_to_process = self.auth_urls[:]
-                    self.auth_urls = []
-                    run_browser_in_process([url for auth_dict in urls_to_process for url in auth_dict.values()])
-                    wait_time = 0  # Reset the wait time after processing
+                still_pending = self.pending_connects
+            if still_pending:
+                self.update_output(f"{len(urls_to_process)} web links ready, {still_pending} connects still pending, connecting")
             else:
-                wait_time = 0  # Reset the wait time if no URLs are present
+                self.update_output(f"{len(urls_to_process)} web links ready, connecting")
+            self.browser_service.open_urls([url for auth_dict in urls_to_process for url in auth_dict.values()])
+
+    def add_auth_url(self, session_path, auth_url):
+        # Every auth URL reaches _check_auth_urls through here, whether a connect is pending or not
+        with self.auth_urls_cond:
+            self.auth_urls.append({session_path: auth_url})
+            self.auth_urls_cond.notify_all()
+
+    def begin_pending_connect(self):
+        with self.auth_urls_cond:
+            self.pending_connects += 1
+
+    def end_pending_connect(self):
+        with self.auth_urls_cond:
+            self.pending_connects -= 1
+            self.auth_urls_cond.notify_all()
+
+    def start_dbus_signal_listener(self):
+
+        self.bus.add_signal_receiver(self.on_session_manager_event, signal_name='SessionManagerEvent', path=SESSIONS_ROOT_PATH)
+        self.bus.add_signal_receiver(self.on_configuration_manager_event, signal_name='ConfigurationManagerEvent', path=CONFIGURATION_ROOT_PATH)
+        # Session signals are relayed by different services depending on the openvpn3
+        # version, so match on the signal name only and filter on the object path.
+        self.bus.add_signal_receiver(self.on_session_status_change, signal_name='StatusChange', path_keyword='path')
+        self.bus.add_signal_receiver(self.on_session_log, signal_name='Log', path_keyword='path')
+        self.bus.add_signal_receiver(self.on_prepare_for_sleep, signal_name='PrepareForSleep', dbus_interface='org.freedesktop.login1.Manager',
+                                     path='/org/freedesktop/login1')
+
+        self.dbus_loop = GLib.MainLoop()
+        self.dbus_thread = threading.Thread(target=self.dbus_loop.run, daemon=True)
+        self.dbus_thread.start()
+
+    def on_session_manager_event(self, session_path, event_type, owner):
+
+        session_path = str(session_path)
+        if event_type == SESSION_CREATED:
+            self.track_session(session_path)
+        elif event_type == SESSION_DESTROYED:
+            self.untrack_session(session_path)
+
+    def on_configuration_manager_event(self, config_path, event_type, owner):
+
+        config_path = str(config_path)
+        if event_type in (CONFIG_CREATED, CONFIG_NAME_CHANGED):
+            self.index_config(config_path)
+        elif event_type == CONFIG_DESTROYED:
+            self.unindex_config(config_path)
+
+    def on_session_status_change(self, major, minor, message, path=None):
+
+        if not path or not path.startswith(SESSIONS_ROOT_PATH + '/'):
+            return
+        with self.session_table_lock:
+            entry = self.session_table.get(path)
+            if entry is not None:
+                apply_session_status(entry, major, minor, message)
+        if entry is None:
+            # Status change for a session created before we started listening
+            self.track_session(path)
+        mark_session_status(self.connect_timelines, path, int(minor), self.update_output)
+        if int(minor) == SESS_AUTH_URL:
+            self.queue_auth_url(path, str(message))
+        if entry is not None:
+            self.notify_session_table_changed([entry['config_name']])
+
+    def on_session_log(self, *args, path=None):
+
+        if not path or not path.startswith(SESSIONS_ROOT_PATH + '/') or not args:
+            return
+        with self.session_table_lock:
+            entry = self.session_table.get(path)
+            if entry is None:
+                return
+            changed = apply_session_log(entry, args[-1])
+        if changed:
+            self.notify_session_table_changed([entry['config_name']])
+
+    def read_session_entry(self, session_path):
+
+        session_object = self.bus.get_object('net.openvpn.v3.sessions', session_path)
+        properties_interface = dbus.Interface(session_object, dbus_interface='org.freedesktop.DBus.Properties')
+        property_values = properties_interface.GetAll('net.openvpn.v3.sessions')
+        last_log = str(property_values.get('last_log', {}).get('log_message', ''))
+        return make_session_entry(property_values.get('config_name', ''), property_values.get('status', (0, 0, '')), last_log)
+
+    def track_session(self, session_path):
+
+        try:
+            entry = self.read_session_entry(session_path)
+        except dbus.exceptions.DBusException as e:
+            self.update_output(f'Exeption on func track_session:  {str(e)}')
+            return
+        with self.session_table_lock:
+            self.session_table[session_path] = entry
+        try:
+            session_object = self.bus.get_object('net.openvpn.v3.sessions', session_path)
+            dbus.Interface(session_object, dbus_interface='net.openvpn.v3.sessions').LogForward(True)
+        except dbus.exceptions.DBusException:
+            pass
+        self.notify_session_table_changed([entry['config_name']])
+
+    def untrack_session(self, session_path):
+
+        self.untrack_sessions([session_path])
+
+    def untrack_sessions(self, session_paths):
+
+        with self.session_table_lock:
+            removed = [self.session_table.pop(session_path, None) for session_path in session_paths]
+            for session_path in session_paths:
+                self.queued_auth_urls.pop(session_path, None)
+        for session_path in session_paths:
+            self.connect_timelines.session_gone(session_path)
+        config_names = {entry['config_name'] for entry in removed if entry is not None}
+        if config_names:
+            self.notify_session_table_changed(config_names)
+
+    def notify_session_table_changed(self, config_names):
+
+        with self.session_table_cond:
+            self.changed_configs.update(config_names)
+            self.session_table_cond.notify_all()
+        self.session_table_changed.set()
+        self.schedule_state_snapshot()
+
+    def wait_for_session(self, session_path, check, timeout):
+        # Runs check() every time the session's entry is changed by a signal until it
+        # returns something other than False. If no signal comes, check() is polled
+        # with exponential backoff instead. Returns False on timeout.
+        deadline = time.time() + timeout
+        backoff = self.backend_settings['poll_initial_interval']
+        with self.session_table_lock:
+            seen = self.session_table.get(session_path, {}).get('updated')
+        while True:
+            result = check()
+            remaining = deadline - time.time()
+            if result is not False or remaining <= 0:
+                return result
+            with self.session_table_lock:
+                signalled = self.session_table_cond.wait_for(
+                    lambda: self.session_table.get(session_path, {}).get('updated') != seen, timeout=min(backoff, remaining))
+                seen = self.session_table.get(session_path, {}).get('updated')
+            if not signalled:
+                backoff = min(backoff * 2, self.backend_settings['poll_max_interval'])
+
+    def queue_auth_url(self, session_path, auth_url):
+
+        if "http" not in auth_url:
+            return False
+        with self.session_table_lock:
+            if self.queued_auth_urls.get(session_path) == auth_url:
+                return True
+            self.queued_auth_urls[session_path] = auth_url
+        self.connect_timelines.mark_session(session_path, 'auth URL')
+        self.update_output(f'Auth link: {auth_url}')
+        self.add_auth_url(session_path, auth_url)
+        return True
+
+    def on_browser_event(self, message):
+
+        # Sent by the browser process when its window is shown with these URLs in tabs
+        if message.get('event') == 'shown':
+            with self.session_table_lock:
+                session_paths = [path for path, auth_url in self.queued_auth_urls.items() if auth_url in message.get('urls', [])]
+            for session_path in session_paths:
+                self.connect_timelines.mark_session(session_path, 'browser shown')
+
+    def refresh_session_table(self):
+
+        sessions_manager_object = self.bus.get_object('net.openvpn.v3.sessions', SESSIONS_ROOT_PATH)
+        sessions_manager_interface = dbus.Interface(sessions_manager_object, dbus_interface='net.openvpn.v3.sessions')
+        try:
+            session_paths = sessions_manager_interface.FetchAvailableSessions()
+        except dbus.exceptions.DBusException as e:
+            self.update_output(f'Exeption on func refresh_session_table:  {str(e)}')
+            return
+
+        session_table = {}
+        for session_path in session_paths:
+            try:
+                session_table[str(session_path)] = self.read_session_entry(session_path)
+            except dbus.exceptions.DBusException:
+                # Session went away between the listing and the property read
+                pass
+        with self.session_table_lock:
+            changed = {entry['config_name'] for path, entry in session_table.items()
+                       if self.session_table.get(path, {}).get('status') != entry['status']}
+            changed.update(entry['config_name'] for path, entry in self.session_table.items() if path not in session_table)
+            self.session_table = session_table
+        if changed:
+            self.notify_session_table_changed(changed)
+        for session_path, auth_url in waiting_auth_urls(session_table):
+            self.queue_auth_url(session_path, auth_url)
 
     def start_unix_socket_listener(self, socket_path):
         self.socket_thread = threading.Thread(target=self.listen_unix_socket, args=(socket_path,), daemon=True)
@@ -232,61 +1726,216 @@ class MyApp:
 
             while True:
                 conn, _ = server_socket.accept()
-                with conn:
-                    data = conn.recv(1024)
-                    if not data:
+                threading.Thread(target=self.handle_unix_connection, args=(conn,), daemon=True).start()
+
+    def handle_unix_connection(self, conn):
+        # Clients keep the connection open and send length-prefixed frames,
+        # every response carries the id of the request it answers.
+        write_lock = threading.Lock()
+        with conn:
+            while True:
+                try:
+                    command = recv_frame(conn)
+                except (OSError, EOFError, pickle.UnpicklingError) as e:
+                    print(f"Dropping client connection: {e}")
+                    break
+                if command is None:
+                    break
+                if command.get('function') not in READY_EXEMPT_COMMANDS:
+                    self.state_ready.wait()
+                if command.get('function') == "subscribe":
+                    if not self.subscribe_status(conn, write_lock, command.get('id')):
                         break
-                    command = pickle.loads(data)
-                    func_name = command.get('function')
-                    args = command.get('args', {})
-                    try:
-                        if func_name == "open_settings":
-                            self.restore_window()
-                            response = {'status': 'success', 'result': 'Settings opened'}
-                        elif func_name == "quit":
-                            self.kill_sessions()
-                            self.root.quit()
-                            response = {'status': 'success', 'result': 'Tray app commanded to exit'}
-                        elif func_name == "ping":
-                            response = {'status': 'success', 'result': 'Pong'}
-                        elif func_name == "get_vpn_status":
-                            response = self.vpn_status_list
-                        elif func_name == "connect":
-                            configs = self.get_available_config_names()
-                            config_name = args.get('config')
-                            active_sessions = self.get_sessions_for_config(config_name)
-                            self.disconnect_sessions(active_sessions)
-                            print(f"Tray app request to connect config {config_name}")
-                            button_state_var = self.button_state_vars[config_name]
-                            config_path = self.find_config_path_by_name(config_name)
-                            response = {'status': 'success', 'result': 'ok'}
-                            self.toggle_vpn(config_path, button_state_var)
-                        elif func_name == "restart_all_connections":
-                            self.kill_sessions()
-                            configs = self.get_available_config_names()
-                            for config_name in configs:
-                                for key, value in config_name.items():
-                                    button_state_var = self.button_state_vars[value]
-                                    config_path = self.find_config_path_by_name(value)
-                                    self.toggle_vpn(config_path, button_state_var)
-                                    time.sleep(1)
-                            response = {'status': 'success', 'result': f'All sessions restarted'}
-
-                        elif func_name == "stop_all_connections":
-                            self.kill_sessions()
-                            response = {'status': 'success', 'result': f'All sessions stopped'}
-
-                        elif func_name in globals():
-                            result = globals()[func_name]()
-                            response = {'status': 'success', 'result': result}
-                        else:
-                            response = {'status': 'error', 'message': f"Function {func_name} not found"}
-
-                        conn.sendall(pickle.dumps(response))
-                    except Exception as e:
-                        response = {'status': 'error', 'message': f'Exception on backend: {e}', 'exception': e}
-                        conn.sendall(pickle.dumps(response))
+                    continue
+                started = time.perf_counter()
+                if command.get('function') in LONG_RUNNING_COMMANDS:
+                    response = self.submit_job(command.get('function'), command.get('args') or {})
+                else:
+                    response = self.handle_command(command.get('function'), command.get('args') or {})
+                if self.call_stats.enabled:
+                    self.call_stats.record('ipc', command.get('function'), time.perf_counter() - started,
+                                           error=isinstance(response, dict) and response.get('status') == 'error')
+                try:
+                    with write_lock:
+                        try:
+                            send_frame(conn, {'id': command.get('id'), 'response': response})
+                        except (pickle.PicklingError, TypeError, AttributeError):
+                            # Exceptions that can't be pickled are sent as their message only
+                            response.pop('exception', None)
+                            send_frame(conn, {'id': command.get('id'), 'response': response})
+                except OSError:
+                    break
+            self.unsubscribe_status(conn)
+
+    def subscribe_status(self, conn, write_lock, request_id):
+        # The snapshot is sent under the connection's write lock, so every delta
+        # published after registration reaches the client after the snapshot.
+        with write_lock:
+            with self.status_subscribers_lock:
+                self.status_subscribers.append((conn, write_lock))
+            response = {'status': 'success', 'result': self.get_vpn_status()}
+            try:
+                send_frame(conn, {'id': request_id, 'response': response})
+            except OSError:
+                return False
+        return True
+
+    def unsubscribe_status(self, conn):
+        with self.status_subscribers_lock:
+            self.status_subscribers = [subscriber for subscriber in self.status_subscribers if subscriber[0] is not conn]
+
+    def publish_status_delta(self, config_name, old_status, new_status):
+        self.schedule_state_snapshot()
+        event = {'id': None, 'event': 'status', 'config': config_name, 'old': old_status, 'new': new_status, 'timestamp': time.time()}
+        delivered = self.publish_event(event)
+        if new_status == "VPN Online":
+            self.connect_timelines.status_published(config_name, delivered)
+
+    def publish_event(self, event):
+        # Returns whether at least one subscriber got it
+        with self.status_subscribers_lock:
+            subscribers = list(self.status_subscribers)
+        delivered = False
+        for conn, write_lock in subscribers:
+            try:
+                with write_lock:
+                    send_frame(conn, event)
+                delivered = True
+            except OSError:
+                self.unsubscribe_status(conn)
+        return delivered
+
+    def submit_job(self, func_name, args):
+        job = {'job': next(self.job_ids), 'function': func_name, 'args': args, 'state': 'queued', 'result': None,
+               'submitted': time.time(), 'started': None, 'finished': None}
+        with self.jobs_lock:
+            self.jobs[job['job']] = job
+            finished = [job_id for job_id, kept in self.jobs.items() if kept['state'] in ('done', 'failed')]
+            for job_id in finished[:max(0, len(self.jobs) - MAX_KEPT_JOBS)]:
+                del self.jobs[job_id]
+        self.command_pool.submit(self.run_job, job)
+        return {'status': 'success', 'result': 'ok', 'job': job['job']}
+
+    def run_job(self, job):
+        job['state'] = 'running'
+        job['started'] = time.time()
+        response = self.handle_command(job['function'], job['args'])
+        job['result'] = response
+        job['finished'] = time.time()
+        job['state'] = 'failed' if isinstance(response, dict) and response.get('status') == 'error' else 'done'
+        if self.call_stats.enabled:
+            self.call_stats.record('job', job['function'], job['finished'] - job['started'], error=job['state'] == 'failed')
+
+    def get_job_status(self, job_id):
+        with self.jobs_lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return {'status': 'error', 'message': f"Job {job_id} not found"}
+            job = dict(job)
+        if isinstance(job['result'], dict):
+            job['result'] = {key: value for key, value in job['result'].items() if key != 'exception'}
+        return {'status': 'success', 'result': job}
+
+    def handle_command(self, func_name, args):
+        try:
+            if func_name == "open_settings":
+                self.restore_window()
+                response = {'status': 'success', 'result': 'Settings opened'}
+            elif func_name == "quit":
+                self.kill_sessions()
+                self.save_state_snapshot()
+                self.root.quit()
+                response = {'status': 'success', 'result': 'Tray app commanded to exit'}
+            elif func_name == "ping":
+                response = {'status': 'success', 'result': 'Pong'}
+            elif func_name == "refresh":
+                self.rebuild_config_index()
+                self.refresh_session_table()
+                response = {'status': 'success', 'result': f'{len(self.config_index)} configs indexed'}
+            elif func_name == "get_vpn_status":
+                response = self.get_vpn_status()
+            elif func_name == "job_status":
+                response = self.get_job_status(args.get('job'))
+            elif func_name == "connect":
+                print(f"Tray app request to connect config {args.get('config')}")
+                response = self.config_operations.request(args.get('config'), 'connect').wait()
+            elif func_name == "restart_all_connections":
+                response = self.config_operations.request(None, 'restart').wait()
+            elif func_name == "stop_all_connections":
+                response = self.config_operations.request(None, 'stop').wait()
+            elif func_name == "stats":
+                response = {'status': 'success', 'result': self.get_stats(args)}
+            elif func_name == "timeline":
+                response = {'status': 'success', 'result': self.connect_timelines.report(args.get('config'), args.get('history', 0))}
+            elif func_name == "profile":
+                response = run_profile_command(self.profiler, args)
+            elif func_name == "thread_stacks":
+                response = {'status': 'success', 'result': format_thread_stacks()}
+            elif func_name == "traffic":
+                response = {'status': 'success', 'result': self.traffic_stats.report()}
+
+            elif func_name in globals():
+                result = globals()[func_name]()
+                response = {'status': 'success', 'result': result}
+            else:
+                response = {'status': 'error', 'message': f"Function {func_name} not found"}
+        except Exception as e:
+            response = {'status': 'error', 'message': f'Exception on backend: {e}', 'exception': e}
+        return response
  
+    def get_stats(self, args):
+
+        # args: 'enabled' turns collection on or off, 'reset' starts the counts over
+        if 'enabled' in args:
+            self.call_stats.enabled = bool(args['enabled'])
+        result = self.call_stats.snapshot()
+        if args.get('reset'):
+            self.call_stats.reset()
+        return result
+
+    def run_traffic_sampler(self):
+
+        while True:
+            time.sleep(self.backend_settings['statistics_interval'])
+            if self.sleeping.is_set():
+                continue
+            try:
+                with self.session_table_lock:
+                    connected = {path: entry['config_name'] for path, entry in self.session_table.items() if entry['minor'] == CONN_CONNECTED}
+                self.traffic_stats.keep_only(connected)
+                for session_path, config_name in connected.items():
+                    try:
+                        self.traffic_stats.record(session_path, config_name, self.get_session_statistics(session_path))
+                    except dbus.exceptions.DBusException as e:
+                        print(f"Can't read statistics of {session_path}: {e}")
+                if connected or self.traffic_shown:
+                    report = self.traffic_stats.report()
+                    self.traffic_shown = bool(report)
+                    self.traffic_reports.put(report)
+                    self.publish_event({'id': None, 'event': 'traffic', 'configs': report, 'timestamp': time.time()})
+            except Exception as e:
+                self.update_output(f"Exception on run_traffic_sampler: {e}")
+
+    def update_traffic_rows(self, report):
+
+        # Tk thread only, see flush_output
+        for config_name in self.traffic_rows - set(report):
+            if self.config_tree.exists(config_name):
+                self.config_tree.set(config_name, 'traffic', "")
+        for config_name, traffic in report.items():
+            if self.config_tree.exists(config_name):
+                self.config_tree.set(config_name, 'traffic', traffic['text'])
+        self.traffic_rows = set(report)
+
+    def run_stats_dump(self):
+
+        while True:
+            time.sleep(self.backend_settings['stats_dump_interval'])
+            try:
+                append_stats_dump(self.backend_settings['stats_dump_path'], self.call_stats)
+            except OSError as e:
+                self.update_output(f"Can't write stats dump: {e}")
+
     def minimize_to_tray(self):
         self.root.withdraw()
 
@@ -313,15 +1962,13 @@ class MyApp:
                 shutil.copy("/opt/openvpn-saml/openvpn-saml.desktop", desktop_file_path)
                 self.update_output(f"Added desktop file to {desktop_file_path}.")
             except FileNotFoundError:
-                self.update_output(f"Error: The desktop file to be added was not found.")
+                self.update_output("Error: The desktop file to be added was not found.")
             except shutil.Error as e:
                 self.update_output(f"Error adding desktop file: {e}.")
 
 
     def save_auto_restart_setting(self, config_name, auto_restart_value, dco_value):
 
-        config_file_path = '/opt/openvpn-saml/auto_restart_settings.json'
-
         if config_name not in self.auto_restart_settings:
             self.auto_restart_settings[config_name] = {}
 
@@ -329,33 +1976,31 @@ class MyApp:
         self.update_output(f"{config_name}: auto_restart_value:{auto_restart_value}")
         self.auto_restart_settings[config_name]['dco'] = dco_value
 
-        with open(config_file_path, "w", encoding="utf-8") as config_file:
-            json.dump(self.auto_restart_settings, config_file, ensure_ascii=False)
+        write_auto_restart_settings(self.auto_restart_settings)
 
         config_path = self.find_config_path_by_name(config_name)
         if dco_value:
             self.set_configuration_properties(config_path,"dco",True)
         else:
             self.set_configuration_properties(config_path,"dco",False)
-        dco_status = self.get_configuration_properties(config_path,"dco")
+        dco_status = self.get_configuration_properties(config_path,"dco",cached=False)
         self.update_output(f"{config_name}: {str(dco_status)}")
         
 
     def load_auto_restart_settings(self):
 
-        config_file_path = '/opt/openvpn-saml/auto_restart_settings.json'
-        try:
-            with open(config_file_path, "r", encoding="utf-8") as config_file:
-                return json.load(config_file)
-        except FileNotFoundError:
-            return {}
+        return read_auto_restart_settings()
+
+    def load_backend_settings(self):
+
+        return read_backend_settings()
 
 
     def start_background_task(self):
 
         self.background_thread = threading.Thread(target=self.update_status_label)
         self.background_thread.daemon = True
-        self.update_tabs()
+        self.session_table_changed.set()
         self.background_thread.start()
         
 
@@ -370,19 +2015,15 @@ class MyApp:
                 self.update_output("openvpn3 client not found, program may not work.")
             if configs == []:
                 self.update_output("No configs found. Please add new config.")
+            autoconnect_names = []
             for config in configs:
                 config_name = list(config.values())[0]
-                config_path = list(config.keys())[0]
                 auto_restart_var = tk.BooleanVar(value=self.auto_restart_settings.get(config_name, {}).get('auto_restart', False)).get()
                 if auto_restart_var == True:
                     active_sessions = self.get_sessions_for_config(config_name)
                     if active_sessions == []:
                         self.update_output(f"Starting autoconnect for {config_name}...")
-                        self.connect_session(config_path)
-                        toggle_button = self.get_toggle_button(config_name)
-                        button_state_var = self.button_state_vars[config_name]
-                        button_state_var.set("Disconnect")
-                        toggle_button.config(bg="red")
+                        autoconnect_names.append(config_name)
                     else:
                         self.update_output(f"Active sessions found for {config_name}. Not autoconnecting.")
                 else:
@@ -392,31 +2033,76 @@ class MyApp:
                     else:
                         self.update_output(f"Active sessions found for {config_name}.")
 
+            self.connect_configs(autoconnect_names)
             self.autoconnect_finished = True
+
+    def connect_configs(self, config_names, kind='connect'):
+        # Every config gets its own thread, connect_session limits how many
+        # of them are starting a tunnel at the same time.
+        started = time.time()
+        operations = []
+        for config_name in config_names:
+            if self.find_config_path_by_name(config_name) is None:
+                self.update_output(f"Config {config_name} not found, not connecting.")
+                continue
+            operations.append(self.config_operations.request(config_name, kind))
+        for operation in operations:
+            operation.wait()
+        if operations:
+            self.update_output(f"Started {len(operations)} tunnels in {time.time() - started:.2f} sec")
+
+    def get_connect_timeout(self, config_name):
+        return self.auto_restart_settings.get(config_name, {}).get('connect_timeout', self.backend_settings['connect_timeout'])
+
+    def format_connect_timing(self, timing):
+        return format_connect_timing(timing)
             
 
     def update_status_label(self):
 
+        last_refresh = time.time()
         while True:
             try:
+                # Wake up on session signals; the full rescan is only a slow safety net
+                poll_interval = self.backend_settings['status_poll_interval']
+                self.session_table_changed.wait(timeout=max(0, poll_interval - (time.time() - last_refresh)))
+                self.session_table_changed.clear()
+                if time.time() - last_refresh >= poll_interval and not self.sleeping.is_set():
+                    self.refresh_session_table()
+                    last_refresh = time.time()
                 if self.update_tabs_flag:
-                    self.update_tabs(new_status=True)
-                time.sleep(1)
+                    with self.session_table_lock:
+                        config_names, self.changed_configs = self.changed_configs, set()
+                    self.update_config_statuses(config_names)
                 if  self.autoconnect_finished == False:
                     self.autostart_connections()
             except Exception as e:
                 self.update_output(f"Exception on update_status_label: {e}")
 
-    def update_status_list(self, config_name, status):
-        found = False
-        for i, entry in enumerate(self.vpn_status_list):
-            if entry.startswith(config_name + ":"):
-                self.vpn_status_list[i] = f"{config_name}:{status}"
-                found = True
-                break
-        
-        if not found:
-            self.vpn_status_list.append(f"{config_name}:{status}")                
+    def update_config_statuses(self, config_names):
+
+        # Only the configs whose sessions changed are looked at, rows are changed on the Tk thread
+        with self.config_index_lock:
+            config_names = [config_name for config_name in config_names if config_name in self.config_paths_by_name]
+        entries = {}
+        with self.session_table_lock:
+            for entry in self.session_table.values():
+                entries.setdefault(entry['config_name'], []).append(entry)
+        for config_name in config_names:
+            status, color = describe_config_status(entries.get(config_name, []))
+            old_status = self.vpn_statuses.get(config_name)
+            self.vpn_statuses[config_name] = status
+            if old_status != status:
+                self.publish_status_delta(config_name, old_status, status)
+            if status != "":
+                self.call_on_tk(self.update_config_row, config_name, status, color)
+
+    def remove_config_status(self, config_name):
+        if config_name in self.vpn_statuses:
+            self.publish_status_delta(config_name, self.vpn_statuses.pop(config_name), None)
+
+    def get_vpn_status(self):
+        return [f"{config_name}:{status}" for config_name, status in list(self.vpn_statuses.items())]
 
     def add_config(self):
 
@@ -438,7 +2124,6 @@ class MyApp:
 
                 self.config_names.add(config_name)
                 self.update_tabs()
-                self.update_tabs(new_status=True)
             elif config_name:
                 output_message = f"Configuration with the name '{config_name}' already exists."
                 self.update_output(output_message)
@@ -448,17 +2133,15 @@ class MyApp:
 
     def remove_config(self):
 
-        selected_tab_index = self.notebook.index(self.notebook.select())
-        selected_tab_name = self.notebook.tab(selected_tab_index, option="text")
+        selected_tab_name = self.selected_config
         if selected_tab_name:
             config_path = self.find_config_path_by_name(selected_tab_name)
             if config_path:
                 self.remove_configuration(config_path)
                 output_message = f"Removed config: {selected_tab_name}."
                 self.update_output(output_message)
-                self.config_names.remove(selected_tab_name)
+                self.config_names.discard(selected_tab_name)
                 self.update_tabs()
-                self.update_tabs(new_status=True)
             else:
                 output_message = f"Configuration with the name '{selected_tab_name}' not found."
                 self.update_output(output_message)
@@ -468,153 +2151,287 @@ class MyApp:
         self.update_tabs_flag = True
         
 
-    def update_tabs(self, new_status=False):
+    def configure_style(self):
 
-        if new_status == False:
-            for tab_id in self.notebook.tabs():
-                self.notebook.forget(tab_id)
-            try:
-                configs = self.get_available_config_names()
-            except dbus.exceptions.DBusException:
-                self.update_output("No such interface net.openvpn.v3.configuration. Trying to add one.")
-                configs = self.get_available_config_names()
-            for config in configs:
-                config_path, config_name = list(config.items())[0]
-                tab_frame = tk.Frame(self.notebook, bg="#6c6c6c")
-
-                active_sessions = self.get_sessions_for_config(config_name)
-                button_text = "Disconnect" if active_sessions else "Connect"
-
-                button_state_var = tk.StringVar(value=button_text)
-
-                toggle_button = tk.Button(
-                    tab_frame,
-                    textvariable=button_state_var,
-                    command=lambda c=config_path, b=button_state_var: self.toggle_vpn(c, b),
-                    bg="red" if active_sessions else "green",
-                    fg="white",
-                    font=("Arial", 10, "bold"),
-                    width=8
-                )
-                toggle_button.pack(side='right', padx=10)
-
-                self.button_state_vars[config_name] = button_state_var
-
-                label1 = tk.Label(tab_frame, text=new_status, bg="#222222", fg="white", font=("Arial", 10, "bold"))
-                label1.pack(pady=(13, 0), padx=(410, 0))
-                version = tk.Label(root, text="v.0.3", bg="#222222", fg="white", font=("Arial", 8, "bold"))
-                version.place(x=560, y=258)
-
-                auto_restart_var = tk.BooleanVar(value=self.auto_restart_settings.get(config_name, {}).get('auto_restart', False))
-                dco_var = tk.BooleanVar(value=self.auto_restart_settings.get(config_name, {}).get('dco', False))
-
-                dco_checkbox = tk.Checkbutton(tab_frame, text="DCO", variable=dco_var, selectcolor="#222222", bg="#222222", fg="white", font=("Arial", 11, "bold"), bd=0, highlightthickness=0,
-                               command=lambda name=config_name, var=dco_var, auto_restart_var=auto_restart_var: self.save_auto_restart_setting(name, auto_restart_var.get(), var.get()))
-                dco_checkbox.place(x=128, y=13)
-                auto_restart_checkbox = tk.Checkbutton(tab_frame, text="Autoconnect", variable=auto_restart_var, selectcolor="#222222", bg="#222222", fg="white", font=("Arial", 11, "bold"), bd=0, highlightthickness=0,
-                               command=lambda name=config_name, var=auto_restart_var, dco_var=dco_var: self.save_auto_restart_setting(name, var.get(), dco_var.get()))
-                auto_restart_checkbox.place(x=8, y=13)
-                self.notebook.add(tab_frame, text=config_name)
-                
-
-        if new_status == True:
-
-            for tab_id in self.notebook.tabs():
-                status = ""
-                config_name = self.notebook.tab(tab_id, "text")
-                active_sessions = self.get_sessions_for_config(config_name)
-                if active_sessions != []:
-                    try:
-                        status = self.get_session_status(f'/net/openvpn/v3/sessions/{active_sessions[0]}')
-                    except:
-                        pass
-                    if "Connected" in status:
-                        status = "VPN Online"
-                        color = "green"
-                        config_path = self.find_config_path_by_name(config_name)
-                    elif "Starting" in status:
-                        status = "Starting..."
-                        color = "orange"
-                    elif "Connecting" in status:
-                        status = "Connecting..."
-                        color = "orange"
-                    else:
-                        color = "orange"
-                else:
-                    status = "VPN Offline"
-                    color = "red"
-                self.update_status_list(config_name, status)
+        style = ttk.Style()
+        style.configure("Dark.Treeview", background="#222222", fieldbackground="#222222", foreground="white", font=("Arial", 11, "bold"), rowheight=22)
+        style.map("Dark.Treeview", background=[("selected", "#ed9121")], foreground=[("selected", "white")])
+        style.configure("Dark.Treeview.Heading", background="#454545", foreground="white", font=("Arial", 10, "bold"))
+
+    def create_config_list(self, root):
+
+        list_frame = tk.Frame(root, bg="#222222")
+        list_frame.pack(side='bottom', fill='both', expand=True, padx=10, pady=(0, 15))
+
+        left_frame = tk.Frame(list_frame, bg="#222222")
+        left_frame.pack(side='left', fill='both', expand=True)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', lambda *args: self.apply_config_filter())
+        search_entry = tk.Entry(left_frame, textvariable=self.search_var, bg="#454545", fg="white", insertbackground="white", bd=0, font=("Arial", 10))
+        search_entry.pack(side='top', fill='x', pady=(0, 4))
+
+        self.config_tree = ttk.Treeview(left_frame, columns=('status', 'traffic'), style="Dark.Treeview", height=5, selectmode='browse')
+        self.config_tree.heading('#0', text="Config")
+        self.config_tree.heading('status', text="Status")
+        self.config_tree.heading('traffic', text="Traffic")
+        self.config_tree.column('#0', width=140)
+        self.config_tree.column('status', width=100)
+        self.config_tree.column('traffic', width=170)
+        self.config_tree.tag_configure('green', foreground="green")
+        self.config_tree.tag_configure('orange', foreground="orange")
+        self.config_tree.tag_configure('red', foreground="red")
+        scrollbar = ttk.Scrollbar(left_frame, orient='vertical', command=self.config_tree.yview)
+        self.config_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.config_tree.pack(side='left', fill='both', expand=True)
+        self.config_tree.bind('<<TreeviewSelect>>', lambda event: self.select_config())
+
+        # One set of controls, bound to whichever config is selected
+        detail_frame = tk.Frame(list_frame, bg="#222222", width=150)
+        detail_frame.pack(side='right', fill='y', padx=(10, 0))
+        self.button_state_var = tk.StringVar(value="Connect")
+        self.toggle_button = tk.Button(detail_frame, textvariable=self.button_state_var, command=self.toggle_selected_config,
+                                       bg="green", fg="white", font=("Arial", 10, "bold"), width=10, state="disabled")
+        self.toggle_button.pack(side='top', pady=(4, 6))
+        self.status_label = tk.Label(detail_frame, text="", bg="#222222", fg="white", font=("Arial", 10, "bold"))
+        self.status_label.pack(side='top', pady=(0, 6))
+        self.auto_restart_var = tk.BooleanVar(value=False)
+        self.dco_var = tk.BooleanVar(value=False)
+        self.auto_restart_checkbox = tk.Checkbutton(detail_frame, text="Autoconnect", variable=self.auto_restart_var, selectcolor="#222222", bg="#222222", fg="white", font=("Arial", 11, "bold"), bd=0, highlightthickness=0,
+                       command=self.save_selected_config_settings, state="disabled")
+        self.auto_restart_checkbox.pack(side='top', anchor='w')
+        self.dco_checkbox = tk.Checkbutton(detail_frame, text="DCO", variable=self.dco_var, selectcolor="#222222", bg="#222222", fg="white", font=("Arial", 11, "bold"), bd=0, highlightthickness=0,
+                       command=self.save_selected_config_settings, state="disabled")
+        self.dco_checkbox.pack(side='top', anchor='w')
+
+    def update_tabs(self):
+
+        # Tk thread only; new rows get their status from update_status_label
+        self.tabs_version = self.config_index_version
+        config_names = [list(config.values())[0] for config in self.get_available_config_names()]
+        for config_name in list(self.config_rows):
+            if config_name not in config_names:
+                self.remove_config_row(config_name)
+        added = [config_name for config_name in config_names if config_name not in self.config_rows]
+        for config_name in added:
+            self.add_config_row(config_name)
+        self.apply_config_filter()
+        if added:
+            self.notify_session_table_changed(added)
+
+    def update_config_row(self, config_name, status, color):
+
+        row = self.config_rows.get(config_name)
+        if row is None or row['status'] == (status, color):
+            return
+        row['status'] = (status, color)
+        self.config_tree.item(config_name, tags=(color,))
+        self.config_tree.set(config_name, 'status', status)
+        if config_name == self.selected_config:
+            self.status_label.config(text=status, fg=color)
+
+    def add_config_row(self, config_name):
+
+        active_sessions = self.get_sessions_for_config(config_name)
+        self.button_state_vars[config_name] = tk.StringVar(value="Disconnect" if active_sessions else "Connect")
+        self.config_rows[config_name] = {'status': None, 'locked': False}
+        self.config_tree.insert('', 'end', iid=config_name, text=config_name, values=("", ""))
+
+    def remove_config_row(self, config_name):
+
+        self.config_rows.pop(config_name)
+        self.config_tree.delete(config_name)
+        self.button_state_vars.pop(config_name, None)
+        if config_name == self.selected_config:
+            self.select_config()
+
+    def apply_config_filter(self):
+
+        # Detached rows are not drawn at all, so a search keeps the list short
+        query = self.search_var.get().strip().lower()
+        index = 0
+        for config_name in sorted(self.config_rows, key=str.lower):
+            if query in config_name.lower():
+                self.config_tree.move(config_name, '', index)
+                index += 1
+            else:
+                self.config_tree.detach(config_name)
+
+    def select_config(self):
+
+        selection = [config_name for config_name in self.config_tree.selection() if config_name in self.config_rows]
+        self.selected_config = selection[0] if selection else None
+        state = "normal" if self.selected_config else "disabled"
+        self.auto_restart_checkbox.config(state=state)
+        self.dco_checkbox.config(state=state)
+        if self.selected_config is None:
+            self.toggle_button.config(state="disabled")
+            self.status_label.config(text="")
+            return
+
+        settings = self.auto_restart_settings.get(self.selected_config, {})
+        self.auto_restart_var.set(settings.get('auto_restart', False))
+        self.dco_var.set(settings.get('dco', False))
+        self.refresh_selected_button()
+        status = self.config_rows[self.selected_config]['status']
+        if status:
+            self.status_label.config(text=status[0], fg=status[1])
+
+    def refresh_selected_button(self):
+
+        config_name = self.selected_config
+        if config_name is None or config_name not in self.button_state_vars:
+            return
+        button_state = self.button_state_vars[config_name].get()
+        self.button_state_var.set(button_state)
+        self.toggle_button.config(bg="red" if button_state == "Disconnect" else "green",
+                                  state="disabled" if self.config_rows[config_name]['locked'] else "normal")
+
+    def set_button_state(self, config_name, button_state):
+
+        # Called from operation threads, the button is changed on the Tk thread
+        self.call_on_tk(self._set_button_state, config_name, button_state)
+
+    def _set_button_state(self, config_name, button_state):
+
+        button_state_var = self.button_state_vars.get(config_name)
+        if button_state_var is not None:
+            button_state_var.set(button_state)
+        if config_name == self.selected_config:
+            self.refresh_selected_button()
+
+    def toggle_selected_config(self):
+
+        config_name = self.selected_config
+        config_path = self.find_config_path_by_name(config_name)
+        if config_path is None:
+            return
+        threading.Thread(target=self.toggle_vpn, args=(config_path, self.button_state_vars[config_name]), daemon=True).start()
 
-                tab_frame = self.notebook.nametowidget(tab_id)
-                tab_frame.configure(bg="#222222")
+    def save_selected_config_settings(self):
 
-                label1 = tab_frame.winfo_children()[1]
+        if self.selected_config is not None:
+            self.save_auto_restart_setting(self.selected_config, self.auto_restart_var.get(), self.dco_var.get())
 
-                if status != "":
-                    label1.config(text=status, fg=color, bg="#222222")
-                    style = ttk.Style()
-                    style.configure("TNotebook", background="#222222", tabposition='sw')
-                    style.map("TNotebook.Tab", background=[("selected", "#ed9121"), ("!selected", "#454545")], foreground=[("selected", "white"), ("!selected", "white")])
-                    style.configure("TNotebook.Tab", font=("Arial", 12, "bold"))
+    def get_sessions_by_config(self):
 
+        sessions_by_config = {}
+        with self.session_table_lock:
+            for session_path, entry in self.session_table.items():
+                sessions_by_config.setdefault(entry['config_name'], []).append(self.extract_session_name(session_path))
+        return sessions_by_config
 
     def lock_unlock_button(self, config_name, lock):
-        toggle_button = self.get_toggle_button(config_name)
-        if lock:
-            toggle_button["state"] = "disabled"
-        else:
-            toggle_button["state"] = "normal"
+        self.call_on_tk(self._lock_unlock_button, config_name, lock)
+
+    def _lock_unlock_button(self, config_name, lock):
+        if config_name in self.config_rows:
+            self.config_rows[config_name]['locked'] = lock
+        if config_name == self.selected_config:
+            self.refresh_selected_button()
 
     def update_output(self, message):
 
-        message = str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")) + ' ' + message + '\n'
-        self.output_text.configure(state='normal')
-        self.output_text.insert('end', message)
-        self.output_text.configure(state='disabled')
-        self.output_text.see('end')
-        self.root.update()
-        
+        message = str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")) + ' ' + message
+        self.logger.info(message)
+        self.log_queue.put(message + '\n')
+
+    def call_on_tk(self, function, *args):
+
+        self.tk_calls.put((function, args))
+
+    def flush_output(self):
+
+        if self.tabs_version != self.config_index_version:
+            # Configs were imported or removed
+            self.update_tabs()
+        try:
+            while True:
+                function, args = self.tk_calls.get_nowait()
+                try:
+                    function(*args)
+                except Exception as e:
+                    self.update_output(f"Exception on {function.__name__}: {e}")
+        except queue.Empty:
+            pass
+
+        lines = []
+        try:
+            while len(lines) < self.backend_settings['log_max_lines']:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if lines:
+            self.output_text.configure(state='normal')
+            self.output_text.insert('end', ''.join(lines))
+            # Drop the oldest lines, the file log keeps everything
+            excess = int(self.output_text.index('end-1c').split('.')[0]) - self.backend_settings['log_max_lines']
+            if excess > 0:
+                self.output_text.delete('1.0', f'{excess + 1}.0')
+            self.output_text.configure(state='disabled')
+            self.output_text.see('end')
+
+        # Only the newest traffic report matters
+        report = None
+        try:
+            while True:
+                report = self.traffic_reports.get_nowait()
+        except queue.Empty:
+            pass
+        if report is not None:
+            self.update_traffic_rows(report)
+        self.root.after(self.backend_settings['log_flush_interval_ms'], self.flush_output)
+
+    def create_file_logger(self):
+
+        return create_file_logger(self.backend_settings)
 
     def toggle_vpn(self, config_path, button_state_var):
+        config_name = self.get_configuration_properties(config_path, "name")['name']
+        kind = 'connect' if button_state_var.get() == "Connect" else 'disconnect'
+        return self.config_operations.request(config_name, kind).wait()
+
+    def run_config_operation(self, config_name, kind):
+        # Runs on the ConfigOperations thread of the config, never twice at once for one config
+        if config_name is None:
+            for name in list(self.config_paths_by_name):
+                self.reconnect_scheduler.set_wanted(name, kind == 'restart')
+            if kind == 'restart':
+                # One reconnect per config, queued behind whatever that config is doing,
+                # so a connect in flight keeps its tunnel
+                self.connect_configs([list(config.values())[0] for config in self.get_available_config_names()], 'reconnect')
+                return {'status': 'success', 'result': 'All sessions restarted'}
+            self.kill_sessions()
+            return {'status': 'success', 'result': 'All sessions stopped'}
+
+        config_path = self.find_config_path_by_name(config_name)
+        if config_path is None:
+            return {'status': 'error', 'message': f"Config {config_name} not found"}
+        if kind != 'reconnect':
+            self.reconnect_scheduler.set_wanted(config_name, kind == 'connect')
+        if kind == 'connect' and self.config_is_up(config_name):
+            self.update_output(f"{config_name} is already online or connecting, not reconnecting it")
+            self.set_button_state(config_name, "Disconnect")
+            return {'status': 'success', 'result': 'ok'}
         max_retries = 3
         retry_count = 0
 
         while retry_count < max_retries:
             try:
-                current_state = button_state_var.get()
-                config_name = self.get_configuration_properties(config_path, "name")['name']
-                active_sessions = self.get_sessions_for_config(config_name)
-
-                if current_state == "Connect":
-                    if not self.command_executing:
-                        with self.button_lock:
-                            self.lock_unlock_button(config_name, True)  # Lock the button
-                            self.command_executing = True
-                            if active_sessions:
-                                self.disconnect_sessions(active_sessions)
-                                self.connect_session(config_path)
-                            else:
-                                self.connect_session(config_path)
-                            toggle_button = self.get_toggle_button(config_name)
-                            toggle_button.config(bg="red")
-                            button_state_var.set("Disconnect")
-                            self.command_executing = False
-                            self.lock_unlock_button(config_name, False)  # Unlock the button
-
-                elif current_state == "Disconnect":
-                    if not self.command_executing:
-                        with self.button_lock:
-                            self.lock_unlock_button(config_name, True)  # Lock the button
-                            self.command_executing = True
-                            if active_sessions:
-                                self.disconnect_sessions(active_sessions)
-                            toggle_button = self.get_toggle_button(config_name)
-                            toggle_button.config(bg="green")
-                            button_state_var.set("Connect")
-                            self.command_executing = False
-                            self.lock_unlock_button(config_name, False)  # Unlock the button
-                
-                break  # If successful, exit the loop
+                self.lock_unlock_button(config_name, True)  # Lock the button
+                try:
+                    active_sessions = self.get_sessions_for_config(config_name)
+                    if active_sessions:
+                        self.disconnect_sessions(active_sessions)
+                    if kind in ('connect', 'reconnect'):
+                        self.connect_session(config_path, kind)
+                        self.set_button_state(config_name, "Disconnect")
+                    else:
+                        self.set_button_state(config_name, "Connect")
+                finally:
+                    self.lock_unlock_button(config_name, False)  # Unlock the button
+                return {'status': 'success', 'result': 'ok'}
             except Exception as e:
                 print(f"exception on toggle_vpn func: {e}")
                 if "org.freedesktop.DBus.Error.UnknownMethod" in str(e):
@@ -624,38 +2441,28 @@ class MyApp:
                         print(f"Retrying ({retry_count}/{max_retries})...")
                     else:
                         print("Max retries reached. Giving up.")
-                        break
+                        raise
                 else:
-                    break  # If a different exception occurs, do not retry
+                    raise  # If a different exception occurs, do not retry
 
+    def stop_all_sessions(self):
 
-    def get_toggle_button(self, config_name):
-
-        tabs = self.notebook.tabs()
-        for tab_id in tabs:
-            tab_name = self.notebook.tab(tab_id, option="text")
-            if tab_name == config_name:
-                tab_frame = self.notebook.nametowidget(tab_id)
-                toggle_button = tab_frame.winfo_children()[0]
-                return toggle_button
-                
+        # Through the 'stop' operation, so the reconnect scheduler doesn't bring them back
+        self.config_operations.request(None, 'stop')
 
     def kill_sessions(self):
 
-        active_sessions = self.get_all_sessions()
+        with self.session_table_lock:
+            active_sessions = [self.extract_session_name(session_path) for session_path in self.session_table]
         if active_sessions:
             self.disconnect_sessions(active_sessions)
             output_message = f"Killed all sessions: {', '.join(active_sessions)}"
             self.update_output(output_message)
 
-            for config_name in self.config_names:
-                active_sessions = self.get_sessions_for_config(config_name)
-                toggle_button = self.get_toggle_button(config_name)
-
-                if not active_sessions:
-                    button_state_var = self.button_state_vars[config_name]
-                    button_state_var.set("Connect")
-                    toggle_button.config(bg="green")
+            sessions_by_config = self.get_sessions_by_config()
+            for config_name in list(self.config_names):
+                if not sessions_by_config.get(config_name):
+                    self.set_button_state(config_name, "Connect")
 
         else:
             output_message = "No active sessions to kill."
@@ -668,19 +2475,13 @@ class MyApp:
         manager_object = self.bus.get_object('net.openvpn.v3.configuration', '/net/openvpn/v3/configuration')
         config_interface = dbus.Interface(manager_object, dbus_interface='net.openvpn.v3.configuration')
         config_path = config_interface.Import(config_name, config_content, False, True)
+        self.index_config(str(config_path))
         return config_path
 
     def find_config_path_by_name(self, config_name):
 
-        config_manager_object = self.bus.get_object('net.openvpn.v3.configuration', '/net/openvpn/v3/configuration')
-        config_manager_interface = dbus.Interface(config_manager_object, dbus_interface='net.openvpn.v3.configuration')
-        config_paths = config_manager_interface.FetchAvailableConfigs()
-
-        for config_path in config_paths:
-            properties = self.get_configuration_properties(config_path,"name")
-            if properties['name'] == config_name:
-                return config_path
-        return None
+        with self.config_index_lock:
+            return self.config_paths_by_name.get(config_name)
         
 
     def remove_configuration(self, config_path):
@@ -688,14 +2489,26 @@ class MyApp:
         config_object = self.bus.get_object('net.openvpn.v3.configuration', config_path)
         config_interface = dbus.Interface(config_object, dbus_interface='net.openvpn.v3.configuration')
         config_interface.Remove()
+        self.unindex_config(str(config_path))
         
 
-    def get_configuration_properties(self, config_path,property_name):
+    def get_configuration_properties(self, config_path,property_name,cached=True):
+
+        if cached:
+            with self.config_index_lock:
+                properties = self.config_index.get(str(config_path), {})
+                if property_name in properties:
+                    return {
+                        property_name: properties[property_name],
+                    }
 
         config_object = self.bus.get_object('net.openvpn.v3.configuration', config_path)
         properties_interface = dbus.Interface(config_object, dbus_interface='org.freedesktop.DBus.Properties')
         interface_name = 'net.openvpn.v3.configuration'
         property_value = properties_interface.Get(interface_name, property_name)
+        with self.config_index_lock:
+            if str(config_path) in self.config_index:
+                self.config_index[str(config_path)][property_name] = property_value
         return {
             property_name: property_value,
         }
@@ -706,7 +2519,10 @@ class MyApp:
         config_object = self.bus.get_object('net.openvpn.v3.configuration', config_path)
         properties_interface = dbus.Interface(config_object, dbus_interface='org.freedesktop.DBus.Properties')
         interface_name = 'net.openvpn.v3.configuration'
-        property_value = properties_interface.Set(interface_name, property_name, property_value)
+        properties_interface.Set(interface_name, property_name, property_value)
+        with self.config_index_lock:
+            if str(config_path) in self.config_index:
+                self.config_index[str(config_path)][property_name] = property_value
         return {
             property_name: property_value,
         }
@@ -714,105 +2530,191 @@ class MyApp:
 
     def get_available_config_names(self):
 
-        configs = []
-        config_manager_object = self.bus.get_object('net.openvpn.v3.configuration', '/net/openvpn/v3/configuration')
-        config_manager_interface = dbus.Interface(config_manager_object, dbus_interface='net.openvpn.v3.configuration')
-        config_paths = config_manager_interface.FetchAvailableConfigs()
+        with self.config_index_lock:
+            return [{config_path: properties['name']} for config_path, properties in self.config_index.items()]
 
-        self.output_text.configure(state='normal')
-        self.output_text.delete(1.0, 'end')
-        self.output_text.configure(state='disabled')
+    def read_config_properties(self, config_path):
 
-        for config_path in config_paths:
-            config_name = self.get_configuration_properties(config_path,"name")['name']
-            configs.append({str(config_path): str(config_name)})
-            self.config_names.add(config_name)
-
-        return configs
-        
+        config_object = self.bus.get_object('net.openvpn.v3.configuration', config_path)
+        properties_interface = dbus.Interface(config_object, dbus_interface='org.freedesktop.DBus.Properties')
+        properties = properties_interface.GetAll('net.openvpn.v3.configuration')
+        properties = {str(key): value for key, value in properties.items()}
+        properties['name'] = str(properties.get('name', ''))
+        return properties
 
-    def get_sessions_for_config(self, config_name):
+    def index_config(self, config_path):
 
-        active_sessions = []
-        sessions_manager_object = self.bus.get_object('net.openvpn.v3.sessions', '/net/openvpn/v3/sessions')
-        sessions_manager_interface = dbus.Interface(sessions_manager_object, dbus_interface='net.openvpn.v3.sessions')
         try:
-            session_paths = sessions_manager_interface.LookupConfigName(config_name)
-            active_sessions = [self.extract_session_name(session_path) for session_path in session_paths]
+            properties = self.read_config_properties(config_path)
         except dbus.exceptions.DBusException as e:
-            self.update_output(f'Exeption on func get_sessions_for_configs:  {str(e)}')
-
-        return active_sessions
-        
-
-    def get_all_sessions(self):
-        active_sessions = []
-        sessions_manager_object = self.bus.get_object('net.openvpn.v3.sessions', '/net/openvpn/v3/sessions')
-        sessions_manager_interface = dbus.Interface(sessions_manager_object, dbus_interface='net.openvpn.v3.sessions')
+            self.update_output(f'Exeption on func index_config:  {str(e)}')
+            return
+        with self.config_index_lock:
+            old_properties = self.config_index.get(config_path)
+            if old_properties is not None:
+                self.config_paths_by_name.pop(old_properties['name'], None)
+            self.config_index[config_path] = properties
+            self.config_paths_by_name[properties['name']] = config_path
+            self.config_index_version += 1
+        self.config_names.add(properties['name'])
+        self.notify_session_table_changed([properties['name']])
+
+    def unindex_config(self, config_path):
+
+        with self.config_index_lock:
+            properties = self.config_index.pop(config_path, None)
+            if properties is not None:
+                self.config_paths_by_name.pop(properties['name'], None)
+                self.config_index_version += 1
+        if properties is not None:
+            self.config_names.discard(properties['name'])
+            self.remove_config_status(properties['name'])
+            self.reconnect_scheduler.forget(properties['name'])
+            self.schedule_state_snapshot()
+
+    def rebuild_config_index(self):
+
+        config_manager_object = self.bus.get_object('net.openvpn.v3.configuration', CONFIGURATION_ROOT_PATH)
+        config_manager_interface = dbus.Interface(config_manager_object, dbus_interface='net.openvpn.v3.configuration')
         try:
-            session_paths = sessions_manager_interface.FetchAvailableSessions()
-            active_sessions = [self.extract_session_name(session_path) for session_path in session_paths]
-        except dbus.exceptions.DBusException as e:
-            self.update_output(f'Exeption on func get_all_sessions:  {str(e)}')
+            config_paths = config_manager_interface.FetchAvailableConfigs()
+        except dbus.exceptions.DBusException:
+            self.update_output("No such interface net.openvpn.v3.configuration. Trying to add one.")
+            config_paths = config_manager_interface.FetchAvailableConfigs()
 
-        return active_sessions
-        
-
-    def disconnect_sessions(self, session_paths):
-
-        for session in session_paths:
-            self.update_output(f"Session {session} is killed.")
-            sessions_manager_object = self.bus.get_object('net.openvpn.v3.sessions', f'/net/openvpn/v3/sessions/{session}')
-            sessions_manager_interface = dbus.Interface(sessions_manager_object, dbus_interface='net.openvpn.v3.sessions')
-            sessions_manager_interface.Disconnect()
-            
-
-    def connect_session(self, config_path):
+        config_index = {}
+        for config_path in config_paths:
+            try:
+                config_index[str(config_path)] = self.read_config_properties(config_path)
+            except dbus.exceptions.DBusException:
+                # Config was removed between the listing and the property read
+                pass
+        with self.config_index_lock:
+            self.config_index = config_index
+            self.config_paths_by_name = {properties['name']: config_path for config_path, properties in config_index.items()}
+            self.config_index_version += 1
+        removed_names = self.config_names - {properties['name'] for properties in config_index.values()}
+        self.config_names = {properties['name'] for properties in config_index.values()}
+        for config_name in removed_names:
+            self.remove_config_status(config_name)
+        self.notify_session_table_changed(self.config_names)
+
+    def config_is_up(self, config_name):
+
+        # Only an explicit reconnect replaces a session that is online or still coming up
+        with self.session_table_lock:
+            return any(session_phase(entry) != 'down' for entry in self.session_table.values() if entry['config_name'] == config_name)
 
+    def get_sessions_for_config(self, config_name):
 
-        sessions_manager_object = self.bus.get_object('net.openvpn.v3.sessions', f'/net/openvpn/v3/sessions')
-        sessions_manager_interface = dbus.Interface(sessions_manager_object, dbus_interface='net.openvpn.v3.sessions')
-        new_tunnel = sessions_manager_interface.NewTunnel(config_path)
-        self.update_output(f"Creating new tunnel and check if it's ready for {config_path}")
-        sessions_manager_object = self.bus.get_object('net.openvpn.v3.sessions', new_tunnel)
-        sessions_manager_interface = dbus.Interface(sessions_manager_object, dbus_interface='net.openvpn.v3.sessions')
+        with self.session_table_lock:
+            session_paths = [path for path, entry in self.session_table.items() if entry['config_name'] == config_name]
+        return [self.extract_session_name(session_path) for session_path in session_paths]
+        
 
+    def disconnect_sessions(self, session_names):
+
+        # Every Disconnect is sent at once without a proxy object, the replies are
+        # collected on the D-Bus thread, so this takes one round-trip however many
+        # sessions there are. Returns the sessions that failed or didn't answer.
+        if not session_names:
+            return []
+        started = time.time()
+        timeout = self.backend_settings['disconnect_timeout']
+        pending = set(session_names)
+        failed = {}
+        replies = threading.Condition()
+
+        def finished(session, error=None):
+            with replies:
+                pending.discard(session)
+                if error is not None:
+                    failed[session] = error
+                replies.notify_all()
+
+        for session in session_names:
+            self.bus.call_async('net.openvpn.v3.sessions', f'{SESSIONS_ROOT_PATH}/{session}', 'net.openvpn.v3.sessions', 'Disconnect', '', (),
+                                lambda session=session: finished(session), lambda error, session=session: finished(session, error),
+                                timeout=timeout)
+        with replies:
+            replies.wait_for(lambda: not pending, timeout)
+            for session in pending:
+                failed[session] = "no reply"
+        self.untrack_sessions([f'{SESSIONS_ROOT_PATH}/{session}' for session in session_names])
+        self.update_output(f"Sessions {', '.join(session_names)} are killed in {time.time() - started:.2f} sec.")
+        for session, error in failed.items():
+            self.update_output(f"Disconnect of session {session} failed: {error}")
+        return list(failed)
+
+    def connect_session(self, config_path, kind='connect'):
+
+        attempt = self.connect_timelines.start(self.get_configuration_properties(config_path, "name")['name'], kind)
+        # Counted until it has produced an auth URL or given up, see _check_auth_urls
+        self.begin_pending_connect()
+        try:
+            self._connect_session(config_path, attempt)
+        except Exception:
+            self.connect_timelines.finish(attempt, 'failed')
+            raise
+        finally:
+            self.end_pending_connect()
 
-        ready_timer = 0
-        while True:
-            try:
-                ready_timer = ready_timer + 1
-                self.update_output(f"Starting tunnel..Waiting for Ready state {ready_timer} sec..")
-                time.sleep(1)
-                is_ready = sessions_manager_interface.Ready()
-                if is_ready is None:
-                    self.update_output(f"Tunnel for {config_path} is ready.")
-                    break
-                elif ready_timer >= 10:
-                    self.update_output("Tunnel failed to start during 10 sec. Aborting..")
-                    break
-            except dbus.exceptions.DBusException as e:
-                error_message = str(e)
-                self.update_output(f"DBusException: {error_message}")
-                break
+    def _connect_session(self, config_path, attempt):
 
-        self.update_output("Trying to connect via created tunnel..")
-        new_connect = sessions_manager_interface.Connect()
+        config_name = attempt['config_name']
+        with self.connect_slots:
+            deadline = time.time() + self.get_connect_timeout(config_name)
 
-        ready_timer = 0
-        while True:
-            try:
-                ready_timer = ready_timer + 0.3
-                time.sleep(0.3)
-                auth_url = self.get_web_link(new_tunnel)
-                if ready_timer >= 5:
-                    break
-                if "http" in auth_url:
-                    self.auth_urls.append({str(config_path):auth_url})
-                    break
-            except Exception as e:
-                break
-                print(f"Exception on func connect_session {e}")
+            sessions_manager_object = self.bus.get_object('net.openvpn.v3.sessions', SESSIONS_ROOT_PATH)
+            sessions_manager_interface = dbus.Interface(sessions_manager_object, dbus_interface='net.openvpn.v3.sessions')
+            new_tunnel = sessions_manager_interface.NewTunnel(config_path)
+            self.connect_timelines.mark(attempt, 'NewTunnel')
+            self.connect_timelines.attach(attempt, str(new_tunnel))
+            self.track_session(str(new_tunnel))
+            self.update_output(f"Creating new tunnel and check if it's ready for {config_path}")
+            sessions_manager_object = self.bus.get_object('net.openvpn.v3.sessions', new_tunnel)
+            sessions_manager_interface = dbus.Interface(sessions_manager_object, dbus_interface='net.openvpn.v3.sessions')
+            session_path = str(new_tunnel)
+
+            def check_ready():
+                try:
+                    sessions_manager_interface.Ready()
+                    return True
+                except dbus.exceptions.DBusException as e:
+                    if "not ready" in str(e).lower():
+                        return False
+                    # Anything but "not ready yet" won't go away by waiting, let Connect() report it
+                    self.update_output(f"DBusException: {str(e)}")
+                    return None
+
+            self.update_output("Starting tunnel..Waiting for Ready state..")
+            ready_timeout = min(self.backend_settings['ready_timeout'], max(0, deadline - time.time()))
+            is_ready = self.wait_for_session(session_path, check_ready, ready_timeout)
+            if is_ready:
+                self.connect_timelines.mark(attempt, 'Ready')
+                self.update_output(f"Tunnel for {config_path} is ready.")
+            elif is_ready is False:
+                self.update_output(f"Tunnel failed to start during {ready_timeout} sec. Aborting..")
+
+            self.update_output("Trying to connect via created tunnel..")
+            sessions_manager_interface.Connect()
+            self.connect_timelines.mark(attempt, 'Connect')
+
+            def check_auth_url():
+                with self.session_table_lock:
+                    if session_path in self.queued_auth_urls:
+                        return True
+                try:
+                    return self.queue_auth_url(session_path, self.get_web_link(session_path))
+                except dbus.exceptions.DBusException as e:
+                    print(f"Exception on func connect_session {e}")
+                    return True
+
+            auth_url_timeout = min(self.backend_settings['auth_url_timeout'], max(0, deadline - time.time()))
+            if not self.wait_for_session(session_path, check_auth_url, auth_url_timeout):
+                self.update_output(f"No auth URL for {config_name} yet, it will be opened when it arrives.")
+
+        self.update_output(f"Timing for {config_name}: {self.format_connect_timing(attempt)}")
 
 
     def extract_session_name(self, session_path):
@@ -828,12 +2730,24 @@ class MyApp:
         property_name = 'status'
         property_value = properties_interface.Get(interface_name, property_name)
         web_link = str(property_value[2])
-        self.update_output(f'Auth link: {web_link}')
         return web_link
         
 
+    def get_session_statistics(self, session_path):
+
+        # The whole statistics dict in one Get per session; no introspection, this runs every few seconds
+        session_object = self.bus.get_object('net.openvpn.v3.sessions', session_path, introspect=False)
+        properties_interface = dbus.Interface(session_object, dbus_interface='org.freedesktop.DBus.Properties')
+        statistics = properties_interface.Get('net.openvpn.v3.sessions', 'statistics')
+        return {str(key): int(value) for key, value in statistics.items()}
+
     def get_session_status(self, session_path):
 
+        with self.session_table_lock:
+            entry = self.session_table.get(session_path)
+        if entry is not None:
+            return entry['status']
+
         config_object = self.bus.get_object('net.openvpn.v3.sessions', session_path)
         properties_interface = dbus.Interface(config_object, dbus_interface='org.freedesktop.DBus.Properties')
         interface_name = 'net.openvpn.v3.sessions'
@@ -845,8 +2759,1030 @@ class MyApp:
         return session_status
 
 
-if __name__ == "__main__":
-    freeze_support()
+class AsyncBackendCore:
+    """Backend core running on a single asyncio event loop (--async-core).
+
+    The config index, the session table, connects, the socket server and the
+    auth URL dispatcher are coroutines on one loop and reach openvpn3 through
+    dbus-next, so nothing polls on a timer except the slow safety-net rescan.
+    Tk is optional: views only get events through post_to_views.
+    """
+
+    def __init__(self, settings, auto_restart_settings, headless=False):
+        self.settings = settings
+        self.auto_restart_settings = auto_restart_settings
+        self.headless = headless
+        self.logger = create_file_logger(settings)
+        self.loop = None
+        # Set once self.loop exists, views attached from other threads wait for it
+        self.loop_ready = threading.Event()
+        self.bus = None
+        self.config_index = {}
+        self.config_paths_by_name = {}
+        self.session_table = {}
+        # Replaced by a fresh Event on every session table change, see notify_session_table_changed
+        self.session_event = None
+        self.vpn_statuses = {}
+        self.subscribers = {}
+        self.auth_urls = []
+        self.queued_auth_urls = {}
+        self.auth_urls_changed = None
+        self.pending_connects = 0
+        self.connect_slots = None
+        self.config_operations = AsyncConfigOperations(self.run_config_operation, settings['operation_debounce'], self.spawn, self.update_output)
+        self.reconnect_scheduler = ReconnectScheduler(settings, auto_restart_settings)
+        self.reconnects = []
+        self.sleeping = False
+        self.network_monitor = None
+        self.network_reasons = set()
+        self.connect_timelines = ConnectTimelines(settings['connect_history_path'], settings['connect_history_max_bytes'],
+                                                  settings['connect_history_keep'], self.update_output)
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.background_tasks = set()
+        self.views = []
+        self.settings_view_thread = None
+        self.ready = None
+        self.cold_start_logged = False
+        self.snapshot_handle = None
+        self.stopped = None
+        self.browser_service = BrowserService(settings['browser_idle_timeout'], settings['browser_prewarm'], settings['silent_sso_timeout'],
+                                              on_event=self.on_browser_message)
+        self.call_stats = CallStats(settings['collect_stats'])
+        self.traffic_stats = TrafficStats(settings['statistics_samples'], settings['stall_after'], self.update_output)
+        self.traffic_shown = False
+        # Created on the main thread, which is the only one that may install signal handlers
+        self.profiler = SamplingProfiler('openvpn-saml-backend', log=self.update_output)
+        self.profiler.install_signal_handlers()
+
+    def run(self):
+        try:
+            asyncio.run(self.main())
+        finally:
+            self.post_to_views(('quit',))
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_ready.set()
+        self.session_event = asyncio.Event()
+        self.auth_urls_changed = asyncio.Event()
+        self.connect_slots = asyncio.Semaphore(self.settings['max_parallel_connects'])
+        self.stopped = asyncio.Event()
+        self.ready = asyncio.Event()
+        if self.load_state_snapshot():
+            self.ready.set()
+
+        # Bound first, so a tray that spawned us connects right away and its
+        # requests wait on self.ready instead of failing and respawning
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+        server = await asyncio.start_unix_server(self.handle_client, path=SOCKET_PATH)
+        print(f"Listening on UNIX socket {SOCKET_PATH} after {process_age():.3f} sec")
+
+        import_dbus_next()
+        self.bus = await dbus_next.aio.MessageBus(bus_type=dbus_next.BusType.SYSTEM).connect()
+        self.bus.add_message_handler(self.on_dbus_message)
+        for member in ('SessionManagerEvent', 'ConfigurationManagerEvent', 'StatusChange', 'Log', 'PrepareForSleep'):
+            await self.call_dbus('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'AddMatch', 's', [f"type='signal',member='{member}'"])
+        await self.rebuild_config_index()
+        await self.refresh_session_table()
+        self.ready.set()
+
+        self.spawn(self.dispatch_auth_urls())
+        self.spawn(self.safety_net_refresh())
+        self.spawn(self.autostart_connections())
+        self.spawn(self.run_reconnect_scheduler())
+        if self.settings['statistics_interval'] > 0:
+            self.spawn(self.run_traffic_sampler())
+        if self.settings['watch_network']:
+            self.watch_network()
+        if self.settings['browser_prewarm']:
+            self.loop.run_in_executor(None, self.browser_service.ensure_started)
+        if self.settings['stats_dump_path']:
+            self.spawn(self.run_stats_dump())
+
+        await self.stopped.wait()
+        self.save_state_snapshot()
+        server.close()
+        for task in list(self.background_tasks):
+            task.cancel()
+        self.bus.disconnect()
+
+    def submit(self, coro):
+        # Entry point for other threads (the Tk view)
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def spawn(self, coro):
+        task = self.loop.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.task_done)
+        return task
+
+    def task_done(self, task):
+        self.background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.update_output(f"Exception in {task.get_coro().__name__}: {task.exception()}")
+
+    def load_state_snapshot(self):
+        snapshot = read_state_snapshot(self.settings['state_snapshot_path'])
+        if snapshot is None:
+            return False
+        snapshot = parse_state_snapshot(snapshot)
+        if snapshot is None:
+            return False
+        self.config_index, self.session_table, self.vpn_statuses = snapshot
+        self.config_paths_by_name = {properties['name']: path for path, properties in self.config_index.items()}
+        print(f"Loaded state snapshot with {len(self.config_index)} configs and {len(self.session_table)} sessions")
+        return True
+
+    def schedule_state_snapshot(self):
+        if self.snapshot_handle is None:
+            self.snapshot_handle = self.loop.call_later(self.settings['state_snapshot_delay'], self.save_state_snapshot)
+
+    def save_state_snapshot(self):
+        if self.snapshot_handle is not None:
+            self.snapshot_handle.cancel()
+            self.snapshot_handle = None
+        snapshot = build_state_snapshot(self.config_index, self.session_table, self.vpn_statuses)
+        try:
+            write_state_snapshot(self.settings['state_snapshot_path'], snapshot)
+        except OSError as e:
+            print(f"Can't write state snapshot: {e}")
+
+    def attach_view(self, view):
+        # Called from the view's thread, the snapshot is taken on the loop
+        def attach():
+            self.views.append(view)
+            for config_name in self.vpn_statuses:
+                view.events.put(('status', config_name) + self.get_config_status(config_name))
+        self.loop_ready.wait()
+        self.loop.call_soon_threadsafe(attach)
+
+    def post_to_views(self, event):
+        for view in list(self.views):
+            view.events.put(event)
+
+    def update_output(self, message):
+        message = str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")) + ' ' + message
+        self.logger.info(message)
+        self.post_to_views(('log', message))
+
+    async def call_dbus(self, destination, path, interface, member, signature='', body=None):
+        if not self.call_stats.enabled:
+            return await self._call_dbus(destination, path, interface, member, signature, body)
+        name = dbus_call_name(interface, member, body or [])
+        started = time.perf_counter()
+        try:
+            result = await self._call_dbus(destination, path, interface, member, signature, body)
+        except Exception:
+            self.call_stats.record('dbus', name, time.perf_counter() - started, error=True)
+            raise
+        self.call_stats.record('dbus', name, time.perf_counter() - started)
+        return result
+
+    async def _call_dbus(self, destination, path, interface, member, signature, body):
+        reply = await self.bus.call(dbus_next.Message(destination=destination, path=path, interface=interface, member=member,
+                                                      signature=signature, body=body or []))
+        if reply.message_type == dbus_next.MessageType.ERROR:
+            raise dbus_next.errors.DBusError(reply.error_name, reply.body[0] if reply.body else '', reply)
+        return reply.body
+
+    async def get_all_properties(self, destination, path, interface):
+        (properties,) = await self.call_dbus(destination, path, 'org.freedesktop.DBus.Properties', 'GetAll', 's', [interface])
+        return {key: variant.value for key, variant in properties.items()}
+
+    def on_dbus_message(self, message):
+        if message.message_type != dbus_next.MessageType.SIGNAL or not message.path:
+            return
+        member, path = message.member, message.path
+        if member == 'SessionManagerEvent' and path == SESSIONS_ROOT_PATH:
+            session_path, event_type = message.body[0], message.body[1]
+            if event_type == SESSION_CREATED:
+                self.spawn(self.track_session(session_path))
+            elif event_type == SESSION_DESTROYED:
+                self.untrack_session(session_path)
+        elif member == 'PrepareForSleep' and path == '/org/freedesktop/login1':
+            self.on_prepare_for_sleep(message.body[0])
+        elif member == 'ConfigurationManagerEvent' and path == CONFIGURATION_ROOT_PATH:
+            config_path, event_type = message.body[0], message.body[1]
+            if event_type in (CONFIG_CREATED, CONFIG_NAME_CHANGED):
+                self.spawn(self.index_config(config_path))
+            elif event_type == CONFIG_DESTROYED:
+                self.unindex_config(config_path)
+        elif member == 'StatusChange' and path.startswith(SESSIONS_ROOT_PATH + '/'):
+            self.on_session_status_change(path, *message.body[:3])
+        elif member == 'Log' and path.startswith(SESSIONS_ROOT_PATH + '/') and message.body:
+            entry = self.session_table.get(path)
+            if entry is not None and apply_session_log(entry, message.body[-1]):
+                self.notify_session_table_changed([entry['config_name']])
+
+    def on_session_status_change(self, path, major, minor, message):
+        entry = self.session_table.get(path)
+        if entry is None:
+            self.spawn(self.track_session(path))
+            return
+        apply_session_status(entry, major, minor, message)
+        mark_session_status(self.connect_timelines, path, int(minor), self.update_output)
+        if int(minor) == SESS_AUTH_URL:
+            self.queue_auth_url(path, str(message))
+        self.notify_session_table_changed([entry['config_name']])
+
+    def notify_session_table_changed(self, config_names):
+        self.session_event.set()
+        self.session_event = asyncio.Event()
+        self.schedule_state_snapshot()
+        for config_name in config_names:
+            self.update_config_status(config_name)
+
+    async def read_session_entry(self, session_path):
+        properties = await self.get_all_properties('net.openvpn.v3.sessions', session_path, 'net.openvpn.v3.sessions')
+        last_log = properties.get('last_log', {}).get('log_message')
+        last_log = str(last_log.value) if last_log is not None else ''
+        return make_session_entry(properties.get('config_name', ''), properties.get('status', (0, 0, '')), last_log)
+
+    async def track_session(self, session_path):
+        try:
+            entry = await self.read_session_entry(session_path)
+        except dbus_next.errors.DBusError as e:
+            self.update_output(f'Exeption on func track_session:  {str(e)}')
+            return
+        self.session_table[session_path] = entry
+        try:
+            await self.call_dbus('net.openvpn.v3.sessions', session_path, 'net.openvpn.v3.sessions', 'LogForward', 'b', [True])
+        except dbus_next.errors.DBusError:
+            pass
+        self.notify_session_table_changed([entry['config_name']])
+
+    def untrack_session(self, session_path):
+        entry = self.session_table.pop(session_path, None)
+        self.queued_auth_urls.pop(session_path, None)
+        self.connect_timelines.session_gone(session_path)
+        if entry is not None:
+            self.notify_session_table_changed([entry['config_name']])
+
+    async def refresh_session_table(self):
+        try:
+            (session_paths,) = await self.call_dbus('net.openvpn.v3.sessions', SESSIONS_ROOT_PATH, 'net.openvpn.v3.sessions', 'FetchAvailableSessions')
+        except dbus_next.errors.DBusError as e:
+            self.update_output(f'Exeption on func refresh_session_table:  {str(e)}')
+            return
+        entries = await asyncio.gather(*(self.read_session_entry(path) for path in session_paths), return_exceptions=True)
+        old_names = {entry['config_name'] for entry in self.session_table.values()}
+        self.session_table = {path: entry for path, entry in zip(session_paths, entries) if isinstance(entry, dict)}
+        self.notify_session_table_changed(old_names | set(self.config_paths_by_name))
+        for session_path, auth_url in waiting_auth_urls(self.session_table):
+            self.queue_auth_url(session_path, auth_url)
+
+    async def safety_net_refresh(self):
+        while True:
+            await asyncio.sleep(self.settings['status_poll_interval'])
+            if not self.sleeping:
+                await self.refresh_session_table()
+
+    async def read_config_properties(self, config_path):
+        properties = await self.get_all_properties('net.openvpn.v3.configuration', config_path, 'net.openvpn.v3.configuration')
+        properties['name'] = str(properties.get('name', ''))
+        return properties
+
+    async def index_config(self, config_path):
+        try:
+            properties = await self.read_config_properties(config_path)
+        except dbus_next.errors.DBusError as e:
+            self.update_output(f'Exeption on func index_config:  {str(e)}')
+            return
+        old_properties = self.config_index.get(config_path)
+        if old_properties is not None:
+            self.config_paths_by_name.pop(old_properties['name'], None)
+            self.remove_config_status(old_properties['name'])
+        self.config_index[config_path] = properties
+        self.config_paths_by_name[properties['name']] = config_path
+        self.update_config_status(properties['name'])
+
+    def unindex_config(self, config_path):
+        properties = self.config_index.pop(config_path, None)
+        if properties is not None:
+            self.config_paths_by_name.pop(properties['name'], None)
+            self.remove_config_status(properties['name'])
+
+    async def rebuild_config_index(self):
+        (config_paths,) = await self.call_dbus('net.openvpn.v3.configuration', CONFIGURATION_ROOT_PATH, 'net.openvpn.v3.configuration', 'FetchAvailableConfigs')
+        properties = await asyncio.gather(*(self.read_config_properties(path) for path in config_paths), return_exceptions=True)
+        self.config_index = {path: props for path, props in zip(config_paths, properties) if isinstance(props, dict)}
+        self.config_paths_by_name = {props['name']: path for path, props in self.config_index.items()}
+        for config_name in set(self.vpn_statuses) - set(self.config_paths_by_name):
+            self.remove_config_status(config_name)
+        for config_name in self.config_paths_by_name:
+            self.update_config_status(config_name)
+
+    async def import_configuration(self, config_name, config_content):
+        (config_path,) = await self.call_dbus('net.openvpn.v3.configuration', CONFIGURATION_ROOT_PATH, 'net.openvpn.v3.configuration',
+                                              'Import', 'ssbb', [config_name, config_content, False, True])
+        await self.index_config(config_path)
+        self.update_output(f"Added config: {config_path}")
+        return config_path
+
+    async def remove_configuration(self, config_name):
+        config_path = self.config_paths_by_name.get(config_name)
+        if config_path is None:
+            self.update_output(f"Configuration with the name '{config_name}' not found.")
+            return
+        await self.call_dbus('net.openvpn.v3.configuration', config_path, 'net.openvpn.v3.configuration', 'Remove')
+        self.unindex_config(config_path)
+        self.update_output(f"Removed config: {config_name}.")
+
+    async def save_auto_restart_setting(self, config_name, auto_restart_value, dco_value):
+        # Same as MyApp.save_auto_restart_setting, the scheduler sees the change through the shared dict
+        settings = self.auto_restart_settings.setdefault(config_name, {})
+        settings['auto_restart'] = auto_restart_value
+        self.update_output(f"{config_name}: auto_restart_value:{auto_restart_value}")
+        settings['dco'] = dco_value
+        write_auto_restart_settings(self.auto_restart_settings)
+
+        config_path = self.config_paths_by_name.get(config_name)
+        if config_path is None:
+            return
+        await self.call_dbus('net.openvpn.v3.configuration', config_path, 'org.freedesktop.DBus.Properties', 'Set', 'ssv',
+                             ['net.openvpn.v3.configuration', 'dco', dbus_next.Variant('b', bool(dco_value))])
+        self.config_index[config_path]['dco'] = bool(dco_value)
+        self.update_output(f"{config_name}: dco:{bool(dco_value)}")
+
+    def get_sessions_for_config(self, config_name):
+        return [path for path, entry in self.session_table.items() if entry['config_name'] == config_name]
+
+    def get_config_status(self, config_name):
+        return describe_config_status([self.session_table[path] for path in self.get_sessions_for_config(config_name)])
+
+    def update_config_status(self, config_name):
+        if config_name not in self.config_paths_by_name:
+            return
+        status, color = self.get_config_status(config_name)
+        old_status = self.vpn_statuses.get(config_name)
+        if status == "" or status == old_status:
+            return
+        self.vpn_statuses[config_name] = status
+        self.publish_status_delta(config_name, old_status, status)
+        self.post_to_views(('status', config_name, status, color))
+
+    def remove_config_status(self, config_name):
+        if config_name in self.vpn_statuses:
+            self.publish_status_delta(config_name, self.vpn_statuses.pop(config_name), None)
+            self.post_to_views(('remove', config_name))
+
+    def get_vpn_status(self):
+        return [f"{config_name}:{status}" for config_name, status in self.vpn_statuses.items()]
+
+    def publish_status_delta(self, config_name, old_status, new_status):
+        self.schedule_state_snapshot()
+        event = {'id': None, 'event': 'status', 'config': config_name, 'old': old_status, 'new': new_status, 'timestamp': time.time()}
+        if new_status == "VPN Online":
+            sends = [self.send_frame(writer, write_lock, event) for writer, write_lock in list(self.subscribers.items())]
+            self.spawn(self.publish_online_status(config_name, sends))
+        else:
+            self.publish_event(event)
+
+    def publish_event(self, event):
+        for writer, write_lock in list(self.subscribers.items()):
+            self.spawn(self.send_frame(writer, write_lock, event))
+
+    async def publish_online_status(self, config_name, sends):
+        delivered = await asyncio.gather(*sends)
+        self.connect_timelines.status_published(config_name, any(delivered))
+
+    async def send_frame(self, writer, write_lock, message):
+        try:
+            async with write_lock:
+                writer.write(encode_frame(message))
+                await writer.drain()
+        except OSError:
+            self.subscribers.pop(writer, None)
+            return False
+        return True
+
+    async def handle_client(self, reader, writer):
+        # Every request runs as its own task, so a slow connect never holds up a status query
+        write_lock = asyncio.Lock()
+        try:
+            while True:
+                try:
+                    command = await recv_frame_async(reader)
+                except (OSError, EOFError, pickle.UnpicklingError) as e:
+                    print(f"Dropping client connection: {e}")
+                    break
+                if command is None:
+                    break
+                self.spawn(self.serve_request(command, writer, write_lock))
+        finally:
+            self.subscribers.pop(writer, None)
+            writer.close()
+
+    async def serve_request(self, command, writer, write_lock):
+        if command.get('function') not in READY_EXEMPT_COMMANDS:
+            await self.ready.wait()
+        if command.get('function') == "subscribe":
+            # Registered and answered without yielding, so no delta can overtake the snapshot
+            self.subscribers[writer] = write_lock
+            response = {'status': 'success', 'result': self.get_vpn_status()}
+        else:
+            started = time.perf_counter()
+            response = await self.handle_command(command.get('function'), command.get('args') or {})
+            if self.call_stats.enabled:
+                self.call_stats.record('ipc', command.get('function'), time.perf_counter() - started,
+                                       error=isinstance(response, dict) and response.get('status') == 'error')
+        try:
+            await self.send_frame(writer, write_lock, {'id': command.get('id'), 'response': response})
+        except (pickle.PicklingError, TypeError, AttributeError):
+            response.pop('exception', None)
+            await self.send_frame(writer, write_lock, {'id': command.get('id'), 'response': response})
+        if command.get('function') in ("get_vpn_status", "subscribe") and not self.cold_start_logged:
+            self.log_cold_start()
+
+    def log_cold_start(self):
+        self.cold_start_logged = True
+        elapsed = process_age()
+        self.update_output(f"Cold start: first status answered {elapsed:.3f} sec after launch")
+        if elapsed > self.settings['cold_start_target']:
+            self.update_output(f"Cold start took longer than the {self.settings['cold_start_target']} sec target")
+
+    async def handle_command(self, func_name, args):
+        try:
+            if func_name == "open_settings":
+                if self.headless and self.settings_view_thread is None:
+                    self.settings_view_thread = threading.Thread(target=run_settings_view, args=(self,), daemon=True)
+                    self.settings_view_thread.start()
+                else:
+                    self.post_to_views(('show',))
+                response = {'status': 'success', 'result': 'Settings opened'}
+            elif func_name == "quit":
+                await self.stop_all_connections()
+                self.post_to_views(('quit',))
+                self.loop.call_later(0.1, self.stopped.set)
+                response = {'status': 'success', 'result': 'Tray app commanded to exit'}
+            elif func_name == "ping":
+                response = {'status': 'success', 'result': 'Pong'}
+            elif func_name == "refresh":
+                await self.rebuild_config_index()
+                await self.refresh_session_table()
+                response = {'status': 'success', 'result': f'{len(self.config_index)} configs indexed'}
+            elif func_name == "get_vpn_status":
+                response = self.get_vpn_status()
+            elif func_name == "job_status":
+                job = self.jobs.get(args.get('job'))
+                if job is None:
+                    response = {'status': 'error', 'message': f"Job {args.get('job')} not found"}
+                else:
+                    response = {'status': 'success', 'result': dict(job)}
+            elif func_name == "connect":
+                response = self.submit_job(func_name, args, self.connect_config(args.get('config')))
+            elif func_name == "restart_all_connections":
+                response = self.submit_job(func_name, args, self.request_config_operation(None, 'restart'))
+            elif func_name == "stop_all_connections":
+                response = self.submit_job(func_name, args, self.request_config_operation(None, 'stop'))
+            elif func_name == "stats":
+                if 'enabled' in args:
+                    self.call_stats.enabled = bool(args['enabled'])
+                response = {'status': 'success', 'result': self.call_stats.snapshot()}
+                if args.get('reset'):
+                    self.call_stats.reset()
+            elif func_name == "timeline":
+                response = {'status': 'success', 'result': self.connect_timelines.report(args.get('config'), args.get('history', 0))}
+            elif func_name == "profile":
+                response = run_profile_command(self.profiler, args)
+            elif func_name == "thread_stacks":
+                response = {'status': 'success', 'result': format_thread_stacks()}
+            elif func_name == "traffic":
+                response = {'status': 'success', 'result': self.traffic_stats.report()}
+            else:
+                response = {'status': 'error', 'message': f"Function {func_name} not found"}
+        except Exception as e:
+            response = {'status': 'error', 'message': f'Exception on backend: {e}', 'exception': e}
+        return response
+
+    def submit_job(self, func_name, args, coro):
+        job = {'job': next(self.job_ids), 'function': func_name, 'args': args, 'state': 'running', 'result': None,
+               'submitted': time.time(), 'started': time.time(), 'finished': None}
+        self.jobs[job['job']] = job
+        finished = [job_id for job_id, kept in self.jobs.items() if kept['state'] in ('done', 'failed')]
+        for job_id in finished[:max(0, len(self.jobs) - MAX_KEPT_JOBS)]:
+            del self.jobs[job_id]
+
+        async def run_job():
+            try:
+                job['result'] = {'status': 'success', 'result': await coro}
+                job['state'] = 'done'
+            except Exception as e:
+                job['result'] = {'status': 'error', 'message': f'Exception on backend: {e}'}
+                job['state'] = 'failed'
+            job['finished'] = time.time()
+            if self.call_stats.enabled:
+                self.call_stats.record('job', func_name, job['finished'] - job['started'], error=job['state'] == 'failed')
+
+        self.spawn(run_job())
+        return {'status': 'success', 'result': 'ok', 'job': job['job']}
+
+    async def run_traffic_sampler(self):
+        while True:
+            await asyncio.sleep(self.settings['statistics_interval'])
+            if self.sleeping:
+                continue
+            connected = {path: entry['config_name'] for path, entry in self.session_table.items() if entry['minor'] == CONN_CONNECTED}
+            self.traffic_stats.keep_only(connected)
+            # One Get of the whole statistics dict per session, all sessions at once
+            replies = await asyncio.gather(*(self.call_dbus('net.openvpn.v3.sessions', session_path, 'org.freedesktop.DBus.Properties', 'Get', 'ss',
+                                                            ['net.openvpn.v3.sessions', 'statistics']) for session_path in connected),
+                                           return_exceptions=True)
+            for (session_path, config_name), reply in zip(connected.items(), replies):
+                if isinstance(reply, Exception):
+                    print(f"Can't read statistics of {session_path}: {reply}")
+                    continue
+                self.traffic_stats.record(session_path, config_name, reply[0].value)
+            if connected or self.traffic_shown:
+                report = self.traffic_stats.report()
+                self.traffic_shown = bool(report)
+                self.post_to_views(('traffic', report))
+                self.publish_event({'id': None, 'event': 'traffic', 'configs': report, 'timestamp': time.time()})
+
+    async def run_stats_dump(self):
+        while True:
+            await asyncio.sleep(self.settings['stats_dump_interval'])
+            try:
+                append_stats_dump(self.settings['stats_dump_path'], self.call_stats)
+            except OSError as e:
+                self.update_output(f"Can't write stats dump: {e}")
+
+    async def autostart_connections(self):
+        if not self.config_index:
+            self.update_output("No configs found. Please add new config.")
+        autoconnect_names = []
+        for config_name in self.config_paths_by_name:
+            if self.auto_restart_settings.get(config_name, {}).get('auto_restart', False):
+                if self.get_sessions_for_config(config_name):
+                    self.update_output(f"Active sessions found for {config_name}. Not autoconnecting.")
+                else:
+                    self.update_output(f"Starting autoconnect for {config_name}...")
+                    autoconnect_names.append(config_name)
+        await asyncio.gather(*(self.connect_config(config_name) for config_name in autoconnect_names))
+
+    def watch_network(self):
+        try:
+            self.network_monitor = NetworkMonitor(None, self.settings['network_settle_delay'])
+        except OSError as e:
+            self.update_output(f"Can't watch network changes: {e}")
+            return
+        self.loop.add_reader(self.network_monitor.sock, self.on_netlink_readable)
+
+    def on_netlink_readable(self):
+        reasons = self.network_monitor.parse(self.network_monitor.sock.recv(65536))
+        if reasons and not self.network_reasons:
+            self.loop.call_later(self.settings['network_settle_delay'], self.on_network_change)
+        self.network_reasons |= reasons
+
+    def on_network_change(self):
+        reasons, self.network_reasons = sorted(self.network_reasons), set()
+        if not self.sleeping:
+            self.update_output(f"Network changed ({', '.join(reasons)}), checking tunnels.")
+            self.spawn(self.reconnect_wanted_configs(False))
+
+    def on_prepare_for_sleep(self, start):
+        self.sleeping = bool(start)
+        if start:
+            self.update_output("System is going to sleep, pausing status polling and reconnects.")
+        else:
+            self.update_output("System resumed, reconnecting.")
+            self.spawn(self.reconnect_wanted_configs(True))
+
+    async def reconnect_wanted_configs(self, force):
+        # Same as MyApp.reconnect_wanted_configs, run_reconnect_scheduler does the reconnects
+        await self.refresh_session_table()
+        now = time.time()
+        for config_name in self.reconnect_scheduler.wanted_configs():
+            self.reconnect_scheduler.reconnect_now(config_name, now, force)
+        self.notify_session_table_changed([])
+
+    async def run_reconnect_scheduler(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.session_event.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+            if self.sleeping:
+                continue
+            self.reconnects = [operation for operation in self.reconnects if not operation.done.is_set()]
+            slots = self.settings['max_parallel_reconnects'] - len(self.reconnects)
+            for config_name in self.reconnect_scheduler.pick(list(self.config_paths_by_name), self.session_table.values(), time.time(),
+                                                             self.config_operations.busy, slots, self.update_output):
+                self.reconnects.append(self.config_operations.request(config_name, 'reconnect'))
+
+    async def restart_all_connections(self):
+        # Same as MyApp.run_config_operation: one queued reconnect per config
+        await asyncio.gather(*(self.request_config_operation(config_name, 'reconnect') for config_name in list(self.config_paths_by_name)))
+        return 'All sessions restarted'
+
+    async def stop_all_connections(self):
+        session_paths = list(self.session_table)
+        await self.disconnect_sessions(session_paths)
+        if session_paths:
+            self.update_output(f"Killed all sessions: {', '.join(path.split('/')[-1] for path in session_paths)}")
+        return 'All sessions stopped'
+
+    async def disconnect_sessions(self, session_paths):
+        # Same as MyApp.disconnect_sessions: all calls at once, one shared timeout
+        if not session_paths:
+            return []
+        started = time.time()
+        calls = {self.loop.create_task(self.call_dbus('net.openvpn.v3.sessions', path, 'net.openvpn.v3.sessions', 'Disconnect')): path
+                 for path in session_paths}
+        done, pending = await asyncio.wait(calls, timeout=self.settings['disconnect_timeout'])
+        for call in pending:
+            call.cancel()
+        failed = {calls[call]: call.exception() for call in done if call.exception() is not None}
+        failed.update({calls[call]: "no reply" for call in pending})
+        config_names = set()
+        for session_path in session_paths:
+            entry = self.session_table.pop(session_path, None)
+            self.queued_auth_urls.pop(session_path, None)
+            if entry is not None:
+                config_names.add(entry['config_name'])
+        self.notify_session_table_changed(config_names)
+        self.update_output(f"Sessions {', '.join(path.split('/')[-1] for path in session_paths)} are killed in {time.time() - started:.2f} sec.")
+        for session_path, error in failed.items():
+            self.update_output(f"Disconnect of session {session_path.split('/')[-1]} failed: {error}")
+        return list(failed)
+
+    async def disconnect_config(self, config_name):
+        return await self.request_config_operation(config_name, 'disconnect')
+
+    async def disconnect_sessions_of(self, config_name):
+        await self.disconnect_sessions(self.get_sessions_for_config(config_name))
+        return 'ok'
+
+    async def request_config_operation(self, config_name, kind):
+        return await self.config_operations.wait(self.config_operations.request(config_name, kind))
+
+    async def run_config_operation(self, config_name, kind):
+        # Runs under AsyncConfigOperations, never twice at once for one config
+        if config_name is None:
+            for name in list(self.config_paths_by_name):
+                self.reconnect_scheduler.set_wanted(name, kind == 'restart')
+            if kind == 'restart':
+                return await self.restart_all_connections()
+            return await self.stop_all_connections()
+        if kind != 'reconnect':
+            self.reconnect_scheduler.set_wanted(config_name, kind == 'connect')
+        if kind == 'disconnect':
+            return await self.disconnect_sessions_of(config_name)
+        return await self._connect_config(config_name, kind)
+
+    async def connect_config(self, config_name):
+        return await self.request_config_operation(config_name, 'connect')
+
+    async def _connect_config(self, config_name, kind='connect'):
+        config_path = self.config_paths_by_name.get(config_name)
+        if config_path is None:
+            raise KeyError(f"Config {config_name} not found")
+        if kind == 'connect' and any(session_phase(self.session_table[path]) != 'down' for path in self.get_sessions_for_config(config_name)):
+            self.update_output(f"{config_name} is already online or connecting, not reconnecting it")
+            return 'ok'
+        await self.disconnect_sessions_of(config_name)
+        await self.connect_session(config_path, config_name, kind)
+        return 'ok'
+
+    async def connect_session(self, config_path, config_name, kind='connect'):
+        attempt = self.connect_timelines.start(config_name, kind)
+        # Counted until it has produced an auth URL or given up, see dispatch_auth_urls
+        self.pending_connects += 1
+        try:
+            await self._connect_session(config_path, attempt)
+        except BaseException:
+            self.connect_timelines.finish(attempt, 'failed')
+            raise
+        finally:
+            self.pending_connects -= 1
+            self.auth_urls_changed.set()
+
+    async def _connect_session(self, config_path, attempt):
+        config_name = attempt['config_name']
+        async with self.connect_slots:
+            timeout = self.auto_restart_settings.get(config_name, {}).get('connect_timeout', self.settings['connect_timeout'])
+            deadline = self.loop.time() + timeout
+
+            (session_path,) = await self.call_dbus('net.openvpn.v3.sessions', SESSIONS_ROOT_PATH, 'net.openvpn.v3.sessions', 'NewTunnel', 'o', [config_path])
+            self.connect_timelines.mark(attempt, 'NewTunnel')
+            self.connect_timelines.attach(attempt, session_path)
+            await self.track_session(session_path)
+            self.update_output(f"Creating new tunnel and check if it's ready for {config_path}")
+
+            async def check_ready(polled):
+                try:
+                    await self.call_dbus('net.openvpn.v3.sessions', session_path, 'net.openvpn.v3.sessions', 'Ready')
+                    return True
+                except dbus_next.errors.DBusError as e:
+                    if "not ready" in str(e).lower():
+                        return False
+                    self.update_output(f"DBusException: {str(e)}")
+                    return None
+
+            ready_timeout = min(self.settings['ready_timeout'], max(0, deadline - self.loop.time()))
+            is_ready = await self.wait_for_session(session_path, check_ready, ready_timeout)
+            if is_ready:
+                self.connect_timelines.mark(attempt, 'Ready')
+                self.update_output(f"Tunnel for {config_path} is ready.")
+            elif is_ready is False:
+                self.update_output(f"Tunnel failed to start during {ready_timeout} sec. Aborting..")
+
+            self.update_output("Trying to connect via created tunnel..")
+            await self.call_dbus('net.openvpn.v3.sessions', session_path, 'net.openvpn.v3.sessions', 'Connect')
+            self.connect_timelines.mark(attempt, 'Connect')
+
+            async def check_auth_url(polled):
+                if session_path in self.queued_auth_urls:
+                    return True
+                entry = self.session_table.get(session_path)
+                if entry is not None and entry['minor'] == SESS_AUTH_URL and self.queue_auth_url(session_path, entry['message']):
+                    return True
+                if polled:
+                    try:
+                        (status,) = await self.call_dbus('net.openvpn.v3.sessions', session_path, 'org.freedesktop.DBus.Properties', 'Get', 'ss',
+                                                         ['net.openvpn.v3.sessions', 'status'])
+                    except dbus_next.errors.DBusError as e:
+                        print(f"Exception on func connect_session {e}")
+                        return True
+                    return self.queue_auth_url(session_path, str(status.value[2]))
+                return False
+
+            auth_url_timeout = min(self.settings['auth_url_timeout'], max(0, deadline - self.loop.time()))
+            if not await self.wait_for_session(session_path, check_auth_url, auth_url_timeout):
+                self.update_output(f"No auth URL for {config_name} yet, it will be opened when it arrives.")
+
+        self.update_output(f"Timing for {config_name}: {format_connect_timing(attempt)}")
+
+    async def wait_for_session(self, session_path, check, timeout):
+        # Same contract as MyApp.wait_for_session: check(polled) runs whenever the session's
+        # entry changes, or with exponential backoff (polled=True) when no signal comes.
+        deadline = self.loop.time() + timeout
+        backoff = self.settings['poll_initial_interval']
+        polled = False
+        while True:
+            seen = self.session_table.get(session_path, {}).get('updated')
+            result = await check(polled)
+            remaining = deadline - self.loop.time()
+            if result is not False or remaining <= 0:
+                return result
+            polled = not await self.wait_session_changed(session_path, seen, min(backoff, remaining))
+            if polled:
+                backoff = min(backoff * 2, self.settings['poll_max_interval'])
+
+    async def wait_session_changed(self, session_path, seen, timeout):
+        deadline = self.loop.time() + timeout
+        while self.session_table.get(session_path, {}).get('updated') == seen:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self.session_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def queue_auth_url(self, session_path, auth_url):
+        if "http" not in auth_url:
+            return False
+        if self.queued_auth_urls.get(session_path) == auth_url:
+            return True
+        self.queued_auth_urls[session_path] = auth_url
+        self.connect_timelines.mark_session(session_path, 'auth URL')
+        self.update_output(f'Auth link: {auth_url}')
+        self.auth_urls.append({session_path: auth_url})
+        self.auth_urls_changed.set()
+        return True
+
+    def on_browser_message(self, message):
+        # Called on the browser service's reader thread
+        self.loop.call_soon_threadsafe(self.on_browser_event, message)
+
+    def on_browser_event(self, message):
+        if message.get('event') == 'shown':
+            for session_path, auth_url in list(self.queued_auth_urls.items()):
+                if auth_url in message.get('urls', []):
+                    self.connect_timelines.mark_session(session_path, 'browser shown')
+
+    async def dispatch_auth_urls(self):
+        while True:
+            await self.auth_urls_changed.wait()
+            self.auth_urls_changed.clear()
+            if not self.auth_urls:
+                continue
+            # Same batching as MyApp._check_auth_urls
+            deadline = self.loop.time() + self.settings['auth_batch_grace']
+            while self.pending_connects > 0 and deadline > self.loop.time():
+                try:
+                    await asyncio.wait_for(self.auth_urls_changed.wait(), deadline - self.loop.time())
+                except asyncio.TimeoutError:
+                    break
+                self.auth_urls_changed.clear()
+            urls_to_process, self.auth_urls = self.auth_urls, []
+            self.update_output(f"{len(urls_to_process)} web links ready, connecting")
+            await self.loop.run_in_executor(None, self.browser_service.open_urls,
+                                            [url for auth_dict in urls_to_process for url in auth_dict.values()])
+
+
+class AsyncCoreView:
+    """Thin Tk window on top of AsyncBackendCore: log, config list, connect/disconnect
+    and the Autoconnect/DCO toggles of the selected config.
+
+    Everything it shows arrives through self.events, actions are submitted to
+    the core's loop; the view never talks to D-Bus itself.
+    """
+
+    def __init__(self, root, core):
+        self.root = root
+        self.core = core
+        self.events = queue.SimpleQueue()
+        self.statuses = {}
+
+        self.root.title("OpenVPN SAML")
+        self.root.configure(bg="#222222")
+        self.root.protocol('WM_DELETE_WINDOW', self.root.withdraw)
+        self.root.geometry("600x400")
+        self.root.resizable(False, False)
+        try:
+            self.root.iconphoto(False, PhotoImage(file='/opt/openvpn-saml/openvpn.png'))
+        except tk.TclError:
+            pass
+
+        menu_bar = tk.Menu(root, bg="#222222", fg="white", activebackground="#454545", activeforeground="white")
+        root.config(menu=menu_bar)
+        config_menu = tk.Menu(menu_bar, tearoff=0, bg="#222222", fg="white", activebackground="#454545", activeforeground="white")
+        menu_bar.add_cascade(label="Config", menu=config_menu)
+        config_menu.add_command(label="Add config", command=self.add_config)
+        config_menu.add_command(label="Remove config", command=self.remove_config)
+        sessions_menu = tk.Menu(menu_bar, tearoff=0, bg="#222222", fg="white", activebackground="#454545", activeforeground="white")
+        menu_bar.add_cascade(label="Sessions", menu=sessions_menu)
+        sessions_menu.add_command(label="Kill all sessions", command=lambda: self.core.submit(self.core.request_config_operation(None, 'stop')))
+
+        self.output_text = tk.Text(root, wrap="word", height=10, width=80, bg="black", fg="orange", bd=0)
+        self.output_text.pack(side='top', fill='both', expand=True, padx=10, pady=10)
+        self.output_text.configure(state='disabled')
+
+        style = ttk.Style()
+        style.configure("Dark.Treeview", background="#222222", fieldbackground="#222222", foreground="white", font=("Arial", 11, "bold"), rowheight=22)
+        list_frame = tk.Frame(root, bg="#222222")
+        list_frame.pack(side='bottom', fill='both', expand=True, padx=10, pady=(0, 15))
+        self.config_tree = ttk.Treeview(list_frame, columns=('status', 'traffic'), style="Dark.Treeview", height=5, selectmode='browse')
+        self.config_tree.heading('#0', text="Config")
+        self.config_tree.heading('status', text="Status")
+        self.config_tree.heading('traffic', text="Traffic")
+        self.config_tree.column('#0', width=160)
+        self.config_tree.column('status', width=110)
+        self.config_tree.column('traffic', width=170)
+        for color in ("green", "orange", "red"):
+            self.config_tree.tag_configure(color, foreground=color)
+        self.config_tree.pack(side='left', fill='both', expand=True)
+        self.config_tree.bind('<<TreeviewSelect>>', lambda event: self.select_config())
+
+        detail_frame = tk.Frame(list_frame, bg="#222222")
+        detail_frame.pack(side='right', fill='y', padx=(10, 0))
+        tk.Button(detail_frame, text="Connect /\nDisconnect", command=self.toggle_selected_config, bg="#454545", fg="white",
+                  font=("Arial", 10, "bold"), width=10).pack(side='top', pady=(4, 6))
+        self.auto_restart_var = tk.BooleanVar(value=False)
+        self.dco_var = tk.BooleanVar(value=False)
+        self.auto_restart_checkbox = tk.Checkbutton(detail_frame, text="Autoconnect", variable=self.auto_restart_var, selectcolor="#222222", bg="#222222",
+                                                    fg="white", font=("Arial", 11, "bold"), bd=0, highlightthickness=0,
+                                                    command=self.save_selected_config_settings, state="disabled")
+        self.auto_restart_checkbox.pack(side='top', anchor='w')
+        self.dco_checkbox = tk.Checkbutton(detail_frame, text="DCO", variable=self.dco_var, selectcolor="#222222", bg="#222222",
+                                           fg="white", font=("Arial", 11, "bold"), bd=0, highlightthickness=0,
+                                           command=self.save_selected_config_settings, state="disabled")
+        self.dco_checkbox.pack(side='top', anchor='w')
+
+        self.core.attach_view(self)
+        self.root.after(self.core.settings['log_flush_interval_ms'], self.drain_events)
+
+    def drain_events(self):
+        lines = []
+        for _ in range(self.core.settings['log_max_lines']):
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == 'log':
+                lines.append(event[1] + '\n')
+            elif event[0] == 'status':
+                config_name, status, color = event[1:]
+                self.statuses[config_name] = status
+                if self.config_tree.exists(config_name):
+                    self.config_tree.item(config_name, tags=(color,))
+                    self.config_tree.set(config_name, 'status', status)
+                else:
+                    self.config_tree.insert('', 'end', iid=config_name, text=config_name, values=(status, ""), tags=(color,))
+            elif event[0] == 'traffic':
+                for config_name in self.config_tree.get_children():
+                    traffic = event[1].get(config_name)
+                    self.config_tree.set(config_name, 'traffic', traffic['text'] if traffic else "")
+            elif event[0] == 'remove':
+                self.statuses.pop(event[1], None)
+                if self.config_tree.exists(event[1]):
+                    self.config_tree.delete(event[1])
+            elif event[0] == 'show':
+                self.root.withdraw()
+                self.root.deiconify()
+            elif event[0] == 'quit':
+                self.root.quit()
+                return
+
+        if lines:
+            self.output_text.configure(state='normal')
+            self.output_text.insert('end', ''.join(lines))
+            excess = int(self.output_text.index('end-1c').split('.')[0]) - self.core.settings['log_max_lines']
+            if excess > 0:
+                self.output_text.delete('1.0', f'{excess + 1}.0')
+            self.output_text.configure(state='disabled')
+            self.output_text.see('end')
+        self.root.after(self.core.settings['log_flush_interval_ms'], self.drain_events)
+
+    def selected_config(self):
+        selection = self.config_tree.selection()
+        return selection[0] if selection else None
+
+    def select_config(self):
+        config_name = self.selected_config()
+        state = "normal" if config_name else "disabled"
+        self.auto_restart_checkbox.config(state=state)
+        self.dco_checkbox.config(state=state)
+        if config_name is None:
+            return
+        settings = self.core.auto_restart_settings.get(config_name, {})
+        self.auto_restart_var.set(settings.get('auto_restart', False))
+        self.dco_var.set(settings.get('dco', False))
+
+    def save_selected_config_settings(self):
+        config_name = self.selected_config()
+        if config_name is not None:
+            self.core.submit(self.core.save_auto_restart_setting(config_name, self.auto_restart_var.get(), self.dco_var.get()))
+
+    def toggle_selected_config(self):
+        config_name = self.selected_config()
+        if config_name is None:
+            return
+        if self.statuses.get(config_name) == "VPN Offline":
+            self.core.submit(self.core.connect_config(config_name))
+        else:
+            self.core.submit(self.core.disconnect_config(config_name))
+
+    def add_config(self):
+        file_path = filedialog.askopenfilename(title="Choose a configuration file")
+        if not file_path:
+            return
+        config_name = simpledialog.askstring("Configuration Name", "Enter a name for the new configuration")
+        if not config_name:
+            return
+        if config_name in self.statuses:
+            self.core.update_output(f"Configuration with the name '{config_name}' already exists.")
+            return
+        with open(file_path, 'r') as file:
+            self.core.submit(self.core.import_configuration(config_name, file.read()))
+
+    def remove_config(self):
+        config_name = self.selected_config()
+        if config_name is None:
+            self.core.update_output("No configuration selected to remove.")
+            return
+        self.core.submit(self.core.remove_configuration(config_name))
+
+
+def run_settings_view(core):
+    # Settings window of a headless backend, runs on its own thread from the first open_settings
+    import_tk()
+    root = tk.Tk(className='OpenVPN SAML')
+    AsyncCoreView(root, core)
+    root.mainloop()
+
+def run_async_core(settings, headless=False):
+    if importlib.util.find_spec('dbus_next') is None:
+        print("The asyncio backend core needs the dbus-next package (pip install dbus-next).")
+        sys.exit(1)
+    core = AsyncBackendCore(settings, read_auto_restart_settings(), headless)
+    if headless:
+        core.run()
+        return
+    core_thread = threading.Thread(target=core.run, daemon=True)
+    core_thread.start()
+    import_tk()
     root = tk.Tk(className='OpenVPN SAML')
-    app = MyApp(root)
+    AsyncCoreView(root, core)
+    root.withdraw()
     root.mainloop()
+
+
+if __name__ == "__main__":
+    freeze_support()
+    backend_settings = read_backend_settings()
+    if '--headless' in sys.argv or backend_settings['headless']:
+        run_async_core(backend_settings, headless=True)
+    elif '--async-core' in sys.argv or backend_settings['core'] == 'asyncio':
+        run_async_core(backend_settings)
+    else:
+        import_tk()
+        import_dbus()
+        root = tk.Tk(className='OpenVPN SAML')
+        app = MyApp(root)
+        root.mainloop()
@@ -1,13 +1,14 @@
 from PyQt6.QtWidgets import QApplication, QSystemTrayIcon, QMenu
 from PyQt6.QtGui import QIcon, QAction
-from PyQt6.QtCore import QTimer
+from PyQt6.QtCore import QTimer, QObject, Qt, pyqtSignal
 import socket
-import pickle
 import sys
 import signal
-import time
 import subprocess
 
+from openvpn_saml_ipc import SOCKET_PATH, BackendConnection
+from openvpn_saml_profile import SamplingProfiler
+
 STATUS_ICONS = {
     'green': '/opt/openvpn-saml/green.png',
     'yellow': '/opt/openvpn-saml/yellow.png',
@@ -15,12 +16,22 @@ STATUS_ICONS = {
 }
 
 last_statuses = {}
-status_timestamps = {}
 actions = {}  # Store actions for access
+config_actions = {}  # Config name -> (config action, status action), patched in place on status events
+group_menus = {}  # Group name -> submenu, used once there are more than MENU_GROUP_THRESHOLD configs
+config_groups = {}  # Config name -> group name of its submenu
+
+# Configs are grouped into submenus by name prefix ("site-a-prod" -> "site") above this count
+MENU_GROUP_THRESHOLD = 15
+MENU_GROUP_SEPARATORS = "-_. "
 
 first_run = True
 is_starting = False
 start_timer = 0
+backend_available = False
+quitting = False
+
+backend = BackendConnection(SOCKET_PATH)
 
 def kill_processes_by_path(path):
     """Forcefully kill all processes with the given executable path using pkill."""
@@ -32,19 +43,14 @@ def kill_processes_by_path(path):
     except subprocess.CalledProcessError as e:
         print(f"Error killing processes: {e}")
 
-def send_unix_command(function_name, args=None, socket_path='/opt/openvpn-saml/openvpn-saml-backend.socket'):
+def send_unix_command(function_name, args=None):
     global is_starting
     global start_timer
     try:
-        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
-            s.connect(socket_path)
-            command = {'function': function_name, 'args': args}
-            s.sendall(pickle.dumps(command))
-            data = s.recv(1024)
-            response = pickle.loads(data)
-            print('Received response:', response)
-            is_starting = False
-            return response
+        response = backend.request(function_name, args)
+        print('Received response:', response)
+        is_starting = False
+        return response
     except socket.error as e:
         if e.errno == 111 or e.errno == 2:  # Connection refused
             if not is_starting:
@@ -121,56 +127,139 @@ def handle_config_click(action, config_name):
 
         QTimer.singleShot(3000, lambda: action.setEnabled(True))
 
+        # The backend answers with the job it started, retries are up to its ConfigOperations
         response = send_unix_command('connect', args={'config': config_name})
-        if "DBusException" in response:
-            send_unix_command('connect', args={'config': config_name})
+        if not response or response.get('status') == 'error':
+            print(f"Connect of {config_name} was not started: {response}")
+            return
 
-        for menu_action in tray_icon.contextMenu().actions():
-            if menu_action.text() == config_name:
-                menu_action.setIcon(load_status_icon('yellow'))
-                break
+        if config_name in config_actions:
+            config_actions[config_name][0].setIcon(load_status_icon('yellow'))
     except Exception as e:
         print(f"Error handling config click for {config_name}: {e}")
 
-def update_menu(menu):
-    global last_statuses, status_timestamps, actions
+def status_color(status):
+    if "Online" in status:
+        return 'green'
+    elif "Starting" in status or "Connecting" in status or "Reconnecting" in status:
+        return 'yellow'
+    return 'red'
+
+def config_group(config):
+    for i, char in enumerate(config):
+        if char in MENU_GROUP_SEPARATORS and i > 0:
+            return config[:i]
+    return config
+
+def assign_groups(configs):
+    """Group configs by name prefix, prefixes used by a single config go to 'Other'."""
+    prefixes = {config: config_group(config) for config in configs}
+    counts = {}
+    for prefix in prefixes.values():
+        counts[prefix] = counts.get(prefix, 0) + 1
+    return {config: prefix if counts[prefix] > 1 else 'Other' for config, prefix in prefixes.items()}
+
+def update_group_menu(group):
+    submenu = group_menus.get(group)
+    if submenu is None:
+        return
+    statuses = [last_statuses.get(config, '') for config in submenu.configs]
+    online = sum(1 for status in statuses if "Online" in status)
+    if any(status_color(status) == 'yellow' for status in statuses):
+        color = 'yellow'
+    elif online:
+        color = 'green'
+    else:
+        color = 'red'
+    submenu.setIcon(load_status_icon(color))
+    submenu.setTitle(f"{group} ({online}/{len(statuses)})")
+
+def subscribe_status(menu):
+    """Fetch a status snapshot and ask the backend to push every change after it."""
+    global last_statuses, backend_available
+    if quitting:
+        return
     try:
-        statuses = send_unix_command('get_vpn_status')
-
-        if statuses:
-            new_statuses = {s.split(':')[0]: s.split(':')[1] for s in statuses}
-            current_time = time.time()
+        response = send_unix_command('subscribe')
 
-            if new_statuses != last_statuses:
-                last_statuses = new_statuses
-                status_timestamps = {config: current_time for config in new_statuses}
-
-                menu.clear()
+        if response and response.get('status') == 'success':
+            backend_available = True
+            last_statuses = {s.split(':')[0]: s.split(':')[1] for s in response['result']}
+        else:
+            backend_available = False
+            last_statuses = {'Error.': 'Error connecting to backend, try to restart app.'}
+            QTimer.singleShot(2000, lambda: subscribe_status(menu))
+        build_menu(menu)
+    except Exception as e:
+        print(f"Error subscribing to VPN statuses: {e}")
 
-                for config, status in new_statuses.items():
-                    color = 'red'
-                    if "Online" in status:
-                        color = 'green'
-                    elif "Starting" in status or "Connecting" in status or "Reconnecting" in status:
-                        color = 'yellow'
+def apply_status_event(menu, event):
+    try:
+        config = event['config']
+        if event['new'] is None:
+            last_statuses.pop(config, None)
+            build_menu(menu)
+            return
+
+        last_statuses[config] = event['new']
+        if config in config_actions:
+            config_action, status_action = config_actions[config]
+            config_action.setIcon(load_status_icon(status_color(event['new'])))
+            status_action.setText(event['new'])
+            update_group_menu(config_groups.get(config))
+            update_tray_icon()
+        else:
+            build_menu(menu)
+    except Exception as e:
+        print(f"Error applying status event {event}: {e}")
 
-                    config_action = QAction(load_status_icon(color), config, app)
-                    config_action.triggered.connect(lambda _, cfg=config, act=config_action: handle_config_click(act, cfg))
-                    menu.addAction(config_action)
+def update_traffic_tooltip(configs):
+    # 'traffic' events carry a ready-made sparkline and rates per connected config
+    lines = [f"{config}: {traffic['text']}" for config, traffic in sorted(configs.items())]
+    tray_icon.setToolTip('\n'.join(lines) if lines else "OpenVPN SAML")
 
-                    status_action = QAction(status, app)
-                    status_action.setEnabled(False)
-                    menu.addAction(status_action)
-                    menu.addSeparator()
-            else:
-                return
+def build_menu(menu):
+    global actions
+    try:
+        for submenu in group_menus.values():
+            submenu.deleteLater()
+        menu.clear()
+        config_actions.clear()
+        group_menus.clear()
+        config_groups.clear()
+
+        if backend_available:
+            grouped = len(last_statuses) > MENU_GROUP_THRESHOLD
+            if grouped:
+                config_groups.update(assign_groups(last_statuses))
+            for config, status in sorted(last_statuses.items()) if grouped else last_statuses.items():
+                target = menu
+                if grouped:
+                    group = config_groups[config]
+                    if group not in group_menus:
+                        group_menus[group] = menu.addMenu(group)
+                        group_menus[group].configs = []
+                    target = group_menus[group]
+                    target.configs.append(config)
+
+                config_action = QAction(load_status_icon(status_color(status)), config, app)
+                config_action.triggered.connect(lambda _, cfg=config, act=config_action: handle_config_click(act, cfg))
+                target.addAction(config_action)
+
+                status_action = QAction(status, app)
+                status_action.setEnabled(False)
+                target.addAction(status_action)
+                target.addSeparator()
+                config_actions[config] = (config_action, status_action)
+            for group in group_menus:
+                update_group_menu(group)
+            if grouped:
+                menu.addSeparator()
         else:
-            menu.clear()
             if is_starting:
                 error_action = QAction('Backend starting....', app)
             else:
                 error_action = QAction('Error fetching VPN statuses', app)
-            last_statuses = {'Error.': 'Error connecting to backend, try to restart app.'}
             error_action.setEnabled(False)
             menu.addAction(error_action)
             menu.addSeparator()
@@ -192,32 +281,39 @@ def update_menu(menu):
         menu.addAction(settings_action)
 
         quit_action = QAction('Quit', app)
-        quit_action.triggered.connect(lambda: send_unix_command('quit'))
-        quit_action.triggered.connect(app.quit)
+        quit_action.triggered.connect(handle_quit_action)
         menu.addAction(quit_action)
 
         update_tray_icon()
     except Exception as e:
         print(f"Error updating menu: {e}")
 
-def check_statuses():
-    global last_statuses, status_timestamps, first_run
-    current_time = time.time()
-    for config, status in last_statuses.items():
-        if any(status.startswith(prefix) for prefix in ("Reconnecting", "Connecting", "Starting")):
-            if current_time - status_timestamps.get(config, current_time) > 60 and first_run == False:
-                print(f"Status {status} for {config} persisted for more than 60 seconds. Triggering connect.")
-                send_unix_command('connect', args={'config': config})
-                send_unix_command('connect', args={'config': config})
-                status_timestamps[config] = current_time
-
-class CustomMenu(QMenu):
-    def showEvent(self, event):
-        try:
-            update_menu(self)
-        except Exception as e:
-            print(f"Error showing menu: {e}")
-        super().showEvent(event)
+def handle_quit_action():
+    global quitting
+    # The backend exits on 'quit', don't treat the dropped connection as a crash
+    quitting = True
+    send_unix_command('quit')
+    app.quit()
+
+class StatusBridge(QObject):
+    """Hands backend events from the connection's reader thread to the Qt GUI thread."""
+    status_event = pyqtSignal(dict)
+    disconnected = pyqtSignal()
+
+    def __init__(self, menu):
+        super().__init__()
+        self.menu = menu
+        self.status_event.connect(self.on_status_event, Qt.ConnectionType.QueuedConnection)
+        self.disconnected.connect(self.on_disconnected, Qt.ConnectionType.QueuedConnection)
+
+    def on_status_event(self, event):
+        if event.get('event') == 'status':
+            apply_status_event(self.menu, event)
+        elif event.get('event') == 'traffic':
+            update_traffic_tooltip(event.get('configs', {}))
+
+    def on_disconnected(self):
+        subscribe_status(self.menu)
 
 try:
     app = QApplication(sys.argv)
@@ -225,16 +321,13 @@ try:
     tray_icon = QSystemTrayIcon(QIcon('/opt/openvpn-saml/openvpn.png'))
     tray_icon.setToolTip("Tray Icon")
 
-    tray_icon.setContextMenu(CustomMenu())
+    tray_icon.setContextMenu(QMenu())
     tray_icon.show()
 
-    menu_timer = QTimer()
-    menu_timer.timeout.connect(lambda: update_menu(tray_icon.contextMenu()))
-    menu_timer.start(2000)
-
-    status_timer = QTimer()
-    status_timer.timeout.connect(check_statuses)
-    status_timer.start(1000)
+    bridge = StatusBridge(tray_icon.contextMenu())
+    backend.on_event = bridge.status_event.emit
+    backend.on_disconnect = bridge.disconnected.emit
+    subscribe_status(tray_icon.contextMenu())
 
     def signal_handler(sig, frame):
         tray_icon.hide()
@@ -242,6 +335,13 @@ try:
 
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    # SIGUSR2 profiles all tray threads, SIGUSR1 dumps their stacks (see openvpn_saml_profile.py)
+    profiler = SamplingProfiler('openvpn-saml-tray')
+    profiler.install_signal_handlers()
+    # Python only runs signal handlers between bytecodes, wake it up while Qt waits for events
+    signal_timer = QTimer()
+    signal_timer.timeout.connect(lambda: None)
+    signal_timer.start(500)
 
     sys.exit(app.exec())
 except Exception as e:
@@ -0,0 +1,199 @@
+import os
+import sys
+
+# Only imported inside the browser process, the backend itself never loads Qt
+os.environ["QTWEBENGINE_CHROMIUM_FLAGS"] = "--disable-gpu"
+
+from PyQt6.QtWidgets import QApplication, QMainWindow, QTabWidget
+from PyQt6.QtWebEngineCore import QWebEngineSettings, QWebEngineProfile, QWebEnginePage
+from PyQt6.QtWebEngineWidgets import QWebEngineView
+from PyQt6.QtCore import QUrl, QTimer, QSocketNotifier
+from PyQt6.QtGui import QIcon
+
+
+class Browser(QMainWindow):
+    def __init__(self, urls, title, show=True):
+        super().__init__()
+        self.urls = urls
+        # Called once the last tab is gone and the window is hidden
+        self.on_idle = None
+        # Called with the URLs of the open tabs whenever the window is shown
+        self.on_shown = None
+        self.silent_timer = QTimer(self)
+        self.silent_timer.setSingleShot(True)
+        self.silent_timer.timeout.connect(self.show_if_needed)
+        self.initUI(title, show)
+
+    def initUI(self, title, show):
+        profile_path = os.path.expanduser("~/.config/pyqt_browser_profile")
+        self.profile = QWebEngineProfile(profile_path, self)
+        self.profile.setPersistentCookiesPolicy(QWebEngineProfile.PersistentCookiesPolicy.ForcePersistentCookies)
+        
+        self.tab_widget = QTabWidget()
+        self.setCentralWidget(self.tab_widget)
+
+        for url in self.urls:
+            self.add_tab(url)
+
+        self.resize(390, 800)
+        self.setWindowTitle(title)
+        if show:
+            self.show()
+
+    def warm_up(self):
+        # Load a blank page in a hidden view so the first auth URL doesn't pay for
+        # starting the Chromium renderer
+        self.warm_view = QWebEngineView()
+        self.warm_view.setPage(QWebEnginePage(self.profile, self.warm_view))
+        self.warm_view.setUrl(QUrl("about:blank"))
+
+    def open_urls(self, urls, silent_timeout=0):
+        for url in urls:
+            self.add_tab(url)
+        if silent_timeout > 0 and not self.isVisible():
+            # Tabs that finish on their own are closed by the window.close() checks
+            # below, whatever is left after the timeout needs the user
+            if not self.silent_timer.isActive():
+                self.silent_timer.start(int(silent_timeout * 1000))
+        else:
+            self.show_if_needed()
+
+    def show_if_needed(self):
+        self.silent_timer.stop()
+        if self.tab_widget.count() > 0:
+            self.show()
+            self.raise_()
+            self.activateWindow()
+            if self.on_shown:
+                self.on_shown([self.tab_widget.widget(index).auth_url for index in range(self.tab_widget.count())])
+
+    def add_tab(self, url):
+        browser = QWebEngineView()
+        browser.auth_url = url
+        page = QWebEnginePage(self.profile, browser)
+        browser.setPage(page)
+
+        settings = browser.settings()
+        settings.setAttribute(QWebEngineSettings.WebAttribute.LocalStorageEnabled, True)
+        settings.setAttribute(QWebEngineSettings.WebAttribute.AutoLoadImages, True)
+        settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptEnabled, True)
+        settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanOpenWindows, True)
+        settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanAccessClipboard, True)
+
+        browser.setUrl(QUrl(url))
+        page.windowCloseRequested.connect(self.handleWindowCloseRequested)
+
+        # Check for 'window.close()' in the page source after it has loaded
+        page.loadFinished.connect(lambda: self.check_page_for_window_close(page, browser))
+
+        tab_index = self.tab_widget.addTab(browser, QUrl(url).host())
+        self.tab_widget.setCurrentIndex(tab_index)
+
+    def check_page_for_window_close(self, page, browser):
+        # Get the page source and check for 'window.close()'
+        page.runJavaScript("document.documentElement.outerHTML", lambda source: self.handle_page_source(source, browser))
+
+    def handle_page_source(self, source, browser):
+        if source is None:
+            print("Failed to retrieve page source")
+        elif 'window.close()' in source:
+            print("Found window.close() in page source")
+            # Close the tab after 3 seconds
+            QTimer.singleShot(3000, lambda: self.close_tab(browser))
+
+    def close_tab(self, browser):
+        if browser:
+            index = self.tab_widget.indexOf(browser)
+            if index != -1:
+                self.tab_widget.removeTab(index)
+                browser.page().deleteLater()
+                browser.deleteLater()
+
+        self.close_if_empty()
+
+    def handleWindowCloseRequested(self):
+        current_widget = self.tab_widget.currentWidget()
+        if current_widget:
+            page = current_widget.page()
+            page.deleteLater()
+            current_widget.deleteLater()
+            self.tab_widget.removeTab(self.tab_widget.currentIndex())
+        self.close_if_empty()
+
+    def close_if_empty(self):
+        if self.tab_widget.count() == 0:
+            if self.isVisible():
+                self.close()
+            else:
+                # Every tab of a silent attempt finished without being shown
+                self.silent_timer.stop()
+                if self.on_idle:
+                    self.on_idle()
+
+    def closeEvent(self, event):
+        while self.tab_widget.count() > 0:
+            current_widget = self.tab_widget.widget(0)
+            if current_widget:
+                page = current_widget.page()
+                page.deleteLater()
+                current_widget.deleteLater()
+                self.tab_widget.removeTab(0)
+        event.accept()
+        if self.on_idle:
+            self.on_idle()
+
+def start_browser_service(conn, idle_timeout, prewarm, silent_timeout=0):
+    # Runs in the browser process: keeps one hidden window alive and opens the
+    # URLs the backend sends over the pipe as new tabs. Every message is acked
+    # so the backend knows it was not lost to an idle shutdown; showing the
+    # window is reported back for the backend's connect timelines.
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+    app.setQuitOnLastWindowClosed(False)
+    icon = QIcon("/opt/openvpn-saml/openvpn.png")
+    app.setWindowIcon(icon)
+    app.setApplicationName("OpenVPN SAML AUTH")
+    window = Browser([], "OpenVPN SAML AUTH", show=False)
+
+    idle_timer = QTimer()
+    idle_timer.setSingleShot(True)
+    idle_timer.setInterval(int(idle_timeout * 1000))
+
+    def quit_if_idle():
+        if conn.poll():
+            read_messages()
+        else:
+            app.quit()
+
+    def read_messages():
+        try:
+            while conn.poll():
+                message = conn.recv()
+                if message.get('command') == 'open':
+                    idle_timer.stop()
+                    window.open_urls(message['urls'], silent_timeout)
+                elif message.get('command') == 'quit':
+                    app.quit()
+                conn.send({'ack': message.get('seq')})
+        except (EOFError, OSError):
+            # Backend is gone
+            app.quit()
+
+    def report_shown(urls):
+        try:
+            conn.send({'event': 'shown', 'urls': urls})
+        except (EOFError, OSError):
+            app.quit()
+
+    idle_timer.timeout.connect(quit_if_idle)
+    window.on_idle = idle_timer.start
+    window.on_shown = report_shown
+    notifier = QSocketNotifier(conn.fileno(), QSocketNotifier.Type.Read)
+    notifier.activated.connect(read_messages)
+
+    if prewarm:
+        window.warm_up()
+    idle_timer.start()
+    read_messages()
+    app.exec()
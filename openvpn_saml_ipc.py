@@ -0,0 +1,154 @@
+import asyncio
+import itertools
+import os
+import pickle
+import socket
+import struct
+import threading
+
+# Can be moved, e.g. to run a second backend against a test bus (see bench/)
+SOCKET_PATH = os.environ.get('OPENVPN_SAML_SOCKET', '/opt/openvpn-saml/openvpn-saml-backend.socket')
+
+# Every message is a pickled dict prefixed with its length as a 4 byte big-endian integer.
+# Requests carry an 'id' that the backend copies into the matching response.
+FRAME_HEADER = struct.Struct('!I')
+
+
+def encode_frame(message):
+    payload = pickle.dumps(message)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def send_frame(sock, message):
+    sock.sendall(encode_frame(message))
+
+
+def recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock):
+    """Read one message, returns None when the peer closed the connection."""
+    header = recv_exactly(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    payload = recv_exactly(sock, size)
+    if payload is None:
+        return None
+    return pickle.loads(payload)
+
+
+async def recv_frame_async(reader):
+    """asyncio counterpart of recv_frame for a StreamReader."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        (size,) = FRAME_HEADER.unpack(header)
+        payload = await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        return None
+    return pickle.loads(payload)
+
+
+class BackendConnection:
+    """Long-lived connection to the backend socket, shared by all callers.
+
+    Requests may be sent from any thread and several may be in flight at once;
+    a reader thread hands each response to the caller waiting for its id.
+    Messages without an id are pushed events and go to on_event, and
+    on_disconnect is called when an established connection drops; both
+    run on the reader thread. The connection is re-established on the next
+    request after it drops.
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH, timeout=60, on_event=None, on_disconnect=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.on_event = on_event
+        self.on_disconnect = on_disconnect
+        self.sock = None
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        threading.Thread(target=self._read_loop, args=(sock,), daemon=True).start()
+
+    def request(self, function_name, args=None, timeout=None):
+        waiter = {'event': threading.Event(), 'response': None, 'lost': False}
+        with self.lock:
+            if self.sock is None:
+                self._connect()
+            request_id = next(self.request_ids)
+            waiter['sock'] = self.sock
+            self.pending[request_id] = waiter
+            try:
+                send_frame(self.sock, {'id': request_id, 'function': function_name, 'args': args})
+            except OSError:
+                self.pending.pop(request_id, None)
+                self._drop(self.sock)
+                raise
+
+        if not waiter['event'].wait(timeout or self.timeout):
+            self.pending.pop(request_id, None)
+            raise TimeoutError(f"No response to {function_name} within {timeout or self.timeout} sec")
+        if waiter['lost']:
+            raise ConnectionResetError(f"Connection to backend lost while waiting for {function_name}")
+        return waiter['response']
+
+    def _read_loop(self, sock):
+        while True:
+            try:
+                message = recv_frame(sock)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                message = None
+            if message is None:
+                break
+            self.handle_message(message)
+
+        with self.lock:
+            self._drop(sock)
+            lost = [request_id for request_id, waiter in self.pending.items() if waiter['sock'] is sock]
+            lost = [self.pending.pop(request_id) for request_id in lost]
+        for waiter in lost:
+            waiter['lost'] = True
+            waiter['event'].set()
+        if self.on_disconnect is not None:
+            self.on_disconnect()
+
+    def handle_message(self, message):
+        if message.get('id') is None:
+            if self.on_event is not None:
+                self.on_event(message)
+            return
+        waiter = self.pending.pop(message.get('id'), None)
+        if waiter is not None:
+            waiter['response'] = message.get('response')
+            waiter['event'].set()
+
+    def _drop(self, sock):
+        if self.sock is sock:
+            self.sock = None
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def close(self):
+        with self.lock:
+            if self.sock is not None:
+                self._drop(self.sock)
@@ -0,0 +1,116 @@
+import collections
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+# Profiles and stack dumps of the backend and the tray are written here
+PROFILE_DIR = os.environ.get('OPENVPN_SAML_PROFILE_DIR', tempfile.gettempdir())
+
+
+def format_thread_stacks():
+    threads = {thread.ident: thread for thread in threading.enumerate()}
+    lines = []
+    for ident, frame in sys._current_frames().items():
+        thread = threads.get(ident)
+        name = thread.name if thread is not None else str(ident)
+        daemon = ", daemon" if thread is not None and thread.daemon else ""
+        lines.append(f"Thread {name} ({ident}{daemon}):")
+        lines.extend(line.rstrip('\n') for line in traceback.format_stack(frame))
+        lines.append("")
+    return '\n'.join(lines)
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread of this process for a while.
+
+    start() runs a sampler thread that takes sys._current_frames() every
+    `interval` seconds until `duration` has passed or stop() is called, then
+    writes the counts in collapsed stack format, one "thread;outer;...;inner
+    count" line per distinct stack, which speedscope and flamegraph.pl read.
+    Nothing runs while no profile is being taken.
+    """
+
+    def __init__(self, process_name, directory=PROFILE_DIR, log=print):
+        self.process_name = process_name
+        self.directory = directory
+        self.log = log
+        self.lock = threading.Lock()
+        self.stop_event = None
+        self.path = None
+
+    def start(self, duration=30, interval=0.005, path=None):
+        # Returns the file the profile will be written to, None if one is already running
+        with self.lock:
+            if self.stop_event is not None:
+                return None
+            self.stop_event = threading.Event()
+            self.path = path or os.path.join(self.directory, f"{self.process_name}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+            threading.Thread(target=self._run, args=(self.stop_event, self.path, duration, interval), name='profiler', daemon=True).start()
+        self.log(f"Profiling all threads for {duration} sec into {self.path}")
+        return self.path
+
+    def stop(self):
+        # Returns the file of the profile that was stopped, it is written by the sampler thread
+        with self.lock:
+            if self.stop_event is None:
+                return None
+            self.stop_event.set()
+            return self.path
+
+    def toggle(self, duration=30):
+        return self.stop() or self.start(duration)
+
+    def _run(self, stop_event, path, duration, interval):
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + duration
+        stacks = collections.Counter()
+        samples = 0
+        while not stop_event.wait(interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)).replace(';', ','))
+                stacks[';'.join(reversed(stack))] += 1
+            samples += 1
+        try:
+            with open(path, 'w', encoding='utf-8') as profile_file:
+                for stack, count in stacks.most_common():
+                    profile_file.write(f"{stack} {count}\n")
+            self.log(f"Profile with {samples} samples written to {path}")
+        except OSError as e:
+            self.log(f"Can't write profile {path}: {e}")
+        with self.lock:
+            if self.stop_event is stop_event:
+                self.stop_event = None
+
+    def dump_thread_stacks(self, path=None):
+        path = path or os.path.join(self.directory, f"{self.process_name}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.stacks")
+        with open(path, 'w', encoding='utf-8') as stacks_file:
+            stacks_file.write(format_thread_stacks())
+        self.log(f"Thread stacks written to {path}")
+        return path
+
+    def install_signal_handlers(self, duration=30):
+        # SIGUSR2 starts a profile of `duration` seconds or stops the running one,
+        # SIGUSR1 writes the stacks of all threads
+        def toggle_profile(signum, frame):
+            self.toggle(duration)
+
+        def dump_stacks(signum, frame):
+            try:
+                self.dump_thread_stacks()
+            except OSError as e:
+                self.log(f"Can't write thread stacks: {e}")
+
+        signal.signal(signal.SIGUSR2, toggle_profile)
+        signal.signal(signal.SIGUSR1, dump_stacks)